@@ -0,0 +1,47 @@
+"""
+Balance rule benchmark
+Vectorized balance rules against the row-by-row loop they replaced.
+
+    python benchmarks/balance_rules.py [--rows 100000] [--repeat 3]
+
+Prints the best of --repeat runs for each engine. Not part of the test suite;
+tests/test_anomaly_service.py checks that both engines flag the same rows.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.anomaly_service import _detect_balance_anomalies
+from tests.test_anomaly_service import _balance_frame, _row_by_row_balance_anomalies
+
+
+def _best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frame = _balance_frame(args.rows)
+    loop_seconds = _best_of(args.repeat, _row_by_row_balance_anomalies, frame)
+    vectorized_seconds = _best_of(args.repeat, _detect_balance_anomalies, frame, 0.05)
+    print(
+        f"balance rules, {args.rows} rows: loop {loop_seconds * 1000:.0f} ms, "
+        f"vectorized {vectorized_seconds * 1000:.0f} ms ({loop_seconds / vectorized_seconds:.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
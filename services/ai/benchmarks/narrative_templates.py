@@ -0,0 +1,42 @@
+"""
+Narrative template benchmark
+Turkish template narrative against the hand-written function it replaced.
+
+    python benchmarks/narrative_templates.py [--years 20] [--renders 2000]
+
+Prints the mean time per render. Not part of the test suite;
+tests/test_narrative_templates.py checks that both render the same text.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.narrative_templates import get_template
+from tests.test_narrative_templates import _context, _reference
+
+
+def _mean_us(renders: int, fn, context: dict) -> float:
+    start = time.perf_counter()
+    for _ in range(renders):
+        fn(context)
+    return (time.perf_counter() - start) / renders * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--renders", type=int, default=2000)
+    args = parser.parse_args()
+
+    context = _context(args.years)
+    reference_us = _mean_us(args.renders, _reference, context)
+    template_us = _mean_us(args.renders, get_template("tr").render, context)
+    print(f"tr template, {args.years} years: hand-written {reference_us:.1f} us, string table {template_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Numeric decode benchmark
+Per-row cost of decoding NUMERIC vs float8 values (the psycopg2 typecasters)
+into an EmissionFrame.
+
+    python benchmarks/numeric_decode.py [--rows 100000]
+
+Prints microseconds per row for each typecaster. Not part of the test suite;
+tests/test_database.py checks that both give the same frame.
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import psycopg2.extensions
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from frames import EmissionFrame
+
+_KEYS = ["id", "aDValue", "eFValue", "directEmissions", "indirectEmissions", "totalCo2Emissions"]
+
+
+def _decode_us(raw: list[list[str]], typecaster) -> float:
+    start = time.perf_counter()
+    rows = [(i, *(typecaster(v, None) for v in values)) for i, values in enumerate(raw)]
+    EmissionFrame.from_rows(rows, _KEYS)
+    return (time.perf_counter() - start) / len(raw) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    raw = [[f"{rnd.uniform(0, 1000):.10f}" for _ in range(len(_KEYS) - 1)] for _ in range(args.rows)]
+    decimal_us = _decode_us(raw, psycopg2.extensions.DECIMAL)
+    float_us = _decode_us(raw, psycopg2.extensions.FLOAT)
+    print(f"numeric decode, {len(_KEYS) - 1} columns: Decimal {decimal_us:.2f} us/row, float8 {float_us:.2f} us/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Result cache
+Two-tier cache for endpoint results: an in-process LRU (L1) in front of Redis (L2).
+
+Keys combine tenant, installation, endpoint, request parameters and a
+fingerprint of the installation's data, so an entry is only reused while the
+underlying Emission / GhgBalanceByType rows are unchanged.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import structlog
+
+from config import (
+    REDIS_URL,
+    CACHE_ENABLED,
+    CACHE_TTL_SECONDS,
+    CACHE_L1_MAXSIZE,
+    CACHE_L1_TTL_SECONDS,
+    CACHE_REDIS_RETRY_SECONDS,
+    ANOMALY_MODEL_CACHE_MAXSIZE,
+    ANOMALY_MODEL_CACHE_TTL_SECONDS,
+    NARRATIVE_CACHE_TTL_SECONDS,
+)
+from metrics import CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS
+
+logger = structlog.get_logger(service="ecosfer-ai", module="cache")
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def model_key(kind: str, tenant_id: str, installation_id: str, fingerprint: dict) -> str:
+    """Key for an in-process fitted model, valid while the installation's data fingerprint is unchanged."""
+    return f"ai:models:{kind}:{tenant_id}:{installation_id}:{_digest(fingerprint)}"
+
+
+def prompt_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    """Content-addressed key for an LLM completion: the same model and prompt give the same key."""
+    digest = hashlib.sha256("\x00".join((model, system_prompt, user_prompt)).encode()).hexdigest()
+    return f"ai:narratives:{model}:{digest}"
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with per-entry TTL."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                CACHE_EVICTIONS.labels(cache=self.name, reason="expired").inc()
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.labels(cache=self.name, reason="lru").inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResultCache:
+    """L1 (in-process LRU) + L2 (Redis) cache for JSON-serializable results.
+
+    Redis errors never fail a request: the L2 tier is skipped for
+    CACHE_REDIS_RETRY_SECONDS and the cache keeps serving from L1.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        redis_url: str = REDIS_URL,
+        ttl: int = CACHE_TTL_SECONDS,
+        l1_maxsize: int = CACHE_L1_MAXSIZE,
+        l1_ttl: int = CACHE_L1_TTL_SECONDS,
+        enabled: bool = CACHE_ENABLED,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.enabled = enabled
+        self.local = LRUCache(name, l1_maxsize, min(l1_ttl, ttl))
+        self._redis_url = redis_url
+        self._redis = None
+        self._redis_loop = None
+        self._redis_down_until = 0.0
+
+    def make_key(
+        self,
+        tenant_id: str,
+        installation_id: str,
+        endpoint: str,
+        params: dict,
+        fingerprint: dict,
+    ) -> str:
+        digest = _digest({"params": params, "fingerprint": fingerprint})
+        return f"ai:{self.name}:{endpoint}:{tenant_id}:{installation_id}:{digest}"
+
+    async def get(self, key: str):
+        if not self.enabled:
+            return None
+        value = self.local.get(key)
+        if value is not None:
+            CACHE_HITS.labels(cache=self.name, tier="l1").inc()
+            return value
+
+        client = self._client()
+        if client is not None:
+            try:
+                raw = await client.get(key)
+            except Exception as e:
+                self._mark_redis_down(e)
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                CACHE_HITS.labels(cache=self.name, tier="l2").inc()
+                return value
+
+        CACHE_MISSES.labels(cache=self.name).inc()
+        return None
+
+    async def set(self, key: str, value) -> None:
+        if not self.enabled:
+            return
+        self.local.set(key, value)
+        client = self._client()
+        if client is not None:
+            try:
+                await client.set(key, json.dumps(value, default=str), ex=self.ttl)
+            except Exception as e:
+                self._mark_redis_down(e)
+
+    def _client(self):
+        if not self._redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        # redis.asyncio connections are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._redis is None or self._redis_loop is not loop:
+            from redis import asyncio as aioredis
+
+            self._redis = aioredis.Redis.from_url(
+                self._redis_url, socket_connect_timeout=0.5, socket_timeout=1.0
+            )
+            self._redis_loop = loop
+        return self._redis
+
+    def _mark_redis_down(self, error: Exception) -> None:
+        logger.warning("cache_redis_unavailable", cache=self.name, error=str(error))
+        self._redis_down_until = time.monotonic() + CACHE_REDIS_RETRY_SECONDS
+        self._redis = None
+
+
+result_cache = ResultCache("results")
+
+# The prompt already holds every input of the narrative, so entries need no data fingerprint
+narrative_cache = ResultCache("narratives", ttl=NARRATIVE_CACHE_TTL_SECONDS)
+
+# Fitted anomaly models are not JSON-serializable, so they only live in process
+anomaly_model_cache = LRUCache("anomaly_models", ANOMALY_MODEL_CACHE_MAXSIZE, ANOMALY_MODEL_CACHE_TTL_SECONDS)
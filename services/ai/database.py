@@ -1,10 +1,33 @@
+import asyncio
+import io
+import re
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DATABASE_ASYNC_ENABLED, EMISSION_ROLLUP_ENABLED, ANOMALY_STREAM_CHUNK_ROWS,
+)
+from db_pool import engine_options, instrument_engine
+from metrics import DB_QUERY_DURATION
+from frames import EmissionFrame, BalanceFrame, YearlyAggregate, EMISSION_FIELDS, BALANCE_FIELDS, timestamp_column
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_size=5)
+engine = instrument_engine(create_engine(DATABASE_URL, **engine_options("sync")), "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Native async engine on asyncpg (DATABASE_ASYNC_ENABLED). The afetch_* functions take
+# it instead of a session and check out their own connection, so independent
+# queries can run concurrently with asyncio.gather.
+async_engine = None
+if DATABASE_ASYNC_ENABLED:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options("async", async_driver=True))
+    instrument_engine(async_engine.sync_engine, "async")
+
 
 def get_db():
     db = SessionLocal()
@@ -14,17 +37,32 @@ def get_db():
         db.close()
 
 
-def fetch_emission_data(db, installation_id: str, tenant_id: str) -> list[dict]:
-    """Fetch emission records for an installation, grouped by period."""
-    query = text("""
+@contextmanager
+def observe_query(query_type: str):
+    """Record the duration of a query in DB_QUERY_DURATION."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_QUERY_DURATION.labels(query_type=query_type).observe(time.perf_counter() - start)
+
+
+# Decimal(28,10) quantities are cast to float8 in SQL: the driver then returns
+# floats, which load into float64 arrays without building and converting a
+# decimal.Decimal per value.
+_EMISSION_NUMERIC = ('e."aDValue"', 'e."eFValue"', 'e."directEmissions"', 'e."indirectEmissions"', 'e."totalCo2Emissions"')
+_BALANCE_NUMERIC = ('gb."directEmissions"', 'gb."indirectEmissions"', 'gb."totalEmissions"')
+
+
+def _float8_columns(columns: tuple[str, ...]) -> str:
+    return ",\n            ".join(f"{column}::float8 AS {column.split('.', 1)[1]}" for column in columns)
+
+
+_EMISSION_QUERY = f"""
         SELECT
             e.id,
             e."createdAt",
-            e."aDValue",
-            e."eFValue",
-            e."directEmissions",
-            e."indirectEmissions",
-            e."totalCo2Emissions",
+            {_float8_columns(_EMISSION_NUMERIC)},
             id2."reportingYear",
             et."name" as emission_type
         FROM "Emission" e
@@ -33,15 +71,241 @@ def fetch_emission_data(db, installation_id: str, tenant_id: str) -> list[dict]:
         WHERE id2."installationId" = :installation_id
           AND id2."tenantId" = :tenant_id
         ORDER BY id2."reportingYear" ASC, e."createdAt" ASC
-    """)
-    result = db.execute(query, {"installation_id": installation_id, "tenant_id": tenant_id})
-    rows = result.fetchall()
-    return [dict(row._mapping) for row in rows]
+"""
 
 
-def fetch_installation_summary(db, installation_id: str, tenant_id: str) -> dict | None:
-    """Fetch installation basic info for report narrative."""
-    query = text("""
+def fetch_emission_data(db, installation_id: str, tenant_id: str) -> EmissionFrame:
+    """Fetch emission records for an installation, grouped by period.
+
+    Rows are converted chunk by chunk from a server-side cursor, so the driver
+    never buffers the whole result next to the frame.
+    """
+    return EmissionFrame.concat(_stream_frames(
+        db, _EMISSION_QUERY, EmissionFrame, "emissions", ANOMALY_STREAM_CHUNK_ROWS,
+        {"installation_id": installation_id, "tenant_id": tenant_id},
+    ))
+
+
+def stream_emission_data(
+    db,
+    installation_id: str,
+    tenant_id: str,
+    chunk_size: int = ANOMALY_STREAM_CHUNK_ROWS,
+) -> Iterator[EmissionFrame]:
+    """
+    Yield an installation's emission records as frames of at most `chunk_size` rows.
+
+    Rows are read through a server-side cursor, so only one chunk is held in
+    memory at a time. Same columns and order as fetch_emission_data.
+    """
+    return _stream_frames(
+        db, _EMISSION_QUERY, EmissionFrame, "emissions_stream", chunk_size,
+        {"installation_id": installation_id, "tenant_id": tenant_id},
+    )
+
+
+def _stream_frames(db, sql: str, frame_cls, query_type: str, chunk_size: int, params: dict) -> Iterator:
+    """Execute `sql` with a server-side cursor and yield one frame per `chunk_size` rows."""
+    query = text(sql).execution_options(stream_results=True, yield_per=chunk_size)
+    with observe_query(query_type):
+        result = db.execute(query, params)
+    keys = list(result.keys())
+    try:
+        for rows in result.partitions(chunk_size):
+            yield frame_cls.from_rows(rows, keys)
+    finally:
+        result.close()
+
+
+_EMISSION_MANY_QUERY = f"""
+        SELECT
+            id2."installationId" as installation_id,
+            e.id,
+            e."createdAt",
+            {_float8_columns(_EMISSION_NUMERIC)},
+            id2."reportingYear",
+            et."name" as emission_type
+        FROM "Emission" e
+        JOIN "InstallationData" id2 ON e."installationDataId" = id2.id
+        LEFT JOIN "EmissionType" et ON e."emissionTypeId" = et.id
+        WHERE id2."installationId" = ANY(:installation_ids)
+          AND id2."tenantId" = :tenant_id
+        ORDER BY id2."installationId", id2."reportingYear" ASC, e."createdAt" ASC
+"""
+
+
+def fetch_emission_data_many(db, installation_ids: list[str], tenant_id: str) -> dict[str, EmissionFrame]:
+    """Fetch emission records for many installations in one query, split per installation."""
+    query = text(_EMISSION_MANY_QUERY)
+    with observe_query("emissions_many"):
+        result = db.execute(query, {"installation_ids": list(installation_ids), "tenant_id": tenant_id})
+        rows = result.fetchall()
+    keys = list(result.keys())[1:]
+
+    grouped: dict[str, list] = {iid: [] for iid in installation_ids}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(row[1:])
+    return {iid: EmissionFrame.from_rows(group, keys) for iid, group in grouped.items()}
+
+
+# Per-year emission aggregates, matching EmissionFrame.yearly (missing values count as 0;
+# the forecast value falls back to directEmissions when the total is missing or zero)
+_FORECAST_VALUE = 'COALESCE(NULLIF(e."totalCo2Emissions", 0), e."directEmissions", 0)'
+# Sums are exact NUMERIC and cast to float8 once per year.
+_YEARLY_AGGREGATES = {
+    "direct": 'SUM(COALESCE(e."directEmissions", 0))::float8',
+    "indirect": 'SUM(COALESCE(e."indirectEmissions", 0))::float8',
+    "total": 'SUM(COALESCE(e."totalCo2Emissions", 0))::float8',
+    "count": "COUNT(*)",
+    "forecast_total": f"SUM({_FORECAST_VALUE})::float8",
+    "forecast_count": f"COUNT(*) FILTER (WHERE {_FORECAST_VALUE} <> 0)",
+    "total_count": 'COUNT(*) FILTER (WHERE COALESCE(e."totalCo2Emissions", 0) <> 0)',
+}
+_YEARLY_SELECT = ",\n            ".join(f"{expr} AS {name}" for name, expr in _YEARLY_AGGREGATES.items())
+
+EMISSION_ROLLUP_VIEW = "ai_emission_yearly_rollup"
+# Set once refresh_emission_rollup has created the view in this process
+_rollup_ready = False
+
+
+def fetch_yearly_emissions(db, installation_id: str, tenant_id: str) -> YearlyAggregate:
+    """Fetch per-year emission sums for an installation, aggregated in Postgres."""
+    return fetch_yearly_emissions_many(db, [installation_id], tenant_id)[installation_id]
+
+
+def fetch_yearly_emissions_many(db, installation_ids: list[str], tenant_id: str) -> dict[str, YearlyAggregate]:
+    """
+    Fetch per-year emission sums for many installations in one query.
+
+    Only one row per installation and year crosses the wire. With
+    EMISSION_ROLLUP_ENABLED (once the rollup exists) the sums are read from
+    the materialized rollup, except for installations whose Emission / InstallationData rows changed
+    since the last refresh; those are aggregated from the live tables.
+    """
+    use_rollup = EMISSION_ROLLUP_ENABLED and _rollup_ready
+    query = text(_YEARLY_ROLLUP_QUERY if use_rollup else _YEARLY_LIVE_QUERY)
+    with observe_query("yearly_rollup" if use_rollup else "yearly"):
+        result = db.execute(query, {"installation_ids": list(installation_ids), "tenant_id": tenant_id})
+        rows = result.fetchall()
+    keys = list(result.keys())[1:]
+
+    grouped: dict[str, list] = {iid: [] for iid in installation_ids}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(row[1:])
+    return {iid: YearlyAggregate.from_rows(group, keys) for iid, group in grouped.items()}
+
+
+_YEARLY_LIVE_QUERY = f"""
+        SELECT
+            d."installationId" AS installation_id,
+            COALESCE(d."reportingYear", 0) AS year,
+            {_YEARLY_SELECT}
+        FROM "Emission" e
+        JOIN "InstallationData" d ON e."installationDataId" = d.id
+        WHERE d."installationId" = ANY(:installation_ids)
+          AND d."tenantId" = :tenant_id
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+"""
+
+# The rollup stores, per installation, how many InstallationData rows with emissions it was
+# built from and their latest updatedAt (Emission or InstallationData). Installations whose
+# live values differ are stale and fall back to the live aggregate, so results do not lag
+# behind the fingerprint-keyed caches. The live values never read emission rows: each
+# InstallationData row (one per reporting period) costs one backward probe of
+# _EMISSION_UPDATED_INDEX for its latest "updatedAt". Deleting Emission rows other than the
+# most recently updated one leaves no trace there; those show up after the next refresh.
+_YEARLY_ROLLUP_QUERY = f"""
+        WITH periods AS (
+            SELECT
+                d."installationId" AS installation_id,
+                d."updatedAt" AS data_updated,
+                (SELECT MAX(e."updatedAt") FROM "Emission" e WHERE e."installationDataId" = d.id) AS emission_updated
+            FROM "InstallationData" d
+            WHERE d."installationId" = ANY(:installation_ids)
+              AND d."tenantId" = :tenant_id
+        ),
+        live AS (
+            SELECT
+                installation_id,
+                COUNT(emission_updated) AS source_data_rows,
+                MAX(GREATEST(emission_updated, data_updated)) FILTER (WHERE emission_updated IS NOT NULL)
+                    AS source_max_updated
+            FROM periods
+            GROUP BY 1
+        ),
+        snapshot AS (
+            SELECT installation_id, MAX(source_data_rows) AS source_data_rows, MAX(source_max_updated) AS source_max_updated
+            FROM {EMISSION_ROLLUP_VIEW}
+            WHERE installation_id = ANY(:installation_ids)
+              AND tenant_id = :tenant_id
+            GROUP BY 1
+        ),
+        stale AS (
+            SELECT installation_id
+            FROM live FULL JOIN snapshot USING (installation_id)
+            WHERE COALESCE(live.source_data_rows, 0) <> COALESCE(snapshot.source_data_rows, 0)
+               OR live.source_max_updated IS DISTINCT FROM snapshot.source_max_updated
+        )
+        SELECT installation_id, year, {", ".join(_YEARLY_AGGREGATES)}
+        FROM {EMISSION_ROLLUP_VIEW}
+        WHERE installation_id = ANY(:installation_ids)
+          AND tenant_id = :tenant_id
+          AND installation_id NOT IN (SELECT installation_id FROM stale)
+        UNION ALL
+        SELECT
+            d."installationId" AS installation_id,
+            COALESCE(d."reportingYear", 0) AS year,
+            {_YEARLY_SELECT}
+        FROM "Emission" e
+        JOIN "InstallationData" d ON e."installationDataId" = d.id
+        WHERE d."installationId" IN (SELECT installation_id FROM stale)
+          AND d."tenantId" = :tenant_id
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+"""
+
+_EMISSION_UPDATED_INDEX = "ai_emission_data_updated"
+
+
+def refresh_emission_rollup(db) -> None:
+    """Create the yearly emission rollup if missing, then refresh it without blocking readers."""
+    global _rollup_ready
+    with observe_query("rollup_refresh"):
+        created = db.execute(text("SELECT to_regclass(:view) IS NOT NULL"), {"view": EMISSION_ROLLUP_VIEW}).scalar()
+        if not created:
+            # The staleness check probes this index; built without blocking writes to "Emission"
+            with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS {_EMISSION_UPDATED_INDEX}
+                    ON "Emission" ("installationDataId", "updatedAt")
+                """))
+            db.execute(text(f"""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS {EMISSION_ROLLUP_VIEW} AS
+                SELECT
+                    d."installationId" AS installation_id,
+                    d."tenantId" AS tenant_id,
+                    COALESCE(d."reportingYear", 0) AS year,
+                    {_YEARLY_SELECT},
+                    SUM(COUNT(DISTINCT d.id)) OVER w AS source_data_rows,
+                    MAX(MAX(GREATEST(e."updatedAt", d."updatedAt"))) OVER w AS source_max_updated
+                FROM "Emission" e
+                JOIN "InstallationData" d ON e."installationDataId" = d.id
+                GROUP BY 1, 2, 3
+                WINDOW w AS (PARTITION BY d."installationId", d."tenantId")
+            """))
+            # CONCURRENTLY refreshes need a unique index on plain columns
+            db.execute(text(f"""
+                CREATE UNIQUE INDEX IF NOT EXISTS {EMISSION_ROLLUP_VIEW}_key
+                ON {EMISSION_ROLLUP_VIEW} (installation_id, tenant_id, year)
+            """))
+        else:
+            db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {EMISSION_ROLLUP_VIEW}"))
+        db.commit()
+    _rollup_ready = True
+
+
+_INSTALLATION_QUERY = """
         SELECT
             i.id,
             i."name" as installation_name,
@@ -53,27 +317,429 @@ def fetch_installation_summary(db, installation_id: str, tenant_id: str) -> dict
         WHERE i.id = :installation_id
           AND i."tenantId" = :tenant_id
         LIMIT 1
-    """)
-    result = db.execute(query, {"installation_id": installation_id, "tenant_id": tenant_id})
-    row = result.fetchone()
+"""
+
+
+def fetch_installation_summary(db, installation_id: str, tenant_id: str) -> dict | None:
+    """Fetch installation basic info for report narrative."""
+    with observe_query("installation"):
+        result = db.execute(text(_INSTALLATION_QUERY), {"installation_id": installation_id, "tenant_id": tenant_id})
+        row = result.fetchone()
     return dict(row._mapping) if row else None
 
 
-def fetch_balance_data(db, installation_id: str, tenant_id: str) -> list[dict]:
-    """Fetch GHG balance data for analysis."""
+def fetch_installation_summary_many(db, installation_ids: list[str], tenant_id: str) -> dict[str, dict | None]:
+    """Fetch installation basic info for many installations in one query (None for unknown ids)."""
     query = text("""
+        SELECT
+            i.id,
+            i."name" as installation_name,
+            c."name" as company_name,
+            co."name" as country_name
+        FROM "Installation" i
+        JOIN "Company" c ON i."companyId" = c.id
+        LEFT JOIN "Country" co ON i."countryId" = co.id
+        WHERE i.id = ANY(:installation_ids)
+          AND i."tenantId" = :tenant_id
+    """)
+    with observe_query("installation_many"):
+        result = db.execute(query, {"installation_ids": list(installation_ids), "tenant_id": tenant_id})
+        rows = result.fetchall()
+    summaries: dict[str, dict | None] = {iid: None for iid in installation_ids}
+    for row in rows:
+        summaries[row.id] = dict(row._mapping)
+    return summaries
+
+
+_BALANCE_QUERY = f"""
         SELECT
             gb.id,
-            gb."directEmissions",
-            gb."indirectEmissions",
-            gb."totalEmissions",
+            {_float8_columns(_BALANCE_NUMERIC)},
             id2."reportingYear"
         FROM "GhgBalanceByType" gb
         JOIN "InstallationData" id2 ON gb."installationDataId" = id2.id
         WHERE id2."installationId" = :installation_id
           AND id2."tenantId" = :tenant_id
         ORDER BY id2."reportingYear" ASC
+"""
+
+
+def fetch_balance_data(db, installation_id: str, tenant_id: str) -> BalanceFrame:
+    """Fetch GHG balance data for analysis (converted chunk by chunk, like fetch_emission_data)."""
+    return BalanceFrame.concat(_stream_frames(
+        db, _BALANCE_QUERY, BalanceFrame, "balances", ANOMALY_STREAM_CHUNK_ROWS,
+        {"installation_id": installation_id, "tenant_id": tenant_id},
+    ))
+
+
+def stream_balance_data(
+    db,
+    installation_id: str,
+    tenant_id: str,
+    chunk_size: int = ANOMALY_STREAM_CHUNK_ROWS,
+) -> Iterator[BalanceFrame]:
+    """Yield an installation's GHG balance rows as frames of at most `chunk_size` rows."""
+    return _stream_frames(
+        db, _BALANCE_QUERY, BalanceFrame, "balances_stream", chunk_size,
+        {"installation_id": installation_id, "tenant_id": tenant_id},
+    )
+
+
+_BALANCE_MANY_QUERY = f"""
+        SELECT
+            id2."installationId" as installation_id,
+            gb.id,
+            {_float8_columns(_BALANCE_NUMERIC)},
+            id2."reportingYear"
+        FROM "GhgBalanceByType" gb
+        JOIN "InstallationData" id2 ON gb."installationDataId" = id2.id
+        WHERE id2."installationId" = ANY(:installation_ids)
+          AND id2."tenantId" = :tenant_id
+        ORDER BY id2."installationId", id2."reportingYear" ASC
+"""
+
+
+def fetch_balance_data_many(db, installation_ids: list[str], tenant_id: str) -> dict[str, BalanceFrame]:
+    """Fetch GHG balance data for many installations in one query, split per installation."""
+    query = text(_BALANCE_MANY_QUERY)
+    with observe_query("balances_many"):
+        result = db.execute(query, {"installation_ids": list(installation_ids), "tenant_id": tenant_id})
+        rows = result.fetchall()
+    keys = list(result.keys())[1:]
+
+    grouped: dict[str, list] = {iid: [] for iid in installation_ids}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(row[1:])
+    return {iid: BalanceFrame.from_rows(group, keys) for iid, group in grouped.items()}
+
+
+def fetch_tenant_installation_ids(db, tenant_id: str) -> list[str]:
+    """Fetch the ids of all installations of a tenant."""
+    query = text("""
+        SELECT i.id
+        FROM "Installation" i
+        WHERE i."tenantId" = :tenant_id
+        ORDER BY i.id
+    """)
+    with observe_query("tenant_installations"):
+        result = db.execute(query, {"tenant_id": tenant_id})
+        rows = result.fetchall()
+    return [row[0] for row in rows]
+
+
+def fetch_data_fingerprint(db, installation_id: str, tenant_id: str) -> dict:
+    """Fetch row counts and latest timestamps that change whenever an installation's data changes."""
+    query = text("""
+        SELECT
+            em.row_count AS emission_count,
+            em.max_created AS emission_max_created,
+            em.max_updated AS emission_max_updated,
+            gb.row_count AS balance_count,
+            gb.max_created AS balance_max_created,
+            ida.row_count AS installation_data_count,
+            ida.max_updated AS installation_data_max_updated
+        FROM (
+            SELECT COUNT(*) AS row_count, MAX(e."createdAt") AS max_created, MAX(e."updatedAt") AS max_updated
+            FROM "Emission" e
+            JOIN "InstallationData" id2 ON e."installationDataId" = id2.id
+            WHERE id2."installationId" = :installation_id
+              AND id2."tenantId" = :tenant_id
+        ) em
+        CROSS JOIN (
+            SELECT COUNT(*) AS row_count, MAX(gb."createdAt") AS max_created
+            FROM "GhgBalanceByType" gb
+            JOIN "InstallationData" id2 ON gb."installationDataId" = id2.id
+            WHERE id2."installationId" = :installation_id
+              AND id2."tenantId" = :tenant_id
+        ) gb
+        CROSS JOIN (
+            SELECT COUNT(*) AS row_count, MAX(id2."updatedAt") AS max_updated
+            FROM "InstallationData" id2
+            WHERE id2."installationId" = :installation_id
+              AND id2."tenantId" = :tenant_id
+        ) ida
+    """)
+    with observe_query("fingerprint"):
+        result = db.execute(query, {"installation_id": installation_id, "tenant_id": tenant_id})
+        row = result.fetchone()
+    return dict(row._mapping) if row else {}
+
+
+# Column name -> SQL expression for the columnar bundle query.
+# Names match the keys returned by fetch_emission_data / fetch_balance_data.
+_BUNDLE_EMISSION_COLUMNS = {
+    "id": "e.id",
+    "createdAt": 'e."createdAt"',
+    "aDValue": 'e."aDValue"::float8',
+    "eFValue": 'e."eFValue"::float8',
+    "directEmissions": 'e."directEmissions"::float8',
+    "indirectEmissions": 'e."indirectEmissions"::float8',
+    "totalCo2Emissions": 'e."totalCo2Emissions"::float8',
+    "reportingYear": 'd."reportingYear"',
+    "emission_type": 'et."name"',
+}
+
+_BUNDLE_BALANCE_COLUMNS = {
+    "id": "gb.id",
+    "directEmissions": 'gb."directEmissions"::float8',
+    "indirectEmissions": 'gb."indirectEmissions"::float8',
+    "totalEmissions": 'gb."totalEmissions"::float8',
+    "reportingYear": 'd."reportingYear"',
+}
+
+BUNDLE_PARTS = ("installation", "emissions", "balances")
+# Optional bundle part: per-year emission sums instead of raw emission rows
+BUNDLE_YEARLY = "yearly"
+
+
+def _columnar_select(columns: dict[str, str], order_by: str) -> str:
+    """json_build_object of one array per column, all aggregated in the same row order."""
+    fields = ",\n".join(
+        f"'{name}', COALESCE(json_agg({expr} ORDER BY {order_by}), '[]'::json)"
+        for name, expr in columns.items()
+    )
+    return f"json_build_object(\n{fields}\n)"
+
+
+def fetch_installation_bundle(
+    db,
+    installation_id: str,
+    tenant_id: str,
+    include: tuple[str, ...] = BUNDLE_PARTS,
+) -> dict:
+    """
+    Fetch installation info, emissions and balances in a single statement.
+
+    The InstallationData rows are resolved once in a CTE and shared by the
+    emission and balance aggregates. Emissions and balances come back
+    columnar ({column: [values...]}) and are loaded straight into frames,
+    so no per-row dicts are built.
+
+    Returns:
+        Dict with one entry per requested part: "installation" (dict | None),
+        "emissions" (EmissionFrame), "yearly" (YearlyAggregate, per-year sums
+        computed in SQL) and "balances" (BalanceFrame)
+    """
+    selects = []
+    if "installation" in include:
+        selects.append("""
+            (SELECT row_to_json(i) FROM (
+                SELECT
+                    inst.id,
+                    inst."name" as installation_name,
+                    c."name" as company_name,
+                    co."name" as country_name
+                FROM "Installation" inst
+                JOIN "Company" c ON inst."companyId" = c.id
+                LEFT JOIN "Country" co ON inst."countryId" = co.id
+                WHERE inst.id = :installation_id
+                  AND inst."tenantId" = :tenant_id
+                LIMIT 1
+            ) i) AS installation""")
+    if "emissions" in include:
+        selects.append(f"""
+            (SELECT {_columnar_select(_BUNDLE_EMISSION_COLUMNS, 'd."reportingYear", e."createdAt", e.id')}
+             FROM "Emission" e
+             JOIN data d ON e."installationDataId" = d.id
+             LEFT JOIN "EmissionType" et ON e."emissionTypeId" = et.id) AS emissions""")
+    if BUNDLE_YEARLY in include:
+        selects.append(f"""
+            (SELECT {_columnar_select({name: f"y.{name}" for name in ("year", *_YEARLY_AGGREGATES)}, "y.year")}
+             FROM (
+                SELECT COALESCE(d."reportingYear", 0) AS year, {_YEARLY_SELECT}
+                FROM "Emission" e
+                JOIN data d ON e."installationDataId" = d.id
+                GROUP BY 1
+             ) y) AS yearly""")
+    if "balances" in include:
+        selects.append(f"""
+            (SELECT {_columnar_select(_BUNDLE_BALANCE_COLUMNS, 'd."reportingYear", gb.id')}
+             FROM "GhgBalanceByType" gb
+             JOIN data d ON gb."installationDataId" = d.id) AS balances""")
+    if not selects:
+        return {}
+
+    query = text(f"""
+        WITH data AS (
+            SELECT id, "reportingYear"
+            FROM "InstallationData"
+            WHERE "installationId" = :installation_id
+              AND "tenantId" = :tenant_id
+        )
+        SELECT {",".join(selects)}
     """)
-    result = db.execute(query, {"installation_id": installation_id, "tenant_id": tenant_id})
-    rows = result.fetchall()
-    return [dict(row._mapping) for row in rows]
+    with observe_query("bundle"):
+        result = db.execute(query, {"installation_id": installation_id, "tenant_id": tenant_id})
+        row = result.fetchone()
+    mapping = dict(row._mapping) if row else {}
+
+    bundle = {}
+    if "installation" in include:
+        bundle["installation"] = mapping.get("installation")
+    if "emissions" in include:
+        bundle["emissions"] = EmissionFrame.from_columns(mapping.get("emissions"))
+    if BUNDLE_YEARLY in include:
+        bundle[BUNDLE_YEARLY] = YearlyAggregate.from_columns(mapping.get("yearly"))
+    if "balances" in include:
+        bundle["balances"] = BalanceFrame.from_columns(mapping.get("balances"))
+    return bundle
+
+
+# =============================================================================
+# Async variants (asyncpg engine)
+# =============================================================================
+
+async def afetch_emission_data(engine, installation_id: str, tenant_id: str) -> EmissionFrame:
+    """fetch_emission_data on the async engine."""
+    return await _afetch_frame(
+        engine, _EMISSION_QUERY, EmissionFrame, "emissions",
+        {"installation_id": installation_id, "tenant_id": tenant_id},
+    )
+
+
+async def afetch_balance_data(engine, installation_id: str, tenant_id: str) -> BalanceFrame:
+    """fetch_balance_data on the async engine."""
+    return await _afetch_frame(
+        engine, _BALANCE_QUERY, BalanceFrame, "balances",
+        {"installation_id": installation_id, "tenant_id": tenant_id},
+    )
+
+
+async def afetch_installation_summary(engine, installation_id: str, tenant_id: str) -> dict | None:
+    """fetch_installation_summary on the async engine."""
+    async with engine.connect() as conn:
+        with observe_query("installation"):
+            result = await conn.execute(
+                text(_INSTALLATION_QUERY), {"installation_id": installation_id, "tenant_id": tenant_id}
+            )
+            row = result.fetchone()
+    return dict(row._mapping) if row else None
+
+
+async def afetch_yearly_emissions(engine, installation_id: str, tenant_id: str) -> YearlyAggregate:
+    """fetch_yearly_emissions on the async engine."""
+    use_rollup = EMISSION_ROLLUP_ENABLED and _rollup_ready
+    async with engine.connect() as conn:
+        with observe_query("yearly_rollup" if use_rollup else "yearly"):
+            result = await conn.execute(
+                text(_YEARLY_ROLLUP_QUERY if use_rollup else _YEARLY_LIVE_QUERY),
+                {"installation_ids": [installation_id], "tenant_id": tenant_id},
+            )
+            rows = result.fetchall()
+    return YearlyAggregate.from_rows([row[1:] for row in rows], list(result.keys())[1:])
+
+
+async def afetch_installation_bundle(
+    engine,
+    installation_id: str,
+    tenant_id: str,
+    include: tuple[str, ...] = BUNDLE_PARTS,
+) -> dict:
+    """
+    fetch_installation_bundle on the async engine: one query per requested
+    part, all in flight at once on separate pooled connections.
+    """
+    fetchers = {
+        "installation": afetch_installation_summary,
+        "emissions": afetch_emission_data,
+        BUNDLE_YEARLY: afetch_yearly_emissions,
+        "balances": afetch_balance_data,
+    }
+    parts = [part for part in fetchers if part in include]
+    results = await asyncio.gather(*(fetchers[part](engine, installation_id, tenant_id) for part in parts))
+    return dict(zip(parts, results))
+
+
+async def _afetch_frame(
+    engine, sql: str, frame_cls, query_type: str, params: dict, chunk_size: int = ANOMALY_STREAM_CHUNK_ROWS,
+):
+    # Same chunked server-side cursor read as _stream_frames
+    async with engine.connect() as conn:
+        with observe_query(query_type):
+            result = await conn.stream(text(sql).execution_options(yield_per=chunk_size), params)
+            keys = list(result.keys())
+            frames = [frame_cls.from_rows(rows, keys) async for rows in result.partitions(chunk_size)]
+    return frame_cls.concat(frames)
+
+
+# =============================================================================
+# Bulk COPY loaders (tenant-wide analytics)
+# =============================================================================
+
+def copy_emission_data_many(db, installation_ids: list[str], tenant_id: str) -> dict[str, EmissionFrame]:
+    """
+    fetch_emission_data_many over COPY ... TO STDOUT.
+
+    The result is streamed as CSV and parsed by pandas' C reader straight into
+    typed columns, so no per-row Python objects are built. Frames are views
+    into those columns, one slice per installation.
+    """
+    columns = _copy_columns(
+        db, _EMISSION_MANY_QUERY, {"installation_ids": list(installation_ids), "tenant_id": tenant_id},
+        "emissions_copy", EMISSION_FIELDS,
+    )
+    return _split_columns(columns, installation_ids, EmissionFrame)
+
+
+def copy_balance_data_many(db, installation_ids: list[str], tenant_id: str) -> dict[str, BalanceFrame]:
+    """fetch_balance_data_many over COPY ... TO STDOUT (see copy_emission_data_many)."""
+    columns = _copy_columns(
+        db, _BALANCE_MANY_QUERY, {"installation_ids": list(installation_ids), "tenant_id": tenant_id},
+        "balances_copy", BALANCE_FIELDS,
+    )
+    return _split_columns(columns, installation_ids, BalanceFrame)
+
+
+# :name placeholders, but not the second colon of a ::cast
+_NAMED_PARAM = re.compile(r"(?<!:):(\w+)")
+
+
+def _copy_csv(db, sql: str, params: dict) -> io.BytesIO:
+    """Run COPY (sql) TO STDOUT as CSV with a header on the session's psycopg2 connection."""
+    cursor = db.connection().connection.cursor()
+    try:
+        # COPY takes no bind parameters; psycopg2 renders them as quoted literals
+        select = cursor.mogrify(_NAMED_PARAM.sub(r"%(\1)s", sql), params).decode()
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer)
+    finally:
+        cursor.close()
+    buffer.seek(0)
+    return buffer
+
+
+def _copy_columns(db, sql: str, params: dict, query_type: str, fields: dict[str, str]) -> dict[str, np.ndarray]:
+    """Frame attribute -> column array, plus "installation_id", parsed from a COPY of `sql`."""
+    text_columns = ["installation_id"] + [name for name, attr in fields.items() if attr in ("id", "created_at", "emission_type")]
+    with observe_query(query_type):
+        buffer = _copy_csv(db, sql, params)
+    # Unquoted empty fields are NULLs; float8 values are written in round-trip form
+    df = pd.read_csv(
+        buffer, dtype={name: object for name in text_columns}, keep_default_na=False, na_values=[""],
+        float_precision="round_trip",
+    )
+
+    columns = {"installation_id": df["installation_id"].to_numpy(object)}
+    for name, attr in fields.items():
+        column = df[name] if name in df else pd.Series(np.nan, index=df.index)
+        if attr == "year":
+            columns[attr] = column.fillna(0).to_numpy(np.int64)
+        elif name in text_columns:
+            columns[attr] = column.astype(object).where(column.notna(), None).to_numpy(object)
+            if attr == "created_at":
+                columns[attr] = timestamp_column(columns[attr])
+        else:
+            columns[attr] = column.to_numpy(np.float64)
+    return columns
+
+
+def _split_columns(columns: dict[str, np.ndarray], installation_ids: list[str], frame_cls) -> dict:
+    # Rows are ordered by installation, so each installation is one contiguous slice
+    owner = columns.pop("installation_id")
+    starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]]) if len(owner) else np.zeros(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(owner)]
+
+    frames = {iid: frame_cls.from_columns({}) for iid in installation_ids}
+    for start, end in zip(starts, ends):
+        frames[owner[start]] = frame_cls(**{attr: values[start:end] for attr, values in columns.items()})
+    return frames
@@ -0,0 +1,104 @@
+"""
+Connection pools
+Pool settings and instrumentation shared by the sync and async engines.
+
+Pools are QueuePools whose checkout wait (time in _do_get, including opening
+a new connection) goes to DB_POOL_CHECKOUT_WAIT; instrument_engine adds the
+checked-out and overflow gauges and times pre-pings. Metrics are labelled
+with the pool name ("sync", "async").
+
+With DB_PGBOUNCER the service talks to PgBouncer in transaction mode: no
+pre-ping (PgBouncer checks its server connections itself), and asyncpg
+prepared statements are neither cached nor reused by name, since
+consecutive transactions may run on different server connections.
+"""
+
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from config import (
+    DB_PGBOUNCER,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_PRE_PING,
+)
+from metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_CHECKOUT_WAIT, DB_POOL_PRE_PING
+
+
+class _TimedCheckout:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(pool=self._orig_logging_name).observe(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool that records checkout waits."""
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout waits."""
+
+
+def engine_options(name: str, async_driver: bool = False) -> dict:
+    """create_engine / create_async_engine keyword arguments for the configured pool."""
+    options = {
+        "poolclass": InstrumentedAsyncQueuePool if async_driver else InstrumentedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_PGBOUNCER and async_driver:
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4().hex}__",
+        }
+    return options
+
+
+def instrument_engine(engine, name: str):
+    """Export pool occupancy and pre-ping durations for a (sync) engine; returns the engine."""
+    pool = engine.pool
+    size = pool.size()
+    lock = threading.Lock()
+    counts = {"checked_out": 0, "open": 0}
+
+    # Counted from events: the pool's own counters are only updated after checkin/close fire
+    def _count(key: str, delta: int):
+        def listener(*_) -> None:
+            with lock:
+                counts[key] += delta
+                DB_POOL_CHECKED_OUT.labels(pool=name).set(counts["checked_out"])
+                DB_POOL_OVERFLOW.labels(pool=name).set(max(counts["open"] - size, 0))
+        return listener
+
+    event.listen(pool, "checkout", _count("checked_out", 1))
+    event.listen(pool, "checkin", _count("checked_out", -1))
+    event.listen(pool, "connect", _count("open", 1))
+    event.listen(pool, "close", _count("open", -1))
+    event.listen(pool, "detach", _count("open", -1))
+
+    dialect = engine.dialect
+    ping = dialect.do_ping
+
+    def _timed_ping(dbapi_connection):
+        start = time.perf_counter()
+        try:
+            return ping(dbapi_connection)
+        finally:
+            DB_POOL_PRE_PING.labels(pool=name).observe(time.perf_counter() - start)
+
+    dialect.do_ping = _timed_ping
+    return engine
@@ -0,0 +1,109 @@
+"""
+Execution layer
+Bounded executors that keep blocking work off the asyncio event loop.
+
+Each kind of blocking work gets its own pool so one slow class of call
+cannot starve the others:
+- db:  synchronous SQLAlchemy queries
+- cpu: sklearn / XGBoost fitting and other CPU-bound model work
+
+LLM calls need no pool: they go through the async clients in llm_client.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import EXECUTOR_DB_WORKERS, EXECUTOR_CPU_WORKERS, EXECUTOR_QUEUE_LIMIT
+from metrics import EXECUTOR_QUEUE_DEPTH, EXECUTOR_ACTIVE, EXECUTOR_WAIT_DURATION, EXECUTOR_REJECTED
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when an executor's queue is full and the task is rejected."""
+
+
+class BoundedExecutor:
+    """Thread pool with a bounded queue and Prometheus queue/wait metrics."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._inflight = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    async def run(self, func, *args, **kwargs):
+        """Run `func(*args, **kwargs)` on this pool and await its result."""
+        with self._lock:
+            if self._inflight >= self.max_workers + self.max_queue:
+                EXECUTOR_REJECTED.labels(pool=self.name).inc()
+                raise ExecutorSaturatedError(f"{self.name} executor queue is full")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"ai-{self.name}")
+            executor = self._executor
+            self._inflight += 1
+            self._queued += 1
+            EXECUTOR_QUEUE_DEPTH.labels(pool=self.name).set(self._queued)
+
+        submitted = time.perf_counter()
+        ticket = {"started": False}
+        # Carry structlog contextvars over to the worker thread
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, self._invoke, ticket, submitted, func, args, kwargs)
+        future = executor.submit(call)
+        # Also fires when the task is cancelled before it starts (client disconnect, shutdown)
+        future.add_done_callback(functools.partial(self._release, ticket))
+        return await asyncio.wrap_future(future)
+
+    def _invoke(self, ticket: dict, submitted: float, func, args, kwargs):
+        with self._lock:
+            ticket["started"] = True
+            self._queued -= 1
+            EXECUTOR_QUEUE_DEPTH.labels(pool=self.name).set(self._queued)
+        EXECUTOR_WAIT_DURATION.labels(pool=self.name).observe(time.perf_counter() - submitted)
+        EXECUTOR_ACTIVE.labels(pool=self.name).inc()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            EXECUTOR_ACTIVE.labels(pool=self.name).dec()
+
+    def _release(self, ticket: dict, future) -> None:
+        with self._lock:
+            self._inflight -= 1
+            if not ticket["started"]:
+                self._queued -= 1
+                EXECUTOR_QUEUE_DEPTH.labels(pool=self.name).set(self._queued)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+db_executor = BoundedExecutor("db", EXECUTOR_DB_WORKERS, EXECUTOR_QUEUE_LIMIT)
+cpu_executor = BoundedExecutor("cpu", EXECUTOR_CPU_WORKERS, EXECUTOR_QUEUE_LIMIT)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call on the db executor."""
+    return await db_executor.run(func, *args, **kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run CPU-bound model work on the cpu executor."""
+    return await cpu_executor.run(func, *args, **kwargs)
+
+
+def shutdown_executors() -> None:
+    for executor in (db_executor, cpu_executor):
+        executor.shutdown()
@@ -0,0 +1,335 @@
+"""
+Columnar frames
+Typed NumPy containers for emission and balance rows.
+
+The data layer returns these instead of list[dict] so that numeric columns
+are converted to float64 once, and per-year aggregates are computed once
+with vectorized group-bys and shared by the forecast, anomaly and
+narrative services. Endpoints that only need per-year totals can load a
+YearlyAggregate aggregated in SQL instead of raw rows.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+from typing import Iterable
+
+import numpy as np
+
+# Source column name -> frame attribute
+EMISSION_FIELDS = {
+    "id": "id",
+    "createdAt": "created_at",
+    "aDValue": "ad_value",
+    "eFValue": "ef_value",
+    "directEmissions": "direct",
+    "indirectEmissions": "indirect",
+    "totalCo2Emissions": "total",
+    "reportingYear": "year",
+    "emission_type": "emission_type",
+}
+
+BALANCE_FIELDS = {
+    "id": "id",
+    "directEmissions": "direct",
+    "indirectEmissions": "indirect",
+    "totalEmissions": "total",
+    "reportingYear": "year",
+}
+
+_OBJECT_ATTRS = {"id", "created_at", "emission_type"}
+
+
+def float_column(values: Iterable) -> np.ndarray:
+    """Convert values to float64; None and unparseable values become NaN."""
+    values = list(values)
+    try:
+        return np.array(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        out = np.empty(len(values), dtype=np.float64)
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v) if v is not None else np.nan
+            except (ValueError, TypeError):
+                out[i] = np.nan
+        return out
+
+
+def year_column(values: Iterable) -> np.ndarray:
+    """Convert reporting years to int64; missing or invalid years become 0."""
+    values = list(values)
+    try:
+        return np.array([v or 0 for v in values], dtype=np.int64)
+    except (ValueError, TypeError):
+        out = np.zeros(len(values), dtype=np.int64)
+        for i, v in enumerate(values):
+            try:
+                out[i] = int(v) if v else 0
+            except (ValueError, TypeError):
+                out[i] = 0
+        return out
+
+
+def timestamp_column(values: Iterable) -> np.ndarray:
+    """Object column of datetimes; ISO strings (json_agg, COPY output) are parsed, unparseable ones become None."""
+    out = object_column(values)
+    for i, v in enumerate(out):
+        if isinstance(v, str):
+            try:
+                out[i] = datetime.fromisoformat(v)
+            except ValueError:
+                out[i] = None
+    return out
+
+
+def object_column(values: Iterable) -> np.ndarray:
+    values = list(values)
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+
+@dataclass
+class YearlyAggregate:
+    """Per-year sums over the rows that carry a valid reportingYear.
+
+    Attributes:
+        years: Sorted distinct reporting years
+        direct, indirect, total: Column sums (missing values count as 0)
+        count: Number of rows per year
+        forecast_total: Sum of totalCo2Emissions, falling back to directEmissions
+            when the total is missing or zero
+        forecast_count: Rows that contributed a non-zero value to forecast_total
+        total_count: Rows with a non-zero totalCo2Emissions
+        records: Number of source rows, including rows without a valid year
+    """
+
+    years: np.ndarray
+    direct: np.ndarray
+    indirect: np.ndarray
+    total: np.ndarray
+    count: np.ndarray
+    forecast_total: np.ndarray
+    forecast_count: np.ndarray
+    total_count: np.ndarray
+    records: int = 0
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+    def forecast_series(self) -> tuple[np.ndarray, np.ndarray]:
+        """Years and totals used for forecasting (years without any emission value dropped)."""
+        mask = self.forecast_count > 0
+        return self.years[mask], self.forecast_total[mask]
+
+    def total_series(self) -> tuple[np.ndarray, np.ndarray]:
+        """Years and totalCo2Emissions sums, for years with at least one non-zero total."""
+        mask = self.total_count > 0
+        return self.years[mask], self.total[mask]
+
+    @classmethod
+    def empty(cls, records: int = 0) -> "YearlyAggregate":
+        f = np.zeros(0, dtype=np.float64)
+        i = np.zeros(0, dtype=np.int64)
+        return cls(i, f, f, f, i, f, i, i, records)
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list] | None) -> "YearlyAggregate":
+        """Build from per-year rows aggregated in SQL ({column: [values...]}, keyed like the fields)."""
+        columns = columns or {}
+        years = year_column(columns.get("year", []))
+        count = np.nan_to_num(float_column(columns.get("count", []))).astype(np.int64)
+        valid = years > 0
+        order = np.argsort(years[valid], kind="stable")
+
+        def _col(name: str, dtype=np.float64) -> np.ndarray:
+            values = np.nan_to_num(float_column(columns.get(name, [0] * len(years))))
+            return values[valid][order].astype(dtype)
+
+        return cls(
+            years=years[valid][order],
+            direct=_col("direct"),
+            indirect=_col("indirect"),
+            total=_col("total"),
+            count=count[valid][order],
+            forecast_total=_col("forecast_total"),
+            forecast_count=_col("forecast_count", np.int64),
+            total_count=_col("total_count", np.int64),
+            records=int(count.sum()),
+        )
+
+    @classmethod
+    def from_rows(cls, rows, keys) -> "YearlyAggregate":
+        return cls.from_columns(_rows_to_columns(rows, keys))
+
+
+@dataclass
+class EmissionFrame:
+    """Emission rows stored column-wise."""
+
+    id: np.ndarray
+    year: np.ndarray
+    ad_value: np.ndarray
+    ef_value: np.ndarray
+    direct: np.ndarray
+    indirect: np.ndarray
+    total: np.ndarray
+    emission_type: np.ndarray
+    created_at: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list] | None) -> "EmissionFrame":
+        return cls(**_convert_columns(columns or {}, EMISSION_FIELDS))
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "EmissionFrame":
+        return cls.from_columns({name: [r.get(name) for r in records] for name in EMISSION_FIELDS})
+
+    @classmethod
+    def from_rows(cls, rows, keys) -> "EmissionFrame":
+        """Build from driver rows (tuples) and their column names."""
+        return cls.from_columns(_rows_to_columns(rows, keys))
+
+    @classmethod
+    def concat(cls, frames: Iterable["EmissionFrame"]) -> "EmissionFrame":
+        """One frame from consecutive chunks (e.g. from stream_emission_data)."""
+        return _concat_frames(cls, frames, EMISSION_FIELDS)
+
+    def row(self, i: int) -> dict:
+        """Single row as a dict keyed by source column names."""
+        return _row_dict(self, i, EMISSION_FIELDS)
+
+    @cached_property
+    def yearly(self) -> YearlyAggregate:
+        valid = self.year > 0
+        if not valid.any():
+            return YearlyAggregate.empty(len(self))
+        years, inverse = np.unique(self.year[valid], return_inverse=True)
+        n = len(years)
+
+        direct = np.nan_to_num(self.direct[valid])
+        indirect = np.nan_to_num(self.indirect[valid])
+        total = np.nan_to_num(self.total[valid])
+        forecast_value = np.where(total != 0, total, direct)
+
+        def _sum(weights: np.ndarray) -> np.ndarray:
+            return np.bincount(inverse, weights=weights, minlength=n)
+
+        def _count(mask: np.ndarray) -> np.ndarray:
+            return np.bincount(inverse[mask], minlength=n).astype(np.int64)
+
+        return YearlyAggregate(
+            years=years,
+            direct=_sum(direct),
+            indirect=_sum(indirect),
+            total=_sum(total),
+            count=np.bincount(inverse, minlength=n).astype(np.int64),
+            forecast_total=_sum(forecast_value),
+            forecast_count=_count(forecast_value != 0),
+            total_count=_count(total != 0),
+            records=len(self),
+        )
+
+
+@dataclass
+class BalanceFrame:
+    """GHG balance rows stored column-wise."""
+
+    id: np.ndarray
+    year: np.ndarray
+    direct: np.ndarray
+    indirect: np.ndarray
+    total: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list] | None) -> "BalanceFrame":
+        return cls(**_convert_columns(columns or {}, BALANCE_FIELDS))
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "BalanceFrame":
+        return cls.from_columns({name: [r.get(name) for r in records] for name in BALANCE_FIELDS})
+
+    @classmethod
+    def from_rows(cls, rows, keys) -> "BalanceFrame":
+        return cls.from_columns(_rows_to_columns(rows, keys))
+
+    @classmethod
+    def concat(cls, frames: Iterable["BalanceFrame"]) -> "BalanceFrame":
+        return _concat_frames(cls, frames, BALANCE_FIELDS)
+
+    def row(self, i: int) -> dict:
+        return _row_dict(self, i, BALANCE_FIELDS)
+
+
+def as_emission_frame(data: "EmissionFrame | list[dict] | None") -> EmissionFrame:
+    """Accept either a frame or legacy list[dict] emission records."""
+    if isinstance(data, EmissionFrame):
+        return data
+    return EmissionFrame.from_records(data or [])
+
+
+def as_yearly(data: "YearlyAggregate | EmissionFrame | list[dict] | None") -> YearlyAggregate:
+    """Per-year emission aggregate from a pre-aggregated result, a frame or list[dict] records."""
+    if isinstance(data, YearlyAggregate):
+        return data
+    return as_emission_frame(data).yearly
+
+
+def as_balance_frame(data: "BalanceFrame | list[dict] | None") -> BalanceFrame:
+    """Accept either a frame or legacy list[dict] balance records."""
+    if isinstance(data, BalanceFrame):
+        return data
+    return BalanceFrame.from_records(data or [])
+
+
+def _rows_to_columns(rows, keys) -> dict[str, list]:
+    keys = list(keys)
+    rows = list(rows)
+    if not rows:
+        return {k: [] for k in keys}
+    return {k: list(col) for k, col in zip(keys, zip(*rows))}
+
+
+def _convert_columns(columns: dict[str, list], fields: dict[str, str]) -> dict[str, np.ndarray]:
+    length = max((len(v) for v in columns.values()), default=0)
+    out = {}
+    for name, attr in fields.items():
+        values = columns.get(name)
+        if values is None:
+            values = [None] * length
+        if attr == "year":
+            out[attr] = year_column(values)
+        elif attr == "created_at":
+            out[attr] = timestamp_column(values)
+        elif attr in _OBJECT_ATTRS:
+            out[attr] = object_column(values)
+        else:
+            out[attr] = float_column(values)
+    return out
+
+
+def _concat_frames(cls, frames, fields: dict[str, str]):
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    if not frames:
+        return cls.from_columns({})
+    return cls(**{attr: np.concatenate([getattr(f, attr) for f in frames]) for attr in fields.values()})
+
+
+def _row_dict(frame, i: int, fields: dict[str, str]) -> dict:
+    row = {}
+    for name, attr in fields.items():
+        value = getattr(frame, attr)[i]
+        if attr == "year":
+            value = int(value) if value else None
+        elif attr not in _OBJECT_ATTRS:
+            value = None if np.isnan(value) else float(value)
+        row[name] = value
+    return row
@@ -0,0 +1,121 @@
+"""
+Job store
+Status, progress and per-item results of background jobs, shared by every
+worker process and replica.
+
+A background job (anomaly scan, narrative job) runs as an asyncio task in the
+process that accepted it, but its polling requests may reach any worker. The
+running job therefore writes its fields, and each item's result as soon as it
+is ready, under its job id:
+
+  ai:jobs:{kind}:{job_id}          hash: job field -> JSON value
+  ai:jobs:{kind}:{job_id}:results  hash: item id -> JSON result
+
+Both keys expire `ttl` seconds after the job's last write. JOB_STORE=memory
+keeps them in the process instead (single-process development and tests).
+"""
+
+import asyncio
+import json
+import time
+
+from config import REDIS_URL, JOB_STORE
+
+
+class JobStoreUnavailableError(RuntimeError):
+    """Raised when the job store backend cannot be reached."""
+
+
+class JobStore:
+    """Job fields and item results by job id, expiring `ttl` seconds after the last write."""
+
+    def __init__(self, kind: str, ttl: int, backend: str | None = None, redis_url: str = REDIS_URL):
+        self.kind = kind
+        self.ttl = ttl
+        self.backend = backend or JOB_STORE
+        self._redis_url = redis_url
+        self._redis = None
+        self._redis_loop = None
+        self._memory: dict[str, tuple[float, dict[str, str]]] = {}
+
+    def make_key(self, job_id: str) -> str:
+        return f"ai:jobs:{self.kind}:{job_id}"
+
+    async def save(self, job_id: str, fields: dict, results: dict[str, dict] | None = None) -> None:
+        """Set job fields and item results, and restart the TTL of both."""
+        key = self.make_key(job_id)
+        encoded = {name: json.dumps(value, default=str) for name, value in fields.items()}
+        encoded_results = {item: json.dumps(result, default=str) for item, result in (results or {}).items()}
+        if self.backend == "memory":
+            self._memory_update(key, encoded)
+            self._memory_update(f"{key}:results", encoded_results)
+            return
+        try:
+            async with self._client().pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=encoded)
+                pipe.expire(key, self.ttl)
+                if encoded_results:
+                    pipe.hset(f"{key}:results", mapping=encoded_results)
+                pipe.expire(f"{key}:results", self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            raise JobStoreUnavailableError(f"{self.kind} job store: {e}") from e
+
+    async def load(self, job_id: str) -> dict | None:
+        """The job's fields, or None for an unknown or expired job."""
+        raw = await self._hgetall(self.make_key(job_id))
+        return {name: json.loads(value) for name, value in raw.items()} if raw else None
+
+    async def load_results(self, job_id: str) -> dict[str, dict]:
+        raw = await self._hgetall(f"{self.make_key(job_id)}:results")
+        return {item: json.loads(value) for item, value in raw.items()}
+
+    async def load_result(self, job_id: str, item_id: str) -> dict | None:
+        key = f"{self.make_key(job_id)}:results"
+        if self.backend == "memory":
+            raw = (self._memory_get(key) or {}).get(item_id)
+        else:
+            try:
+                raw = await self._client().hget(key, item_id)
+            except Exception as e:
+                raise JobStoreUnavailableError(f"{self.kind} job store: {e}") from e
+        return json.loads(raw) if raw is not None else None
+
+    async def _hgetall(self, key: str) -> dict[str, str]:
+        if self.backend == "memory":
+            return dict(self._memory_get(key) or {})
+        try:
+            raw = await self._client().hgetall(key)
+        except Exception as e:
+            raise JobStoreUnavailableError(f"{self.kind} job store: {e}") from e
+        return {_text(name): _text(value) for name, value in raw.items()}
+
+    def _memory_get(self, key: str) -> dict[str, str] | None:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._memory[key]
+            return None
+        return entry[1]
+
+    def _memory_update(self, key: str, values: dict[str, str]) -> None:
+        current = self._memory_get(key)
+        if current is None and not values:
+            return
+        current = {**(current or {}), **values}
+        self._memory[key] = (time.monotonic() + self.ttl, current)
+
+    def _client(self):
+        # redis.asyncio connections are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._redis is None or self._redis_loop is not loop:
+            from redis import asyncio as aioredis
+
+            self._redis = aioredis.Redis.from_url(self._redis_url, socket_connect_timeout=0.5, socket_timeout=1.0)
+            self._redis_loop = loop
+        return self._redis
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
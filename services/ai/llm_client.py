@@ -0,0 +1,254 @@
+"""
+LLM clients
+Long-lived async chat clients shared by all narrative requests.
+
+Each provider keeps one LangChain chat model, and with it one keep-alive HTTP
+connection pool, per event loop and calls it with ainvoke (or astream for
+token-by-token output). Every call is
+guarded by:
+  - a per-provider semaphore (LLM_MAX_CONCURRENCY calls in flight),
+  - a hard timeout around the completion (LLM_TIMEOUT_SECONDS),
+  - a circuit breaker: after LLM_BREAKER_FAILURES consecutive failures the
+    provider is skipped for LLM_BREAKER_RESET_SECONDS, then a single trial
+    call decides whether it is used again.
+"""
+
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Callable
+
+import structlog
+
+from config import (
+    ANTHROPIC_API_KEY,
+    OPENAI_API_KEY,
+    ANTHROPIC_BASE_URL,
+    OPENAI_BASE_URL,
+    NARRATIVE_MAX_TOKENS,
+    LLM_TIMEOUT_SECONDS,
+    LLM_MAX_RETRIES,
+    LLM_MAX_CONCURRENCY,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_RESET_SECONDS,
+)
+from metrics import LLM_REQUESTS, LLM_REQUEST_DURATION, LLM_CIRCUIT_OPEN
+
+logger = structlog.get_logger(service="ecosfer-ai", module="llm_client")
+
+# Provider name -> model it calls
+LLM_MODELS = {"claude": "claude-sonnet-4-5-20250929", "gpt-4": "gpt-4o"}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open trial call."""
+
+    def __init__(
+        self,
+        name: str,
+        failures: int = LLM_BREAKER_FAILURES,
+        reset_seconds: float = LLM_BREAKER_RESET_SECONDS,
+    ):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._trial = True  # half-open: let one call through
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("llm_circuit_closed", provider=self.name)
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+        LLM_CIRCUIT_OPEN.labels(provider=self.name).set(0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            self._trial = False
+            if self._opened_at is None and self._consecutive < self.failures:
+                return
+            if self._opened_at is None:
+                logger.warning("llm_circuit_opened", provider=self.name, failures=self._consecutive)
+            self._opened_at = time.monotonic()
+        LLM_CIRCUIT_OPEN.labels(provider=self.name).set(1)
+
+    def abandon(self) -> None:
+        """A call ended without an outcome (cancelled); free the trial slot."""
+        with self._lock:
+            self._trial = False
+
+
+class LLMProvider:
+    """One chat provider: a cached client plus its concurrency limit and circuit breaker."""
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], object],
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(name)
+        self._factory = factory
+        self._chat = None
+        self._slots: asyncio.Semaphore | None = None
+        self._loop = None
+
+    async def ainvoke(self, system_prompt: str, user_prompt: str) -> str:
+        """Return the completion text; raises CircuitOpenError without calling a failing provider."""
+        if not self.breaker.allow():
+            LLM_REQUESTS.labels(provider=self.name, outcome="circuit_open").inc()
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+
+        from langchain_core.messages import SystemMessage, HumanMessage
+
+        chat, slots = self._client()
+        async with slots:
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    chat.ainvoke([SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]),
+                    self.timeout,
+                )
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except TimeoutError:
+                self.breaker.record_failure()
+                LLM_REQUESTS.labels(provider=self.name, outcome="timeout").inc()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                LLM_REQUESTS.labels(provider=self.name, outcome="error").inc()
+                raise
+            finally:
+                LLM_REQUEST_DURATION.labels(provider=self.name).observe(time.perf_counter() - start)
+
+        self.breaker.record_success()
+        LLM_REQUESTS.labels(provider=self.name, outcome="success").inc()
+        return _text(response.content)
+
+    async def astream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Yield completion text as it is generated; the timeout bounds the whole stream."""
+        if not self.breaker.allow():
+            LLM_REQUESTS.labels(provider=self.name, outcome="circuit_open").inc()
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+
+        from langchain_core.messages import SystemMessage, HumanMessage
+
+        chat, slots = self._client()
+        async with slots:
+            start = time.perf_counter()
+            chunks = chat.astream([SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)])
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), start + self.timeout - time.perf_counter())
+                    except StopAsyncIteration:
+                        break
+                    if text := _text(chunk.content):
+                        yield text
+            except (asyncio.CancelledError, GeneratorExit):
+                # The consumer went away (client disconnect); not the provider's fault
+                self.breaker.abandon()
+                raise
+            except TimeoutError:
+                self.breaker.record_failure()
+                LLM_REQUESTS.labels(provider=self.name, outcome="timeout").inc()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                LLM_REQUESTS.labels(provider=self.name, outcome="error").inc()
+                raise
+            finally:
+                await chunks.aclose()
+                LLM_REQUEST_DURATION.labels(provider=self.name).observe(time.perf_counter() - start)
+
+        self.breaker.record_success()
+        LLM_REQUESTS.labels(provider=self.name, outcome="success").inc()
+
+    def _client(self):
+        # HTTP connections and semaphores belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._chat is None or self._loop is not loop:
+            self._chat = self._factory()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._chat, self._slots
+
+
+class LLMClientPool:
+    """Providers by model name ("claude", "gpt-4")."""
+
+    def __init__(self, factories: dict[str, Callable[[], object]]):
+        self.providers = {name: LLMProvider(name, factory) for name, factory in factories.items()}
+
+    async def ainvoke(self, name: str, system_prompt: str, user_prompt: str) -> str:
+        return await self.providers[name].ainvoke(system_prompt, user_prompt)
+
+    def astream(self, name: str, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        return self.providers[name].astream(system_prompt, user_prompt)
+
+
+def _text(content) -> str:
+    # Message content is a string, or a list of content blocks for some providers
+    if isinstance(content, str):
+        return content
+    return "".join(block if isinstance(block, str) else block.get("text", "") for block in content)
+
+
+def _anthropic_chat():
+    from langchain_anthropic import ChatAnthropic
+
+    kwargs = {"base_url": ANTHROPIC_BASE_URL} if ANTHROPIC_BASE_URL else {}
+    return ChatAnthropic(
+        model=LLM_MODELS["claude"],
+        api_key=ANTHROPIC_API_KEY,
+        max_tokens=NARRATIVE_MAX_TOKENS,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        **kwargs,
+    )
+
+
+def _openai_chat():
+    from langchain_openai import ChatOpenAI
+
+    kwargs = {"base_url": OPENAI_BASE_URL} if OPENAI_BASE_URL else {}
+    return ChatOpenAI(
+        model=LLM_MODELS["gpt-4"],
+        api_key=OPENAI_API_KEY,
+        max_tokens=NARRATIVE_MAX_TOKENS,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        **kwargs,
+    )
+
+
+llm_clients = LLMClientPool({"claude": _anthropic_chat, "gpt-4": _openai_chat})
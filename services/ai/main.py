@@ -1,5 +1,11 @@
-from fastapi import FastAPI, Depends, Header, HTTPException
+import asyncio
+import functools
+import json
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional
@@ -7,15 +13,35 @@ import os
 import structlog
 import logging
 
-from database import get_db, fetch_emission_data, fetch_installation_summary, fetch_balance_data
-from services.forecast_service import forecast_emissions
-from services.anomaly_service import detect_anomalies
-from services.narrative_service import generate_narrative
+from executors import run_db, run_cpu, shutdown_executors, ExecutorSaturatedError
+from cache import result_cache, anomaly_model_cache, model_key
+from model_store import forecast_model_store, forecast_fingerprint
+from job_store import JobStoreUnavailableError
+from scan_jobs import scan_jobs
+from narrative_jobs import narrative_jobs
+from database import (
+    get_db, SessionLocal, async_engine, fetch_yearly_emissions, fetch_yearly_emissions_many, fetch_installation_bundle,
+    afetch_installation_bundle, fetch_data_fingerprint, refresh_emission_rollup, stream_emission_data, BUNDLE_YEARLY,
+)
+from config import (
+    EXECUTOR_CPU_WORKERS, FORECAST_BATCH_MAX_INSTALLATIONS, EMISSION_ROLLUP_ENABLED, EMISSION_ROLLUP_REFRESH_SECONDS,
+    ANOMALY_STREAMING_MIN_ROWS, FORECAST_MAX_PERIODS,
+)
+from services.forecast_service import (
+    FORECAST_MODEL_VERSION, forecast_emissions, forecast_emissions_batch, train_forecast_model, forecast_from_model,
+)
+from services.bootstrap_executor import shutdown_pool as shutdown_bootstrap_pool
+from services.anomaly_service import (
+    EmissionAnomalyModel, detect_anomalies, adetect_anomalies_streaming, astream_anomalies, anomaly_summary,
+    fit_emission_model, afit_emission_model_sampled,
+)
+from services.narrative_service import agenerate_narrative, agenerate_narratives, astream_narrative
 from metrics import (
     metrics_endpoint, track_request,
     FORECAST_MODEL_USED, FORECAST_R2_SCORE,
-    ANOMALIES_DETECTED, DATA_QUALITY_SCORE,
-    NARRATIVE_MODEL_USED, NARRATIVE_LENGTH,
+    FORECAST_BOOTSTRAP_DURATION, FORECAST_BOOTSTRAP_SAVED,
+    ANOMALIES_DETECTED, DATA_QUALITY_SCORE, CACHE_HITS, CACHE_MISSES,
+    NARRATIVE_MODEL_USED, NARRATIVE_LENGTH, NARRATIVE_TIME_TO_FIRST_TOKEN,
 )
 
 # Configure structured logging
@@ -33,10 +59,47 @@ structlog.configure(
 
 logger = structlog.get_logger(service="ecosfer-ai")
 
+
+def _refresh_emission_rollup() -> None:
+    db = SessionLocal()
+    try:
+        refresh_emission_rollup(db)
+    finally:
+        db.close()
+
+
+async def _emission_rollup_loop() -> None:
+    """Create the yearly emission rollup at startup and keep refreshing it."""
+    while True:
+        try:
+            await run_db(_refresh_emission_rollup)
+            logger.info("emission_rollup_refreshed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("emission_rollup_refresh_error", error=str(e))
+        await asyncio.sleep(EMISSION_ROLLUP_REFRESH_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    rollup_task = asyncio.create_task(_emission_rollup_loop()) if EMISSION_ROLLUP_ENABLED else None
+    yield
+    if rollup_task is not None:
+        rollup_task.cancel()
+    await scan_jobs.shutdown()
+    await narrative_jobs.shutdown()
+    shutdown_executors()
+    shutdown_bootstrap_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 app = FastAPI(
     title="Ecosfer SKDM AI Service",
     description="AI/ML endpoints for emission forecasting, anomaly detection, and report generation",
     version="2.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -51,6 +114,37 @@ app.add_middleware(
 app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
 
 
+@app.exception_handler(ExecutorSaturatedError)
+async def executor_saturated_handler(request, exc: ExecutorSaturatedError):
+    logger.warning("executor_saturated", path=request.url.path, error=str(exc))
+    return JSONResponse(status_code=503, content={"detail": "Service is busy, please retry"})
+
+
+@app.exception_handler(JobStoreUnavailableError)
+async def job_store_unavailable_handler(request, exc: JobStoreUnavailableError):
+    logger.warning("job_store_unavailable", path=request.url.path, error=str(exc))
+    return JSONResponse(status_code=503, content={"detail": "Job store is unavailable, please retry"})
+
+
+async def _cache_lookup(
+    db, tenant_id: str, installation_id: str, endpoint: str, params: dict, fingerprint: dict | None = None
+):
+    """Return (cache_key, cached_result) for an endpoint call; key is None when caching is off."""
+    if not result_cache.enabled:
+        return None, None
+    if fingerprint is None:
+        fingerprint = await run_db(fetch_data_fingerprint, db, installation_id, tenant_id)
+    key = result_cache.make_key(tenant_id, installation_id, endpoint, params, fingerprint)
+    return key, await result_cache.get(key)
+
+
+async def _fetch_bundle(db, installation_id: str, tenant_id: str, include: tuple[str, ...]) -> dict:
+    """fetch_installation_bundle, or its parts gathered concurrently when the async engine is enabled."""
+    if async_engine is not None:
+        return await afetch_installation_bundle(async_engine, installation_id, tenant_id, include)
+    return await run_db(fetch_installation_bundle, db, installation_id, tenant_id, include)
+
+
 # =============================================================================
 # Health Check
 # =============================================================================
@@ -81,7 +175,9 @@ async def health_check():
 
 class ForecastRequest(BaseModel):
     installation_id: str
-    periods: int = Field(default=6, ge=1, le=24, description="Number of future periods to forecast")
+    periods: int = Field(default=6, ge=1, le=FORECAST_MAX_PERIODS, description="Number of future periods to forecast")
+    bootstrap_samples: Optional[int] = Field(default=None, ge=10, le=500, description="Bootstrap refits for the XGBoost interval")
+    seed: Optional[int] = Field(default=None, ge=0, description="Seed for deterministic bootstrap intervals")
 
 
 class ForecastPrediction(BaseModel):
@@ -108,6 +204,14 @@ class HistoricalPoint(BaseModel):
     emissions: float
 
 
+class BootstrapInfo(BaseModel):
+    samples: int
+    workers: int
+    wall_seconds: float
+    serial_seconds: float
+    saved_seconds: float
+
+
 class ForecastResponse(BaseModel):
     status: str
     message: str
@@ -117,6 +221,7 @@ class ForecastResponse(BaseModel):
     confidence: Optional[ConfidenceInfo] = None
     model: Optional[str] = None
     r2_score: Optional[float] = None
+    bootstrap: Optional[BootstrapInfo] = None
 
 
 @app.post("/api/v1/forecast/emissions", response_model=ForecastResponse)
@@ -127,17 +232,124 @@ async def api_forecast_emissions(
     db=Depends(get_db),
 ):
     logger.info("forecast_request", installation_id=request.installation_id, periods=request.periods)
-    emission_data = fetch_emission_data(db, request.installation_id, x_tenant_id)
-    result = forecast_emissions(emission_data, request.periods)
+    fingerprint = None
+    if forecast_model_store.enabled:
+        fingerprint = await run_db(fetch_data_fingerprint, db, request.installation_id, x_tenant_id)
+    cache_key, cached = await _cache_lookup(
+        db, x_tenant_id, request.installation_id, "forecast", request.model_dump(exclude={"installation_id"}),
+        fingerprint,
+    )
+    if cached is not None:
+        return ForecastResponse(**cached)
+
+    if forecast_model_store.enabled:
+        result, trained = await _forecast_with_stored_model(db, x_tenant_id, request, fingerprint)
+    else:
+        emission_data = await run_db(fetch_yearly_emissions, db, request.installation_id, x_tenant_id)
+        result = await run_cpu(
+            forecast_emissions, emission_data, request.periods, request.bootstrap_samples, request.seed
+        )
+        trained = True
 
     if result.get("model"):
         FORECAST_MODEL_USED.labels(model=result["model"]).inc()
-    if result.get("r2_score") is not None:
+    if trained and result.get("r2_score") is not None:
         FORECAST_R2_SCORE.observe(max(0, result["r2_score"]))
+    if trained and result.get("bootstrap"):
+        FORECAST_BOOTSTRAP_DURATION.observe(result["bootstrap"]["wall_seconds"])
+        FORECAST_BOOTSTRAP_SAVED.observe(result["bootstrap"]["saved_seconds"])
+        logger.info("forecast_bootstrap", installation_id=request.installation_id, **result["bootstrap"])
+
+    if cache_key:
+        await result_cache.set(cache_key, result)
 
     return ForecastResponse(**result)
 
 
+async def _forecast_with_stored_model(db, tenant_id: str, request: ForecastRequest, fingerprint: dict):
+    """Forecast from the stored model, refitting only when the installation's data changed.
+
+    Returns (result, trained) where trained says whether a new model was fitted.
+    """
+    params = {"bootstrap_samples": request.bootstrap_samples, "seed": request.seed}
+    fingerprint = forecast_fingerprint(fingerprint)
+    model = await run_db(forecast_model_store.get, tenant_id, request.installation_id, params, fingerprint)
+    if model is not None and model.get("version") == FORECAST_MODEL_VERSION:
+        try:
+            return await run_cpu(forecast_from_model, model, request.periods), False
+        except ExecutorSaturatedError:
+            raise
+        except Exception as e:
+            logger.warning("forecast_stored_model_error", installation_id=request.installation_id, error=str(e))
+
+    emission_data = await run_db(fetch_yearly_emissions, db, request.installation_id, tenant_id)
+    model = await run_cpu(train_forecast_model, emission_data, request.bootstrap_samples, request.seed)
+    await run_db(forecast_model_store.put, tenant_id, request.installation_id, params, fingerprint, model)
+    return await run_cpu(forecast_from_model, model, request.periods), True
+
+
+class BatchForecastRequest(BaseModel):
+    installation_ids: list[str] = Field(..., min_length=1, max_length=FORECAST_BATCH_MAX_INSTALLATIONS)
+    periods: int = Field(default=6, ge=1, le=FORECAST_MAX_PERIODS, description="Number of future periods to forecast")
+    bootstrap_samples: Optional[int] = Field(default=None, ge=10, le=500, description="Bootstrap refits for the XGBoost interval")
+    seed: Optional[int] = Field(default=None, ge=0, description="Seed for deterministic bootstrap intervals")
+
+
+@app.post("/api/v1/forecast/emissions:batch")
+@track_request("forecast_batch")
+async def api_forecast_emissions_batch(
+    request: BatchForecastRequest,
+    x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
+    db=Depends(get_db),
+):
+    """Forecast many installations; results stream back as NDJSON, one line per installation."""
+    installation_ids = list(dict.fromkeys(request.installation_ids))
+    logger.info("forecast_batch_request", installations=len(installation_ids), periods=request.periods)
+    frames = await run_db(fetch_yearly_emissions_many, db, installation_ids, x_tenant_id)
+
+    # Short histories are fitted together in one vectorized closed-form pass
+    try:
+        results, pending = await run_cpu(forecast_emissions_batch, frames, request.periods)
+    except ExecutorSaturatedError:
+        raise
+    except Exception as e:
+        logger.warning("forecast_batch_vectorized_error", error=str(e))
+        results, pending = {}, installation_ids
+
+    def _item(installation_id: str, result: dict) -> dict:
+        if result.get("model"):
+            FORECAST_MODEL_USED.labels(model=result["model"]).inc()
+        item = ForecastResponse(**result).model_dump(mode="json")
+        return {"installation_id": installation_id, **item}
+
+    # Keep at most one XGBoost fit per CPU worker in flight so the batch cannot overflow the cpu queue
+    slots = asyncio.Semaphore(EXECUTOR_CPU_WORKERS)
+
+    async def _forecast_one(installation_id: str) -> dict:
+        async with slots:
+            try:
+                result = await run_cpu(
+                    forecast_emissions, frames[installation_id], request.periods, request.bootstrap_samples, request.seed
+                )
+            except Exception as e:
+                logger.warning("forecast_batch_item_error", installation_id=installation_id, error=str(e))
+                return {"installation_id": installation_id, "status": "error", "message": str(e)}
+        return _item(installation_id, result)
+
+    async def _stream():
+        for installation_id, result in results.items():
+            yield json.dumps(_item(installation_id, result)) + "\n"
+        tasks = [asyncio.ensure_future(_forecast_one(iid)) for iid in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
 # =============================================================================
 # Anomaly Detection
 # =============================================================================
@@ -182,22 +394,191 @@ async def api_detect_anomalies(
     db=Depends(get_db),
 ):
     logger.info("anomaly_request", installation_id=request.installation_id, threshold=request.threshold)
-    emission_data = fetch_emission_data(db, request.installation_id, x_tenant_id)
-    balance_data = fetch_balance_data(db, request.installation_id, x_tenant_id)
-    result = detect_anomalies(emission_data, balance_data, request.threshold)
+    fingerprint = await run_db(fetch_data_fingerprint, db, request.installation_id, x_tenant_id)
+    cache_key, cached = await _cache_lookup(
+        db, x_tenant_id, request.installation_id, "anomalies", request.model_dump(exclude={"installation_id"}),
+        fingerprint,
+    )
+    if cached is not None:
+        return AnomalyResponse(**cached)
+
+    if (fingerprint.get("emission_count") or 0) >= ANOMALY_STREAMING_MIN_ROWS:
+        # Too many rows to hold at once: score them chunk by chunk from a server-side cursor
+        logger.info("anomaly_streaming", installation_id=request.installation_id, rows=fingerprint["emission_count"])
+        bundle = await _fetch_bundle(db, request.installation_id, x_tenant_id, (BUNDLE_YEARLY, "balances"))
+        chunks = functools.partial(stream_emission_data, db, request.installation_id, x_tenant_id)
+        model = await _anomaly_model(
+            model_key("anomaly_sampled", x_tenant_id, request.installation_id, fingerprint),
+            functools.partial(afit_emission_model_sampled, chunks),
+        )
+        # Chunks are read on the db executor and scored on the cpu executor
+        result = await adetect_anomalies_streaming(
+            chunks, bundle[BUNDLE_YEARLY], bundle["balances"], request.threshold, model=model,
+        )
+    else:
+        bundle = await _fetch_bundle(db, request.installation_id, x_tenant_id, ("emissions", "balances"))
+        model = await _anomaly_model(
+            model_key("anomaly", x_tenant_id, request.installation_id, fingerprint),
+            functools.partial(run_cpu, fit_emission_model, bundle["emissions"]),
+        )
+        result = await run_cpu(
+            detect_anomalies, bundle["emissions"], bundle["balances"], request.threshold, model
+        )
 
     if result.get("summary"):
-        summary = result["summary"]
-        for severity in ["critical", "warning", "info"]:
-            count = summary.get(severity, 0)
-            if count > 0:
-                ANOMALIES_DETECTED.labels(severity=severity).inc(count)
-        if summary.get("data_quality_score") is not None:
-            DATA_QUALITY_SCORE.observe(summary["data_quality_score"])
+        _record_anomaly_summary(result["summary"])
+
+    if cache_key:
+        await result_cache.set(cache_key, result)
 
     return AnomalyResponse(**result)
 
 
+async def _anomaly_model(key: str, fit) -> EmissionAnomalyModel | None:
+    """Fitted emission model for the installation's current data; refit only on a cache miss.
+
+    The model does not depend on the threshold, so a request that only changes
+    the threshold re-thresholds the cached scores instead of refitting. `fit` is
+    awaited without arguments and returns the model.
+    """
+    model = anomaly_model_cache.get(key)
+    if model is not None:
+        CACHE_HITS.labels(cache=anomaly_model_cache.name, tier="l1").inc()
+        return model
+    CACHE_MISSES.labels(cache=anomaly_model_cache.name).inc()
+    model = await fit()
+    if model is not None:
+        anomaly_model_cache.set(key, model)
+    return model
+
+
+def _record_anomaly_summary(summary: dict) -> None:
+    for severity in ["critical", "warning", "info"]:
+        count = summary.get(severity, 0)
+        if count > 0:
+            ANOMALIES_DETECTED.labels(severity=severity).inc(count)
+    if summary.get("data_quality_score") is not None:
+        DATA_QUALITY_SCORE.observe(summary["data_quality_score"])
+
+
+@app.post("/api/v1/analysis/anomalies:stream")
+@track_request("anomalies_stream")
+async def api_stream_anomalies(
+    request: AnomalyRequest,
+    x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
+    db=Depends(get_db),
+):
+    """Detect anomalies and stream them back as NDJSON while the rows are scored.
+
+    One line per anomaly (AnomalyItem), in detection order, then a final line
+    with status, message and summary (AnomalyResponse without the anomalies).
+    """
+    logger.info("anomaly_stream_request", installation_id=request.installation_id, threshold=request.threshold)
+    fingerprint = await run_db(fetch_data_fingerprint, db, request.installation_id, x_tenant_id)
+    bundle = await _fetch_bundle(db, request.installation_id, x_tenant_id, (BUNDLE_YEARLY, "balances"))
+    yearly, balances = bundle[BUNDLE_YEARLY], bundle["balances"]
+
+    async def _stream():
+        if not yearly.records and not len(balances):
+            yield json.dumps({"status": "no_data", "message": "Anomali tespiti icin veri bulunamadi", "summary": None}) + "\n"
+            return
+
+        # The request session is closed once the response starts; the cursor needs its own
+        stream_db = SessionLocal()
+        chunks = functools.partial(stream_emission_data, stream_db, request.installation_id, x_tenant_id)
+        anomalies = []
+        try:
+            model = await _anomaly_model(
+                model_key("anomaly_sampled", x_tenant_id, request.installation_id, fingerprint),
+                functools.partial(afit_emission_model_sampled, chunks),
+            )
+            found = astream_anomalies(chunks, yearly, balances, request.threshold, model=model)
+            try:
+                async for chunk in found:
+                    for anomaly in chunk:
+                        yield AnomalyItem(**anomaly).model_dump_json() + "\n"
+                    anomalies.extend(chunk)
+            finally:
+                await found.aclose()
+        finally:
+            stream_db.close()
+
+        summary = anomaly_summary(anomalies, yearly.records + len(balances))
+        _record_anomaly_summary(summary)
+        yield json.dumps({
+            "status": "success",
+            "message": f"{len(anomalies)} anomali tespit edildi",
+            "summary": summary,
+        }) + "\n"
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
+class AnomalyScanRequest(BaseModel):
+    threshold: float = Field(default=0.05, ge=0.01, le=0.5, description="Contamination rate")
+    installation_ids: Optional[list[str]] = Field(
+        default=None, min_length=1, description="Installations to scan; all of the tenant's when omitted"
+    )
+
+
+class AnomalyScanStatus(BaseModel):
+    job_id: str
+    status: str
+    threshold: float
+    total: int
+    processed: int
+    failed: int
+    error: Optional[str] = None
+    created_at: datetime
+    elapsed_seconds: float
+    installations_per_second: float
+
+
+class AnomalyScanItem(BaseModel):
+    installation_id: str
+    status: str
+    summary: Optional[AnomalySummary] = None
+    message: Optional[str] = None
+
+
+class AnomalyScanResults(AnomalyScanStatus):
+    results: list[AnomalyScanItem] = []
+
+
+@app.post("/api/v1/analysis/anomalies/scans", response_model=AnomalyScanStatus, status_code=202)
+@track_request("anomaly_scan_submit")
+async def api_submit_anomaly_scan(
+    request: AnomalyScanRequest,
+    x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
+):
+    """Start a background anomaly scan over a tenant's installations; poll it by job id."""
+    job = await scan_jobs.submit(x_tenant_id, request.threshold, request.installation_ids)
+    return AnomalyScanStatus(**job.progress())
+
+
+@app.get("/api/v1/analysis/anomalies/scans/{job_id}", response_model=AnomalyScanStatus)
+@track_request("anomaly_scan_status")
+async def api_anomaly_scan_status(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-Id")):
+    job = await _get_scan_job(job_id, x_tenant_id)
+    return AnomalyScanStatus(**job.progress())
+
+
+@app.get("/api/v1/analysis/anomalies/scans/{job_id}/results", response_model=AnomalyScanResults)
+@track_request("anomaly_scan_results")
+async def api_anomaly_scan_results(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-Id")):
+    """Per-installation summaries scanned so far (all of them once the job is completed)."""
+    job = await _get_scan_job(job_id, x_tenant_id)
+    results = [{"installation_id": iid, **item} for iid, item in (await scan_jobs.results(job_id)).items()]
+    return AnomalyScanResults(**job.progress(), results=results)
+
+
+async def _get_scan_job(job_id: str, tenant_id: str):
+    job = await scan_jobs.get(job_id, tenant_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job
+
+
 # =============================================================================
 # Report Narrative
 # =============================================================================
@@ -206,15 +587,23 @@ class NarrativeRequest(BaseModel):
     installation_id: str
     report_type: str = Field(default="summary", description="summary, detailed, or executive")
     language: str = Field(default="tr", description="tr, en, or de")
+    languages: Optional[list[str]] = Field(
+        default=None, min_length=1, description="Generate the report in each of these languages (overrides language)"
+    )
 
 
-class NarrativeResponse(BaseModel):
+class NarrativeVersion(BaseModel):
     status: str
     message: str
     narrative: str = ""
     language: str = "tr"
     report_type: str = "summary"
     model: Optional[str] = None
+    cached: bool = False
+
+
+class NarrativeResponse(NarrativeVersion):
+    narratives: list[NarrativeVersion] = Field(default=[], description="One entry per language when languages is set")
 
 
 @app.post("/api/v1/analysis/report-narrative", response_model=NarrativeResponse)
@@ -224,22 +613,158 @@ async def api_generate_narrative(
     x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
     db=Depends(get_db),
 ):
-    logger.info("narrative_request", installation_id=request.installation_id, language=request.language, report_type=request.report_type)
-    installation_info = fetch_installation_summary(db, request.installation_id, x_tenant_id)
-    emission_data = fetch_emission_data(db, request.installation_id, x_tenant_id)
-    balance_data = fetch_balance_data(db, request.installation_id, x_tenant_id)
-
-    result = generate_narrative(
-        installation_info=installation_info,
-        emission_data=emission_data,
-        balance_data=balance_data,
-        report_type=request.report_type,
-        language=request.language,
+    logger.info(
+        "narrative_request", installation_id=request.installation_id,
+        language=request.languages or request.language, report_type=request.report_type,
+    )
+    # The narrative only needs per-year emission sums, so raw emission rows stay in Postgres
+    bundle = await _fetch_bundle(db, request.installation_id, x_tenant_id, ("installation", BUNDLE_YEARLY, "balances"))
+
+    if request.languages:
+        # One data load and context for every language; the generations run concurrently
+        results = await agenerate_narratives(
+            installation_info=bundle["installation"],
+            emission_data=bundle[BUNDLE_YEARLY],
+            balance_data=bundle["balances"],
+            report_type=request.report_type,
+            languages=list(dict.fromkeys(request.languages)),
+        )
+    else:
+        results = [await agenerate_narrative(
+            installation_info=bundle["installation"],
+            emission_data=bundle[BUNDLE_YEARLY],
+            balance_data=bundle["balances"],
+            report_type=request.report_type,
+            language=request.language,
+        )]
+
+    for result in results:
+        if result.get("model"):
+            NARRATIVE_MODEL_USED.labels(model=result["model"], language=result["language"]).inc()
+        if result.get("narrative"):
+            NARRATIVE_LENGTH.observe(len(result["narrative"]))
+
+    return NarrativeResponse(**results[0], narratives=results if request.languages else [])
+
+
+@app.post("/api/v1/analysis/report-narrative:stream")
+@track_request("narrative_stream")
+async def api_stream_narrative(
+    request: NarrativeRequest,
+    x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
+    db=Depends(get_db),
+):
+    """Generate a narrative and stream it as Server-Sent Events while it is written.
+
+    `text` events carry {"text": ...} chunks that concatenate to the narrative;
+    a final `done` event carries NarrativeResponse without the narrative.
+    """
+    if request.languages:
+        raise HTTPException(status_code=422, detail="languages is not supported when streaming; use language")
+    start = time.perf_counter()
+    logger.info("narrative_stream_request", installation_id=request.installation_id, language=request.language, report_type=request.report_type)
+    bundle = await _fetch_bundle(db, request.installation_id, x_tenant_id, ("installation", BUNDLE_YEARLY, "balances"))
+
+    async def _stream():
+        first_token = None
+        length = 0
+        async for event in astream_narrative(
+            installation_info=bundle["installation"],
+            emission_data=bundle[BUNDLE_YEARLY],
+            balance_data=bundle["balances"],
+            report_type=request.report_type,
+            language=request.language,
+        ):
+            kind = event.pop("type")
+            if kind == "text":
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                length += len(event["text"])
+            else:
+                if event.get("model"):
+                    NARRATIVE_MODEL_USED.labels(model=event["model"], language=request.language).inc()
+                    if first_token is not None:
+                        NARRATIVE_TIME_TO_FIRST_TOKEN.labels(model=event["model"]).observe(first_token)
+                if length:
+                    NARRATIVE_LENGTH.observe(length)
+                event = NarrativeVersion(**event).model_dump(exclude={"narrative"})
+            yield f"event: {kind}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    if result.get("model"):
-        NARRATIVE_MODEL_USED.labels(model=result["model"], language=request.language).inc()
-    if result.get("narrative"):
-        NARRATIVE_LENGTH.observe(len(result["narrative"]))
 
-    return NarrativeResponse(**result)
+class NarrativeJobRequest(BaseModel):
+    installation_ids: list[str] = Field(..., min_length=1, description="Installations to narrate")
+    report_type: str = Field(default="summary", description="summary, detailed, or executive")
+    languages: list[str] = Field(default=["tr"], min_length=1, description="tr, en, and/or de")
+
+
+class NarrativeJobStatus(BaseModel):
+    job_id: str
+    status: str
+    report_type: str
+    languages: list[str]
+    total: int
+    processed: int
+    failed: int
+    llm_calls: int
+    template_narratives: int
+    error: Optional[str] = None
+    created_at: datetime
+    elapsed_seconds: float
+    installations_per_second: float
+
+
+class NarrativeJobItem(BaseModel):
+    installation_id: str
+    status: str
+    narratives: list[NarrativeVersion] = []
+    message: Optional[str] = None
+
+
+@app.post("/api/v1/analysis/report-narrative/jobs", response_model=NarrativeJobStatus, status_code=202)
+@track_request("narrative_job_submit")
+async def api_submit_narrative_job(
+    request: NarrativeJobRequest,
+    x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
+):
+    """Start generating narratives for many installations in the background; poll it by job id."""
+    job = await narrative_jobs.submit(x_tenant_id, request.installation_ids, request.report_type, request.languages)
+    return NarrativeJobStatus(**job.progress())
+
+
+@app.get("/api/v1/analysis/report-narrative/jobs/{job_id}", response_model=NarrativeJobStatus)
+@track_request("narrative_job_status")
+async def api_narrative_job_status(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-Id")):
+    job = await _get_narrative_job(job_id, x_tenant_id)
+    return NarrativeJobStatus(**job.progress())
+
+
+@app.get("/api/v1/analysis/report-narrative/jobs/{job_id}/narratives/{installation_id}", response_model=NarrativeJobItem)
+@track_request("narrative_job_item")
+async def api_narrative_job_item(
+    job_id: str,
+    installation_id: str,
+    response: Response,
+    x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
+):
+    """One installation's narratives, in the job's languages; 202 while it is still pending."""
+    job = await _get_narrative_job(job_id, x_tenant_id)
+    result = await narrative_jobs.result(job_id, installation_id)
+    if result is None:
+        if job.finished or installation_id not in job.installation_ids:
+            raise HTTPException(status_code=404, detail="Installation not found in narrative job")
+        response.status_code = 202
+        return NarrativeJobItem(installation_id=installation_id, status="pending")
+    return NarrativeJobItem(installation_id=installation_id, **result)
+
+
+async def _get_narrative_job(job_id: str, tenant_id: str):
+    job = await narrative_jobs.get(job_id, tenant_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Narrative job not found")
+    return job
@@ -40,6 +40,18 @@ FORECAST_R2_SCORE = Histogram(
     buckets=[0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
 )
 
+FORECAST_BOOTSTRAP_DURATION = Histogram(
+    "ai_forecast_bootstrap_duration_seconds",
+    "Wall time of the bootstrap refits per forecast request",
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+)
+
+FORECAST_BOOTSTRAP_SAVED = Histogram(
+    "ai_forecast_bootstrap_saved_seconds",
+    "Wall time saved per request by running bootstrap refits in the process pool",
+    buckets=[0.0, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
 # Anomaly detection metrics
 ANOMALIES_DETECTED = Counter(
     "ai_anomalies_detected_total",
@@ -66,6 +78,13 @@ NARRATIVE_LENGTH = Histogram(
     buckets=[100, 500, 1000, 2000, 5000, 10000]
 )
 
+NARRATIVE_TIME_TO_FIRST_TOKEN = Histogram(
+    "ai_narrative_time_to_first_token_seconds",
+    "Time from a streaming narrative request to its first text event",
+    ["model"],
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0]
+)
+
 # DB query metrics
 DB_QUERY_DURATION = Histogram(
     "ai_db_query_duration_seconds",
@@ -74,6 +93,135 @@ DB_QUERY_DURATION = Histogram(
     buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
 )
 
+DB_POOL_CHECKED_OUT = Gauge(
+    "ai_db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["pool"]
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    "ai_db_pool_overflow",
+    "Connections open beyond pool_size (up to max_overflow)",
+    ["pool"]
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "ai_db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, including opening a new one",
+    ["pool"],
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0]
+)
+
+DB_POOL_PRE_PING = Histogram(
+    "ai_db_pool_pre_ping_seconds",
+    "Duration of the liveness ping on checkout of a pooled connection",
+    ["pool"],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5]
+)
+
+
+# Result cache metrics
+CACHE_HITS = Counter(
+    "ai_cache_hits_total",
+    "Result cache hits",
+    ["cache", "tier"]
+)
+
+CACHE_MISSES = Counter(
+    "ai_cache_misses_total",
+    "Result cache misses (both tiers)",
+    ["cache"]
+)
+
+CACHE_EVICTIONS = Counter(
+    "ai_cache_evictions_total",
+    "Entries evicted from the in-process cache tier",
+    ["cache", "reason"]
+)
+
+# Model store metrics
+FORECAST_MODEL_STORE_LOOKUPS = Counter(
+    "ai_model_store_lookups_total",
+    "Fitted-model store lookups by outcome (hit, stale, miss)",
+    ["store", "result"]
+)
+
+# Anomaly scan job metrics
+ANOMALY_SCAN_JOBS = Counter(
+    "ai_anomaly_scan_jobs_total",
+    "Finished tenant-wide anomaly scan jobs",
+    ["status"]
+)
+
+ANOMALY_SCAN_INSTALLATIONS = Counter(
+    "ai_anomaly_scan_installations_total",
+    "Installations scanned by anomaly scan jobs (rate() gives throughput)",
+    ["status"]
+)
+
+ANOMALY_SCAN_PENDING = Gauge(
+    "ai_anomaly_scan_pending_installations",
+    "Installations waiting to be scanned across running scan jobs"
+)
+
+NARRATIVE_JOBS = Counter(
+    "ai_narrative_jobs_total",
+    "Finished bulk narrative jobs",
+    ["status"]
+)
+
+NARRATIVE_JOB_INSTALLATIONS = Counter(
+    "ai_narrative_job_installations_total",
+    "Installations narrated by bulk narrative jobs",
+    ["status"]
+)
+
+# LLM client metrics
+LLM_REQUESTS = Counter(
+    "ai_llm_requests_total",
+    "LLM calls by provider and outcome (success, error, timeout, circuit_open)",
+    ["provider", "outcome"]
+)
+
+LLM_REQUEST_DURATION = Histogram(
+    "ai_llm_request_duration_seconds",
+    "LLM call latency",
+    ["provider"],
+    buckets=[0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0]
+)
+
+LLM_CIRCUIT_OPEN = Gauge(
+    "ai_llm_circuit_open",
+    "1 while the provider's circuit breaker is open",
+    ["provider"]
+)
+
+# Execution layer metrics
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "ai_executor_queue_depth",
+    "Tasks waiting for a free worker",
+    ["pool"]
+)
+
+EXECUTOR_ACTIVE = Gauge(
+    "ai_executor_active_tasks",
+    "Tasks currently running on a worker",
+    ["pool"]
+)
+
+EXECUTOR_WAIT_DURATION = Histogram(
+    "ai_executor_wait_seconds",
+    "Time a task waited in the queue before a worker picked it up",
+    ["pool"],
+    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0]
+)
+
+EXECUTOR_REJECTED = Counter(
+    "ai_executor_rejected_total",
+    "Tasks rejected because the executor queue was full",
+    ["pool"]
+)
+
 
 def track_request(endpoint: str):
     """Decorator to track request metrics."""
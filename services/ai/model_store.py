@@ -0,0 +1,152 @@
+"""
+Model store
+Persists fitted forecast models per installation so reads skip retraining.
+
+Each entry holds the model from train_forecast_model together with the data
+fingerprint it was trained on. An entry is reused only while the
+installation's fingerprint is unchanged; new Emission / InstallationData rows
+change the fingerprint and the model is refit on the next request. The
+forecast does not read balances, so GhgBalanceByType edits do not refit it.
+
+Backends: Redis (shared between replicas) or a local directory. Like the
+result cache, backend errors never fail a request; the store is skipped for
+CACHE_REDIS_RETRY_SECONDS and the model is simply refit.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import structlog
+
+from config import (
+    REDIS_URL,
+    FORECAST_MODEL_STORE,
+    FORECAST_MODEL_STORE_DIR,
+    FORECAST_MODEL_STORE_TTL_SECONDS,
+    CACHE_REDIS_RETRY_SECONDS,
+)
+from metrics import FORECAST_MODEL_STORE_LOOKUPS
+
+logger = structlog.get_logger(service="ecosfer-ai", module="model_store")
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def forecast_fingerprint(fingerprint: dict) -> dict:
+    """The parts of fetch_data_fingerprint a forecast model depends on (emissions and reporting years)."""
+    return {k: v for k, v in fingerprint.items() if not k.startswith("balance_")}
+
+
+class ModelStore:
+    """Fingerprint-checked store for fitted models. Blocking; call it through run_db."""
+
+    def __init__(
+        self,
+        name: str,
+        backend: str = FORECAST_MODEL_STORE,
+        redis_url: str = REDIS_URL,
+        directory: str = FORECAST_MODEL_STORE_DIR,
+        ttl: int = FORECAST_MODEL_STORE_TTL_SECONDS,
+    ):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self._redis_url = redis_url
+        self._directory = directory
+        self._redis = None
+        self._down_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend in ("redis", "disk")
+
+    def make_key(self, tenant_id: str, installation_id: str, params: dict) -> str:
+        return f"ai:models:{self.name}:{tenant_id}:{installation_id}:{_digest(params)}"
+
+    def get(self, tenant_id: str, installation_id: str, params: dict, fingerprint: dict) -> dict | None:
+        """Return the stored model if it was trained on data with this fingerprint."""
+        if not self._available():
+            return None
+        key = self.make_key(tenant_id, installation_id, params)
+        try:
+            raw = self._read(key)
+        except Exception as e:
+            self._mark_down(e)
+            raw = None
+        if raw is None:
+            FORECAST_MODEL_STORE_LOOKUPS.labels(store=self.name, result="miss").inc()
+            return None
+
+        entry = json.loads(raw)
+        if entry.get("fingerprint") != _digest(fingerprint):
+            FORECAST_MODEL_STORE_LOOKUPS.labels(store=self.name, result="stale").inc()
+            return None
+        FORECAST_MODEL_STORE_LOOKUPS.labels(store=self.name, result="hit").inc()
+        return entry["model"]
+
+    def put(self, tenant_id: str, installation_id: str, params: dict, fingerprint: dict, model: dict) -> None:
+        if not self._available():
+            return
+        key = self.make_key(tenant_id, installation_id, params)
+        entry = {
+            "fingerprint": _digest(fingerprint),
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "model": model,
+        }
+        try:
+            self._write(key, json.dumps(entry))
+        except Exception as e:
+            self._mark_down(e)
+
+    def _available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._down_until
+
+    def _read(self, key: str) -> str | bytes | None:
+        if self.backend == "redis":
+            return self._client().get(key)
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, raw: str) -> None:
+        if self.backend == "redis":
+            self._client().set(key, raw, ex=self.ttl)
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(raw)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _path(self, key: str) -> str:
+        # Keys embed tenant / installation ids; hash them into a safe file name
+        return os.path.join(self._directory, self.name, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self._redis_url, socket_connect_timeout=0.5, socket_timeout=1.0)
+        return self._redis
+
+    def _mark_down(self, error: Exception) -> None:
+        logger.warning("model_store_unavailable", store=self.name, backend=self.backend, error=str(error))
+        self._down_until = time.monotonic() + CACHE_REDIS_RETRY_SECONDS
+        self._redis = None
+
+
+forecast_model_store = ModelStore("forecast")
@@ -0,0 +1,274 @@
+"""
+Narrative jobs
+Bulk report narratives for a tenant's installations, generated in the background.
+
+A job loads installation info, per-year emissions and balances for
+NARRATIVE_JOB_BATCH_SIZE installations at a time (one query each) and
+narrates every installation in all requested languages. At most
+NARRATIVE_JOB_WORKERS installations are narrated at once across all jobs.
+LLM calls from every job share one rate limiter (NARRATIVE_JOB_LLM_RATE per
+second), and each job may make at most NARRATIVE_JOB_LLM_BUDGET of them;
+anything over budget uses the template. Narrative cache hits cost nothing.
+
+A job runs in the process that accepted it. Each installation's narratives
+are written to the job store as soon as they are generated, together with the
+job's progress, so the PDF generator can fetch them per installation from any
+worker or replica. Jobs expire NARRATIVE_JOB_TTL_SECONDS after their last
+update.
+"""
+
+import asyncio
+import functools
+import time
+import uuid
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+
+import structlog
+
+from config import (
+    NARRATIVE_JOB_BATCH_SIZE,
+    NARRATIVE_JOB_WORKERS,
+    NARRATIVE_JOB_TTL_SECONDS,
+    NARRATIVE_JOB_LLM_RATE,
+    NARRATIVE_JOB_LLM_BURST,
+    NARRATIVE_JOB_LLM_BUDGET,
+)
+from database import (
+    SessionLocal,
+    fetch_installation_summary_many,
+    fetch_yearly_emissions_many,
+    fetch_balance_data_many,
+)
+from executors import run_db
+from job_store import JobStore, JobStoreUnavailableError
+from metrics import NARRATIVE_JOBS, NARRATIVE_JOB_INSTALLATIONS, NARRATIVE_MODEL_USED
+from services.narrative_service import agenerate_narratives
+
+logger = structlog.get_logger(service="ecosfer-ai", module="narrative_jobs")
+
+
+class RateLimiter:
+    """Token bucket: `rate` acquisitions per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class NarrativeJob:
+    id: str
+    tenant_id: str
+    installation_ids: list[str]
+    report_type: str = "summary"
+    languages: list[str] = field(default_factory=lambda: ["tr"])
+    status: str = "queued"  # queued, running, completed, failed, cancelled
+    total: int = 0
+    processed: int = 0
+    failed: int = 0
+    llm_calls: int = 0
+    template_narratives: int = 0
+    error: str | None = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: float | None = None  # epoch seconds, comparable across processes
+    finished_at: float | None = None
+    # Results not yet written to the job store (kept until a write succeeds)
+    _unsaved: dict[str, dict] = field(default_factory=dict, repr=False)
+    # Serializes store writes so counters never go backwards
+    _save_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def progress(self) -> dict:
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "report_type": self.report_type,
+            "languages": self.languages,
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "llm_calls": self.llm_calls,
+            "template_narratives": self.template_narratives,
+            "error": self.error,
+            "created_at": self.created_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "installations_per_second": round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def to_fields(self, progress_only: bool = False) -> dict:
+        """The job as stored in the job store; progress_only leaves out the installation list."""
+        stored = {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith("_")}
+        stored["created_at"] = self.created_at.isoformat()
+        if progress_only:
+            del stored["installation_ids"]
+        return stored
+
+    @classmethod
+    def from_fields(cls, stored: dict) -> "NarrativeJob":
+        known = {f.name for f in fields(cls) if not f.name.startswith("_")}
+        job = cls(**{name: value for name, value in stored.items() if name in known})
+        job.created_at = datetime.fromisoformat(stored["created_at"])
+        return job
+
+
+class NarrativeJobManager:
+    """Runs narrative jobs as asyncio tasks and serves their state and narratives from the job store."""
+
+    def __init__(
+        self,
+        batch_size: int = NARRATIVE_JOB_BATCH_SIZE,
+        workers: int = NARRATIVE_JOB_WORKERS,
+        ttl: int = NARRATIVE_JOB_TTL_SECONDS,
+        llm_rate: float = NARRATIVE_JOB_LLM_RATE,
+        llm_burst: int = NARRATIVE_JOB_LLM_BURST,
+        llm_budget: int = NARRATIVE_JOB_LLM_BUDGET,
+        store: JobStore | None = None,
+    ):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.llm_budget = llm_budget
+        self.store = store or JobStore("narratives", ttl)
+        self._limiter = RateLimiter(llm_rate, llm_burst)
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._slots = asyncio.Semaphore(workers)
+
+    async def submit(
+        self,
+        tenant_id: str,
+        installation_ids: list[str],
+        report_type: str = "summary",
+        languages: list[str] | None = None,
+    ) -> NarrativeJob:
+        """Start narrating the given installations in every requested language."""
+        job = NarrativeJob(
+            id=uuid.uuid4().hex,
+            tenant_id=tenant_id,
+            installation_ids=list(dict.fromkeys(installation_ids)),
+            report_type=report_type,
+            languages=list(dict.fromkeys(languages or ["tr"])),
+        )
+        job.total = len(job.installation_ids)
+        # Stored before the task starts, so the first poll finds it on any worker
+        await self.store.save(job.id, job.to_fields())
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        logger.info("narrative_job_submitted", job_id=job.id, tenant_id=tenant_id, installations=job.total)
+        return job
+
+    async def get(self, job_id: str, tenant_id: str) -> NarrativeJob | None:
+        stored = await self.store.load(job_id)
+        if stored is None or stored.get("tenant_id") != tenant_id:
+            return None
+        return NarrativeJob.from_fields(stored)
+
+    async def result(self, job_id: str, installation_id: str) -> dict | None:
+        """One installation's narratives, or None until they are generated."""
+        return await self.store.load_result(job_id, installation_id)
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _save(self, job: NarrativeJob, results: dict[str, dict] | None = None) -> None:
+        # A failed write does not stop the job; unsaved narratives go out with the next write
+        job._unsaved.update(results or {})
+        async with job._save_lock:
+            unsaved = dict(job._unsaved)
+            try:
+                await self.store.save(job.id, job.to_fields(progress_only=True), unsaved)
+            except JobStoreUnavailableError as e:
+                logger.warning("narrative_job_store_error", job_id=job.id, error=str(e))
+                return
+            for installation_id in unsaved:
+                job._unsaved.pop(installation_id, None)
+
+    async def _run(self, job: NarrativeJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        db = SessionLocal()
+        try:
+            await self._save(job)
+            for start in range(0, job.total, self.batch_size):
+                batch = job.installation_ids[start:start + self.batch_size]
+                installations = await run_db(fetch_installation_summary_many, db, batch, job.tenant_id)
+                yearly = await run_db(fetch_yearly_emissions_many, db, batch, job.tenant_id)
+                balances = await run_db(fetch_balance_data_many, db, batch, job.tenant_id)
+                await asyncio.gather(*(
+                    self._narrate_installation(job, iid, installations[iid], yearly[iid], balances[iid]) for iid in batch
+                ))
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.warning("narrative_job_error", job_id=job.id, error=str(e))
+        finally:
+            job.finished_at = time.time()
+            NARRATIVE_JOBS.labels(status=job.status).inc()
+            db.close()
+            await self._save(job)
+            logger.info("narrative_job_finished", **job.progress())
+
+    async def _narrate_installation(self, job: NarrativeJob, installation_id: str, installation, yearly, balances) -> None:
+        async with self._slots:
+            if installation is None:
+                # Not an installation of this tenant
+                result = {"status": "not_found", "narratives": []}
+            else:
+                try:
+                    narratives = await agenerate_narratives(
+                        installation, yearly, balances, job.report_type, job.languages,
+                        acquire_llm=functools.partial(self._acquire_llm, job),
+                    )
+                except Exception as e:
+                    logger.warning("narrative_job_item_error", job_id=job.id, installation_id=installation_id, error=str(e))
+                    result = {"status": "error", "narratives": [], "message": str(e)}
+                else:
+                    status = "no_data" if all(n["status"] == "no_data" for n in narratives) else "success"
+                    result = {"status": status, "narratives": narratives}
+                    for narrative in narratives:
+                        if narrative.get("model"):
+                            NARRATIVE_MODEL_USED.labels(model=narrative["model"], language=narrative["language"]).inc()
+                        if narrative.get("model") == "template":
+                            job.template_narratives += 1
+        if result["status"] in ("error", "not_found"):
+            job.failed += 1
+        job.processed += 1
+        NARRATIVE_JOB_INSTALLATIONS.labels(status=result["status"]).inc()
+        await self._save(job, {installation_id: result})
+
+    async def _acquire_llm(self, job: NarrativeJob) -> bool:
+        if job.llm_calls >= self.llm_budget:
+            return False
+        job.llm_calls += 1
+        await self._limiter.acquire()
+        return True
+
+
+narrative_jobs = NarrativeJobManager()
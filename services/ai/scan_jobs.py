@@ -0,0 +1,243 @@
+"""
+Anomaly scan jobs
+Tenant-wide data-quality scans that run in the background.
+
+A scan loads emission and balance rows for ANOMALY_SCAN_BATCH_SIZE
+installations at a time (one COPY export each), runs detect_anomalies for every
+installation on the cpu executor, and records the per-installation summary.
+Installations with ANOMALY_STREAMING_MIN_ROWS or more emission rows are
+left out of the batch query and scored chunk by chunk from their own
+server-side cursor (each chunk read on the db executor, then scored on the cpu
+executor), so a batch never holds more than
+ANOMALY_SCAN_BATCH_SIZE * ANOMALY_STREAMING_MIN_ROWS rows. At most ANOMALY_SCAN_WORKERS installations are scored at once across all
+jobs, so scans leave room on the cpu executor for interactive requests.
+
+A job runs in the process that accepted it. Its status, progress counters and
+each installation's summary are written to the job store as they change, so
+any worker or replica can serve the polling requests. Jobs expire
+ANOMALY_SCAN_TTL_SECONDS after their last update.
+"""
+
+import asyncio
+import functools
+import time
+import uuid
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+
+import structlog
+
+from config import ANOMALY_SCAN_BATCH_SIZE, ANOMALY_SCAN_WORKERS, ANOMALY_SCAN_TTL_SECONDS, ANOMALY_STREAMING_MIN_ROWS
+from database import (
+    SessionLocal,
+    fetch_tenant_installation_ids,
+    fetch_yearly_emissions_many,
+    copy_emission_data_many,
+    copy_balance_data_many,
+    stream_emission_data,
+)
+from executors import run_db, run_cpu, ExecutorSaturatedError
+from job_store import JobStore, JobStoreUnavailableError
+from metrics import ANOMALY_SCAN_JOBS, ANOMALY_SCAN_INSTALLATIONS, ANOMALY_SCAN_PENDING
+from services.anomaly_service import detect_anomalies, adetect_anomalies_streaming
+
+logger = structlog.get_logger(service="ecosfer-ai", module="scan_jobs")
+
+# Wait before resubmitting an installation when the cpu executor queue is full
+_SATURATED_RETRY_SECONDS = 0.5
+
+
+@dataclass
+class ScanJob:
+    id: str
+    tenant_id: str
+    threshold: float
+    installation_ids: list[str] | None = None
+    status: str = "queued"  # queued, running, completed, failed, cancelled
+    total: int = 0
+    processed: int = 0
+    failed: int = 0
+    error: str | None = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: float | None = None  # epoch seconds, comparable across processes
+    finished_at: float | None = None
+    # Results not yet written to the job store (kept until a write succeeds)
+    _unsaved: dict[str, dict] = field(default_factory=dict, repr=False)
+    # Serializes store writes so counters never go backwards
+    _save_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def progress(self) -> dict:
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "threshold": self.threshold,
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "installations_per_second": round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def to_fields(self, progress_only: bool = False) -> dict:
+        """The job as stored in the job store; progress_only leaves out the installation list."""
+        stored = {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith("_")}
+        stored["created_at"] = self.created_at.isoformat()
+        if progress_only:
+            del stored["installation_ids"]
+        return stored
+
+    @classmethod
+    def from_fields(cls, stored: dict) -> "ScanJob":
+        known = {f.name for f in fields(cls) if not f.name.startswith("_")}
+        job = cls(**{name: value for name, value in stored.items() if name in known})
+        job.created_at = datetime.fromisoformat(stored["created_at"])
+        return job
+
+
+class ScanJobManager:
+    """Runs scan jobs as asyncio tasks and serves their state from the job store."""
+
+    def __init__(
+        self,
+        batch_size: int = ANOMALY_SCAN_BATCH_SIZE,
+        workers: int = ANOMALY_SCAN_WORKERS,
+        ttl: int = ANOMALY_SCAN_TTL_SECONDS,
+        streaming_min_rows: int = ANOMALY_STREAMING_MIN_ROWS,
+        store: JobStore | None = None,
+    ):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.streaming_min_rows = streaming_min_rows
+        self.store = store or JobStore("scans", ttl)
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._slots = asyncio.Semaphore(workers)
+
+    async def submit(self, tenant_id: str, threshold: float, installation_ids: list[str] | None = None) -> ScanJob:
+        """Start a scan of the given installations, or of every installation of the tenant."""
+        job = ScanJob(
+            id=uuid.uuid4().hex,
+            tenant_id=tenant_id,
+            threshold=threshold,
+            installation_ids=list(dict.fromkeys(installation_ids)) if installation_ids else None,
+        )
+        # Stored before the task starts, so the first poll finds it on any worker
+        await self.store.save(job.id, job.to_fields())
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        logger.info("anomaly_scan_submitted", job_id=job.id, tenant_id=tenant_id)
+        return job
+
+    async def get(self, job_id: str, tenant_id: str) -> ScanJob | None:
+        stored = await self.store.load(job_id)
+        if stored is None or stored.get("tenant_id") != tenant_id:
+            return None
+        return ScanJob.from_fields(stored)
+
+    async def results(self, job_id: str) -> dict[str, dict]:
+        """Per-installation results recorded so far."""
+        return await self.store.load_results(job_id)
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _save(self, job: ScanJob, results: dict[str, dict] | None = None) -> None:
+        # A failed write does not stop the scan; unsaved results go out with the next write
+        job._unsaved.update(results or {})
+        async with job._save_lock:
+            unsaved = dict(job._unsaved)
+            try:
+                await self.store.save(job.id, job.to_fields(progress_only=True), unsaved)
+            except JobStoreUnavailableError as e:
+                logger.warning("anomaly_scan_store_error", job_id=job.id, error=str(e))
+                return
+            for installation_id in unsaved:
+                job._unsaved.pop(installation_id, None)
+
+    async def _run(self, job: ScanJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        db = SessionLocal()
+        try:
+            await self._save(job)
+            installation_ids = job.installation_ids
+            if installation_ids is None:
+                installation_ids = await run_db(fetch_tenant_installation_ids, db, job.tenant_id)
+            job.total = len(installation_ids)
+            ANOMALY_SCAN_PENDING.inc(job.total)
+            await self._save(job)
+
+            for start in range(0, len(installation_ids), self.batch_size):
+                batch = installation_ids[start:start + self.batch_size]
+                yearly = await run_db(fetch_yearly_emissions_many, db, batch, job.tenant_id)
+                loaded = [iid for iid in batch if yearly[iid].records < self.streaming_min_rows]
+                emissions = await run_db(copy_emission_data_many, db, loaded, job.tenant_id) if loaded else {}
+                balances = await run_db(copy_balance_data_many, db, batch, job.tenant_id)
+                await asyncio.gather(*(
+                    self._scan_installation(job, iid, emissions.get(iid), yearly[iid], balances[iid]) for iid in batch
+                ))
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.warning("anomaly_scan_error", job_id=job.id, error=str(e))
+        finally:
+            job.finished_at = time.time()
+            ANOMALY_SCAN_PENDING.dec(job.total - job.processed)
+            ANOMALY_SCAN_JOBS.labels(status=job.status).inc()
+            db.close()
+            await self._save(job)
+            logger.info("anomaly_scan_finished", **job.progress())
+
+    async def _scan_installation(self, job: ScanJob, installation_id: str, emissions, yearly, balances) -> None:
+        async with self._slots:
+            stream_db = None
+            if emissions is None:
+                # Not loaded with the batch: stream the rows over a session of its own. Chunks are
+                # read on the db executor and scored on the cpu executor.
+                stream_db = SessionLocal()
+                chunks = functools.partial(stream_emission_data, stream_db, installation_id, job.tenant_id)
+                detect = functools.partial(adetect_anomalies_streaming, chunks, yearly, balances, job.threshold)
+            else:
+                detect = functools.partial(run_cpu, detect_anomalies, emissions, balances, job.threshold)
+            try:
+                result = await self._detect(job, installation_id, detect)
+            finally:
+                if stream_db is not None:
+                    stream_db.close()
+        if result["status"] == "error":
+            job.failed += 1
+        job.processed += 1
+        ANOMALY_SCAN_PENDING.dec()
+        ANOMALY_SCAN_INSTALLATIONS.labels(status=result["status"]).inc()
+        await self._save(job, {installation_id: result})
+
+    async def _detect(self, job: ScanJob, installation_id: str, detect) -> dict:
+        while True:
+            try:
+                result = await detect()
+            except ExecutorSaturatedError:
+                await asyncio.sleep(_SATURATED_RETRY_SECONDS)
+                continue
+            except Exception as e:
+                logger.warning("anomaly_scan_item_error", job_id=job.id, installation_id=installation_id, error=str(e))
+                return {"status": "error", "summary": None, "message": str(e)}
+            return {"status": result["status"], "summary": result["summary"]}
+
+
+scan_jobs = ScanJobManager()
@@ -1,47 +1,83 @@
 """
 Anomaly Detection Service
 Uses IsolationForest for detecting outliers in emission data with severity scores.
+
+Installations too large to hold in memory use the streaming mode: the forest
+is fitted on a bounded reservoir sample of the emission rows, then the rows
+are scored chunk by chunk, so peak memory does not grow with the row count.
+
+The fitted forest does not depend on the contamination rate, only the score
+cutoff does. fit_emission_model returns an EmissionAnomalyModel that callers
+can keep per installation and pass back in: a different threshold is then a
+re-threshold over the cached scores, with no refit.
+
+The a-prefixed streaming variants are for the event loop: each chunk is read
+from the cursor on the db executor and sampled or scored on the cpu executor,
+so cursor I/O never occupies a cpu slot.
 """
 
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterable, Iterator
+
 import numpy as np
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-from config import ANOMALY_CONTAMINATION
+from config import ANOMALY_CONTAMINATION, ANOMALY_STREAM_SAMPLE_SIZE
+from executors import run_db, run_cpu, ExecutorSaturatedError
+from frames import (
+    EmissionFrame, BalanceFrame, YearlyAggregate, as_emission_frame, as_balance_frame, as_yearly,
+)
+
+
+@dataclass(frozen=True)
+class EmissionAnomalyModel:
+    """Fitted scaler and forest, plus the raw scores of the rows they were fitted on."""
+
+    scaler: StandardScaler
+    forest: IsolationForest
+    fit_scores: np.ndarray
+    # Ids of the scored rows when fit_scores cover a whole frame (in-memory fit); None for a sample fit
+    record_ids: np.ndarray | None = None
+
+    def cutoff(self, threshold: float) -> float:
+        """Score below which a row is an outlier; same as IsolationForest.offset_ for this contamination."""
+        return float(np.percentile(self.fit_scores, 100.0 * min(threshold, 0.5)))
 
 
 def detect_anomalies(
-    emission_data: list[dict],
-    balance_data: list[dict],
+    emission_data: EmissionFrame | list[dict],
+    balance_data: BalanceFrame | list[dict],
     threshold: float = ANOMALY_CONTAMINATION,
+    model: EmissionAnomalyModel | None = None,
 ) -> dict:
     """
     Detect anomalies in emission and balance data.
 
     Args:
-        emission_data: List of emission records
-        balance_data: List of GHG balance records
+        emission_data: Emission frame (or list of emission records)
+        balance_data: Balance frame (or list of GHG balance records)
         threshold: Contamination rate (expected proportion of outliers)
+        model: Model from fit_emission_model for this data; fitted here when omitted
 
     Returns:
         Dictionary with detected anomalies and summary statistics
     """
-    if not emission_data and not balance_data:
-        return {
-            "status": "no_data",
-            "message": "Anomali tespiti icin veri bulunamadi",
-            "anomalies": [],
-            "summary": None,
-        }
+    emission_data = as_emission_frame(emission_data)
+    balance_data = as_balance_frame(balance_data)
+
+    if not len(emission_data) and not len(balance_data):
+        return _no_data_result()
 
     anomalies = []
 
     # Detect anomalies in emissions
-    if emission_data:
-        emission_anomalies = _detect_emission_anomalies(emission_data, threshold)
+    if len(emission_data):
+        emission_anomalies = _detect_emission_anomalies(emission_data, threshold, model)
         anomalies.extend(emission_anomalies)
 
     # Detect anomalies in balance data
-    if balance_data:
+    if len(balance_data):
         balance_anomalies = _detect_balance_anomalies(balance_data, threshold)
         anomalies.extend(balance_anomalies)
 
@@ -49,175 +85,506 @@ def detect_anomalies(
     cross_anomalies = _cross_validate(emission_data, balance_data)
     anomalies.extend(cross_anomalies)
 
+    return _success_result(anomalies, len(emission_data) + len(balance_data))
+
+
+def detect_anomalies_streaming(
+    emission_chunks: Callable[[], Iterable[EmissionFrame]],
+    yearly: YearlyAggregate,
+    balance_data: BalanceFrame | list[dict],
+    threshold: float = ANOMALY_CONTAMINATION,
+    sample_size: int = ANOMALY_STREAM_SAMPLE_SIZE,
+    model: EmissionAnomalyModel | None = None,
+) -> dict:
+    """
+    detect_anomalies for installations whose emission rows do not fit in memory.
+
+    Args:
+        emission_chunks: Returns a fresh iterator of emission frames on each call
+            (the rows are read twice: once to sample, once to score; once with a model)
+        yearly: Per-year emission aggregate (for the year-over-year check and record count)
+        balance_data: Balance frame (or list of GHG balance records)
+        threshold: Contamination rate (expected proportion of outliers)
+        sample_size: Maximum number of rows the forest is fitted on
+        model: Model from fit_emission_model_sampled for this data; fitted here when omitted
+
+    Returns:
+        Same dictionary as detect_anomalies
+    """
+    balance_data = as_balance_frame(balance_data)
+    if not yearly.records and not len(balance_data):
+        return _no_data_result()
+
+    anomalies = []
+    for found in stream_anomalies(emission_chunks, yearly, balance_data, threshold, sample_size, model):
+        anomalies.extend(found)
+    return _success_result(anomalies, yearly.records + len(balance_data))
+
+
+def stream_anomalies(
+    emission_chunks: Callable[[], Iterable[EmissionFrame]],
+    yearly: YearlyAggregate,
+    balance_data: BalanceFrame | list[dict],
+    threshold: float = ANOMALY_CONTAMINATION,
+    sample_size: int = ANOMALY_STREAM_SAMPLE_SIZE,
+    model: EmissionAnomalyModel | None = None,
+) -> Iterator[list[dict]]:
+    """
+    Yield anomalies as they are found, one list per scored emission chunk,
+    followed by the balance and year-over-year checks. Lists may be empty.
+    """
+    if model is None:
+        model = fit_emission_model_sampled(emission_chunks, sample_size)
+    if model is not None:
+        yield from _stream_emission_anomalies(emission_chunks, threshold, model)
+    yield from _balance_checks(yearly, as_balance_frame(balance_data), threshold)
+
+
+async def adetect_anomalies_streaming(
+    emission_chunks: Callable[[], Iterable[EmissionFrame]],
+    yearly: YearlyAggregate,
+    balance_data: BalanceFrame | list[dict],
+    threshold: float = ANOMALY_CONTAMINATION,
+    sample_size: int = ANOMALY_STREAM_SAMPLE_SIZE,
+    model: EmissionAnomalyModel | None = None,
+) -> dict:
+    """detect_anomalies_streaming with reads on the db executor and scoring on the cpu executor."""
+    balance_data = as_balance_frame(balance_data)
+    if not yearly.records and not len(balance_data):
+        return _no_data_result()
+
+    anomalies = []
+    found = astream_anomalies(emission_chunks, yearly, balance_data, threshold, sample_size, model)
+    try:
+        async for chunk in found:
+            anomalies.extend(chunk)
+    finally:
+        await found.aclose()
+    return await run_cpu(_success_result, anomalies, yearly.records + len(balance_data))
+
+
+async def astream_anomalies(
+    emission_chunks: Callable[[], Iterable[EmissionFrame]],
+    yearly: YearlyAggregate,
+    balance_data: BalanceFrame | list[dict],
+    threshold: float = ANOMALY_CONTAMINATION,
+    sample_size: int = ANOMALY_STREAM_SAMPLE_SIZE,
+    model: EmissionAnomalyModel | None = None,
+) -> AsyncIterator[list[dict]]:
+    """stream_anomalies with reads on the db executor and scoring on the cpu executor."""
+    if model is None:
+        model = await afit_emission_model_sampled(emission_chunks, sample_size)
+    if model is not None:
+        cutoff = model.cutoff(threshold)
+        frames = _db_chunks(emission_chunks)
+        try:
+            async for frame in frames:
+                found = await run_cpu(_score_chunk, frame, model, cutoff)
+                if found is not None:
+                    yield found
+        finally:
+            await frames.aclose()
+    for found in await run_cpu(_balance_checks, yearly, as_balance_frame(balance_data), threshold):
+        yield found
+
+
+async def afit_emission_model_sampled(
+    emission_chunks: Callable[[], Iterable[EmissionFrame]],
+    sample_size: int = ANOMALY_STREAM_SAMPLE_SIZE,
+) -> EmissionAnomalyModel | None:
+    """fit_emission_model_sampled with reads on the db executor and sampling on the cpu executor."""
+    sampler = EmissionSampler(sample_size)
+    frames = _db_chunks(emission_chunks)
+    try:
+        async for frame in frames:
+            await run_cpu(sampler.add, frame)
+    finally:
+        await frames.aclose()
+    return await run_cpu(sampler.fit)
+
+
+async def _db_chunks(emission_chunks: Callable[[], Iterable[EmissionFrame]]) -> AsyncIterator[EmissionFrame]:
+    # One db-executor call per chunk; calls are sequential, so the cursor is never used concurrently.
+    # Reads are shielded: a cancelled consumer lets the running next() finish before close(), which
+    # would otherwise raise "generator already executing" and leave the cursor open.
+    chunks = iter(emission_chunks())
+    read = None
+    try:
+        while True:
+            read = asyncio.ensure_future(run_db(next, chunks, None))
+            frame = await asyncio.shield(read)
+            if frame is None:
+                break
+            yield frame
+    finally:
+        if read is not None and not read.done():
+            await asyncio.wait([read])
+            if not read.cancelled():
+                read.exception()  # retrieved; the consumer's cancellation is what propagates
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            try:
+                await run_db(close)
+            except ExecutorSaturatedError:
+                close()
+
+
+def _balance_checks(yearly: YearlyAggregate, balance_data: BalanceFrame, threshold: float) -> list[list[dict]]:
+    """Balance outliers (when there are balances) and the year-over-year cross check."""
+    checks = [_detect_balance_anomalies(balance_data, threshold)] if len(balance_data) else []
+    checks.append(_cross_validate(yearly, balance_data))
+    return checks
+
+
+def _no_data_result() -> dict:
+    return {
+        "status": "no_data",
+        "message": "Anomali tespiti icin veri bulunamadi",
+        "anomalies": [],
+        "summary": None,
+    }
+
+
+def _success_result(anomalies: list[dict], total_records: int) -> dict:
     # Sort by severity (highest first)
     anomalies.sort(key=lambda x: x["severity_score"], reverse=True)
+    return {
+        "status": "success",
+        "message": f"{len(anomalies)} anomali tespit edildi",
+        "anomalies": anomalies,
+        "summary": anomaly_summary(anomalies, total_records),
+    }
+
 
-    # Summary
-    summary = {
+def anomaly_summary(anomalies: list[dict], total_records: int) -> dict:
+    """Counts by severity and the data quality score."""
+    return {
         "total_anomalies": len(anomalies),
         "critical": len([a for a in anomalies if a["severity"] == "critical"]),
         "warning": len([a for a in anomalies if a["severity"] == "warning"]),
         "info": len([a for a in anomalies if a["severity"] == "info"]),
-        "data_quality_score": _calculate_quality_score(anomalies, len(emission_data) + len(balance_data)),
+        "data_quality_score": _calculate_quality_score(anomalies, total_records),
     }
 
-    return {
-        "status": "success",
-        "message": f"{len(anomalies)} anomali tespit edildi",
-        "anomalies": anomalies,
-        "summary": summary,
-    }
 
+def _emission_features(frame: EmissionFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Numeric feature matrix (missing values count as 0) and the indices of rows with any value."""
+    features = np.nan_to_num(np.column_stack([
+        frame.ad_value, frame.ef_value, frame.direct, frame.indirect, frame.total,
+    ]))
+    valid_idx = np.flatnonzero((features != 0).any(axis=1))
+    return features[valid_idx], valid_idx
 
-def _detect_emission_anomalies(data: list[dict], threshold: float) -> list[dict]:
-    """Detect anomalies in emission values using IsolationForest."""
-    # Extract numeric features
-    features = []
-    valid_rows = []
-    for row in data:
-        values = []
-        for field in ["aDValue", "eFValue", "directEmissions", "indirectEmissions", "totalCo2Emissions"]:
-            val = row.get(field)
-            values.append(float(val) if val is not None else 0.0)
-        if any(v != 0 for v in values):
-            features.append(values)
-            valid_rows.append(row)
-
-    if len(features) < 5:
-        return []
 
-    X = np.array(features)
+def fit_emission_model(data: EmissionFrame | list[dict]) -> EmissionAnomalyModel | None:
+    """Fit the emission outlier model on every row; None when fewer than 5 rows carry values."""
+    frame = as_emission_frame(data)
+    X, valid_idx = _emission_features(frame)
+    if len(valid_idx) < 5:
+        return None
+    return _fit_emission_model(X, record_ids=frame.id[valid_idx])
+
+
+def fit_emission_model_sampled(
+    emission_chunks: Callable[[], Iterable[EmissionFrame]],
+    sample_size: int = ANOMALY_STREAM_SAMPLE_SIZE,
+) -> EmissionAnomalyModel | None:
+    """Fit the emission outlier model on a reservoir sample of the streamed rows (one pass)."""
+    sampler = EmissionSampler(sample_size)
+    for frame in emission_chunks():
+        sampler.add(frame)
+    return sampler.fit()
+
+
+class EmissionSampler:
+    """Uniform reservoir sample of emission feature rows, fed one chunk at a time."""
+
+    def __init__(self, sample_size: int = ANOMALY_STREAM_SAMPLE_SIZE):
+        self._rng = np.random.default_rng(42)
+        self._reservoir = np.empty((sample_size, 5))
+        self.seen = 0
+
+    def add(self, frame: EmissionFrame) -> None:
+        X, _ = _emission_features(frame)
+        self.seen = _reservoir_update(self._reservoir, self.seen, X, self._rng)
+
+    def fit(self) -> EmissionAnomalyModel | None:
+        """Model fitted on the sample; None when fewer than 5 rows carry values."""
+        n = min(self.seen, len(self._reservoir))
+        if n < 5:
+            return None
+        return _fit_emission_model(self._reservoir[:n])
+
+
+def _fit_emission_model(X: np.ndarray, record_ids: np.ndarray | None = None) -> EmissionAnomalyModel:
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
-
-    model = IsolationForest(
-        contamination=min(threshold, 0.5),
+    # Contamination only sets the cutoff (EmissionAnomalyModel.cutoff), so fit without one
+    forest = IsolationForest(
+        contamination="auto",
         random_state=42,
         n_estimators=100,
     )
-    predictions = model.fit_predict(X_scaled)
-    scores = model.decision_function(X_scaled)
+    forest.fit(X_scaled)
+    return EmissionAnomalyModel(scaler, forest, forest.score_samples(X_scaled), record_ids)
 
-    anomalies = []
-    for i, (pred, score) in enumerate(zip(predictions, scores)):
-        if pred == -1:  # Anomaly
-            row = valid_rows[i]
-            severity_score = float(abs(score))
-            severity = _score_to_severity(severity_score)
-
-            anomalies.append({
-                "type": "emission_outlier",
-                "source": "IsolationForest",
-                "record_id": row.get("id", ""),
-                "year": row.get("reportingYear"),
-                "emission_type": row.get("emission_type", ""),
-                "severity": severity,
-                "severity_score": round(severity_score, 4),
-                "description": _describe_emission_anomaly(row, severity),
-                "values": {
-                    "directEmissions": _safe_float(row.get("directEmissions")),
-                    "indirectEmissions": _safe_float(row.get("indirectEmissions")),
-                    "totalCo2Emissions": _safe_float(row.get("totalCo2Emissions")),
-                },
-            })
 
-    return anomalies
+def _detect_emission_anomalies(
+    data: EmissionFrame | list[dict],
+    threshold: float,
+    model: EmissionAnomalyModel | None = None,
+) -> list[dict]:
+    """Detect anomalies in emission values using IsolationForest."""
+    frame = as_emission_frame(data)
+    if model is None:
+        model = fit_emission_model(frame)
+    if model is None:
+        return []
 
+    X, valid_idx = _emission_features(frame)
+    if model.record_ids is not None and np.array_equal(model.record_ids, frame.id[valid_idx]):
+        raw = model.fit_scores
+    else:
+        raw = _raw_scores(model, X)
+    return _score_emission_rows(frame, raw - model.cutoff(threshold), valid_idx)
+
+
+def _stream_emission_anomalies(
+    emission_chunks: Callable[[], Iterable[EmissionFrame]],
+    threshold: float,
+    model: EmissionAnomalyModel,
+) -> Iterator[list[dict]]:
+    """Score the streamed rows chunk by chunk against a fitted model."""
+    cutoff = model.cutoff(threshold)
+    for frame in emission_chunks():
+        found = _score_chunk(frame, model, cutoff)
+        if found is not None:
+            yield found
+
+
+def _score_chunk(frame: EmissionFrame, model: EmissionAnomalyModel, cutoff: float) -> list[dict] | None:
+    """Anomalies in one chunk; None when no row in it carries a value."""
+    X, valid_idx = _emission_features(frame)
+    if not len(valid_idx):
+        return None
+    return _score_emission_rows(frame, _raw_scores(model, X) - cutoff, valid_idx)
 
-def _detect_balance_anomalies(data: list[dict], threshold: float) -> list[dict]:
-    """Detect anomalies in GHG balance data."""
-    anomalies = []
 
-    for row in data:
-        direct = _safe_float(row.get("directEmissions"))
-        indirect = _safe_float(row.get("indirectEmissions"))
-        total = _safe_float(row.get("totalEmissions"))
-        year = row.get("reportingYear")
-
-        # Check: total should approximately equal direct + indirect
-        if direct and indirect and total:
-            expected = direct + indirect
-            diff = abs(total - expected)
-            if expected > 0 and diff / expected > 0.1:  # >10% discrepancy
-                severity_score = min(diff / expected, 1.0)
-                anomalies.append({
-                    "type": "balance_mismatch",
-                    "source": "cross_check",
-                    "record_id": row.get("id", ""),
-                    "year": year,
-                    "emission_type": "",
-                    "severity": _score_to_severity(severity_score),
-                    "severity_score": round(severity_score, 4),
-                    "description": f"Yil {year}: Toplam emisyon ({total:.2f}) dogrudan ({direct:.2f}) + dolayli ({indirect:.2f}) toplamina uymuyor. Fark: {diff:.2f} tCO2e",
-                    "values": {
-                        "directEmissions": direct,
-                        "indirectEmissions": indirect,
-                        "totalEmissions": total,
-                        "expected": round(expected, 4),
-                    },
-                })
-
-        # Check: negative values
-        for field_name, value in [("directEmissions", direct), ("indirectEmissions", indirect), ("totalEmissions", total)]:
-            if value is not None and value < 0:
-                anomalies.append({
-                    "type": "negative_value",
-                    "source": "validation",
-                    "record_id": row.get("id", ""),
-                    "year": year,
-                    "emission_type": "",
-                    "severity": "critical",
-                    "severity_score": 1.0,
-                    "description": f"Yil {year}: {field_name} negatif deger ({value:.4f}). Bu fiziksel olarak mumkun degildir.",
-                    "values": {field_name: value},
-                })
+def _raw_scores(model: EmissionAnomalyModel, X: np.ndarray) -> np.ndarray:
+    return model.forest.score_samples(model.scaler.transform(X))
+
+
+def _reservoir_update(reservoir: np.ndarray, seen: int, X: np.ndarray, rng: np.random.Generator) -> int:
+    """Algorithm R over a chunk: keep a uniform sample of every row seen so far. Returns the new count."""
+    k = len(reservoir)
+    fill = min(max(k - seen, 0), len(X))
+    reservoir[seen:seen + fill] = X[:fill]
+    rest = X[fill:]
+    if len(rest):
+        # Row t replaces slot j ~ U[0, t] when j < k; later rows win on repeated slots, as in the serial loop
+        slots = rng.integers(0, seen + fill + np.arange(len(rest)) + 1)
+        keep = slots < k
+        reservoir[slots[keep]] = rest[keep]
+    return seen + len(X)
+
+
+def _score_emission_rows(frame: EmissionFrame, scores: np.ndarray, valid_idx: np.ndarray) -> list[dict]:
+    """Anomaly records for the rows with a negative score (raw score minus cutoff, i.e. decision_function)."""
+    anomalies = []
+    for i in np.flatnonzero(scores < 0):  # Anomalies
+        row = frame.row(valid_idx[i])
+        severity_score = float(abs(scores[i]))
+        severity = _score_to_severity(severity_score)
+
+        anomalies.append({
+            "type": "emission_outlier",
+            "source": "IsolationForest",
+            "record_id": row["id"] or "",
+            "year": row["reportingYear"],
+            "emission_type": row["emission_type"] or "",
+            "severity": severity,
+            "severity_score": round(severity_score, 4),
+            "description": _describe_emission_anomaly(row, severity),
+            "values": {
+                "directEmissions": row["directEmissions"],
+                "indirectEmissions": row["indirectEmissions"],
+                "totalCo2Emissions": row["totalCo2Emissions"],
+            },
+        })
 
     return anomalies
 
 
-def _cross_validate(emission_data: list[dict], balance_data: list[dict]) -> list[dict]:
+def _detect_balance_anomalies(data: BalanceFrame | list[dict], threshold: float) -> list[dict]:
+    """Detect anomalies in GHG balance data."""
+    frame = as_balance_frame(data)
+    expected = frame.direct + frame.indirect
+    columns = {
+        "id": frame.id,
+        "year": frame.year,
+        "direct": frame.direct,
+        "indirect": frame.indirect,
+        "total": frame.total,
+        "expected": expected,
+        "diff": np.abs(frame.total - expected),
+    }
+    return _apply_rules(BALANCE_RULES, columns)
+
+
+def _cross_validate(
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+    balance_data: BalanceFrame | list[dict],
+) -> list[dict]:
     """Cross-validate between emission and balance records."""
-    anomalies = []
+    yearly = as_yearly(emission_data)
 
     # Check for sudden year-over-year changes in emissions
-    if len(emission_data) >= 2:
-        yearly_totals: dict[int, float] = {}
-        for row in emission_data:
-            year = row.get("reportingYear")
-            total = _safe_float(row.get("totalCo2Emissions"))
-            if year and total:
-                yearly_totals[int(year)] = yearly_totals.get(int(year), 0) + total
-
-        sorted_years = sorted(yearly_totals.items())
-        for i in range(1, len(sorted_years)):
-            prev_year, prev_val = sorted_years[i - 1]
-            curr_year, curr_val = sorted_years[i]
-            if prev_val > 0:
-                change_pct = abs(curr_val - prev_val) / prev_val * 100
-                if change_pct > 50:  # >50% year-over-year change
-                    severity_score = min(change_pct / 100, 1.0)
-                    direction = "artis" if curr_val > prev_val else "azalis"
-                    anomalies.append({
-                        "type": "sudden_change",
-                        "source": "trend_analysis",
-                        "record_id": "",
-                        "year": curr_year,
-                        "emission_type": "",
-                        "severity": _score_to_severity(severity_score * 0.7),
-                        "severity_score": round(severity_score * 0.7, 4),
-                        "description": f"{prev_year}-{curr_year}: Yillik emisyonda %{change_pct:.1f} {direction} ({prev_val:.2f} -> {curr_val:.2f} tCO2e). Ani degisim incelenmelidir.",
-                        "values": {
-                            "previous_year": prev_year,
-                            "previous_emissions": round(prev_val, 4),
-                            "current_year": curr_year,
-                            "current_emissions": round(curr_val, 4),
-                            "change_pct": round(change_pct, 2),
-                        },
-                    })
+    if yearly.records < 2:
+        return []
+    years, totals = yearly.total_series()
+    prev_totals = totals[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = np.abs(totals[1:] - prev_totals) / prev_totals * 100
+    columns = {
+        "prev_year": years[:-1],
+        "prev_total": prev_totals,
+        "year": years[1:],
+        "total": totals[1:],
+        "change_pct": change_pct,
+    }
+    return _apply_rules(TREND_RULES, columns)
+
+
+# ---------------------------------------------------------------------------
+# Rule engine
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Rule:
+    """A vectorized check over named column arrays.
+
+    `check` returns a boolean mask of flagged rows and a severity score per row.
+    `describe` and `values` are only called for flagged rows, with that row's
+    columns as plain Python values.
+    """
 
+    type: str
+    source: str
+    check: Callable[[dict[str, np.ndarray]], tuple[np.ndarray, np.ndarray]]
+    describe: Callable[[dict], str]
+    values: Callable[[dict], dict]
+
+
+def _apply_rules(rules: list[Rule], columns: dict[str, np.ndarray]) -> list[dict]:
+    """Run every rule over the columns; anomalies are ordered by row, then by rule."""
+    rows, ranks, scores = [], [], []
+    for rank, rule in enumerate(rules):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mask, score = rule.check(columns)
+        flagged = np.flatnonzero(mask)
+        rows.append(flagged)
+        ranks.append(np.full(len(flagged), rank))
+        scores.append(score[flagged])
+    rows, ranks, scores = np.concatenate(rows), np.concatenate(ranks), np.concatenate(scores)
+
+    order = np.lexsort((ranks, rows))
+    # Convert only the flagged rows to Python values, one column at a time
+    flagged_columns = {name: _column_values(name, values[rows[order]]) for name, values in columns.items()}
+    anomalies = []
+    for j, i in enumerate(order):
+        rule = rules[ranks[i]]
+        row = {name: values[j] for name, values in flagged_columns.items()}
+        severity_score = float(scores[i])
+        anomalies.append({
+            "type": rule.type,
+            "source": rule.source,
+            "record_id": row.get("id") or "",
+            "year": row["year"],
+            "emission_type": "",
+            "severity": _score_to_severity(severity_score),
+            "severity_score": round(severity_score, 4),
+            "description": rule.describe(row),
+            "values": rule.values(row),
+        })
     return anomalies
 
 
+def _column_values(name: str, values: np.ndarray) -> list:
+    if name in ("year", "prev_year"):
+        return [int(v) if v else None for v in values.tolist()]
+    if values.dtype.kind == "f":
+        out = values.astype(object)
+        out[np.isnan(values)] = None
+        return out.tolist()
+    return values.tolist()
+
+
+def _present(values: np.ndarray) -> np.ndarray:
+    # Missing and zero both count as "not reported"
+    return np.nan_to_num(values) != 0
+
+
+def _balance_mismatch(c: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    ratio = c["diff"] / c["expected"]
+    reported = _present(c["direct"]) & _present(c["indirect"]) & _present(c["total"])
+    return reported & (c["expected"] > 0) & (ratio > 0.1), np.minimum(ratio, 1.0)  # >10% discrepancy
+
+
+def _negative_value_rule(field_name: str, column: str) -> Rule:
+    return Rule(
+        type="negative_value",
+        source="validation",
+        check=lambda c: (c[column] < 0, np.ones(len(c[column]))),
+        describe=lambda r: f"Yil {r['year']}: {field_name} negatif deger ({r[column]:.4f}). Bu fiziksel olarak mumkun degildir.",
+        values=lambda r: {field_name: r[column]},
+    )
+
+
+def _sudden_change(c: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    flagged = (c["prev_total"] > 0) & (c["change_pct"] > 50)  # >50% year-over-year change
+    return flagged, np.minimum(c["change_pct"] / 100, 1.0) * 0.7
+
+
+BALANCE_RULES = [
+    # Total should approximately equal direct + indirect
+    Rule(
+        type="balance_mismatch",
+        source="cross_check",
+        check=_balance_mismatch,
+        describe=lambda r: f"Yil {r['year']}: Toplam emisyon ({r['total']:.2f}) dogrudan ({r['direct']:.2f}) + dolayli ({r['indirect']:.2f}) toplamina uymuyor. Fark: {r['diff']:.2f} tCO2e",
+        values=lambda r: {
+            "directEmissions": r["direct"],
+            "indirectEmissions": r["indirect"],
+            "totalEmissions": r["total"],
+            "expected": round(r["expected"], 4),
+        },
+    ),
+    _negative_value_rule("directEmissions", "direct"),
+    _negative_value_rule("indirectEmissions", "indirect"),
+    _negative_value_rule("totalEmissions", "total"),
+]
+
+TREND_RULES = [
+    Rule(
+        type="sudden_change",
+        source="trend_analysis",
+        check=_sudden_change,
+        describe=lambda r: (
+            f"{r['prev_year']}-{r['year']}: Yillik emisyonda %{r['change_pct']:.1f} "
+            f"{'artis' if r['total'] > r['prev_total'] else 'azalis'} "
+            f"({r['prev_total']:.2f} -> {r['total']:.2f} tCO2e). Ani degisim incelenmelidir."
+        ),
+        values=lambda r: {
+            "previous_year": r["prev_year"],
+            "previous_emissions": round(r["prev_total"], 4),
+            "current_year": r["year"],
+            "current_emissions": round(r["total"], 4),
+            "change_pct": round(r["change_pct"], 2),
+        },
+    ),
+]
+
+
 def _safe_float(val) -> float | None:
     if val is None:
         return None
@@ -262,5 +629,5 @@ def _calculate_quality_score(anomalies: list[dict], total_records: int) -> float
         else:
             penalty += 1
 
-    score = max(0, 100 - penalty)
+    score = max(0.0, 100.0 - penalty)
     return round(score, 1)
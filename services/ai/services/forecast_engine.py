@@ -0,0 +1,358 @@
+"""
+Vectorized Forecast Engine
+Fits closed-form trend models to many yearly series at once.
+
+Series are stacked into (S, L) matrices, left-aligned and padded, with a
+boolean mask marking the observed points, so ragged histories are handled
+without Python loops over series. Every fit returns per-series arrays.
+"""
+
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Sequence
+
+import numpy as np
+from scipy import stats
+
+CLOSED_FORM_MODELS = ("OLS", "TheilSen", "DampedTrend")
+
+# Damped-trend smoothing grid, searched for every series in one pass
+_DAMPED_GRID = np.array(np.meshgrid(
+    [0.2, 0.5, 0.8],        # alpha (level smoothing)
+    [0.05, 0.2, 0.5],       # beta as a share of alpha (trend smoothing)
+    [0.8, 0.9, 0.98],       # phi (damping)
+)).reshape(3, -1)
+
+_Z_90 = stats.norm.ppf(0.95)
+
+# Scalars that fully describe a fitted model, as exported by fit_params
+_LINE_PARAMS = ("slope", "intercept", "x_mean", "sxx", "n", "dof", "sigma")
+_DAMPED_PARAMS = ("alpha", "beta", "phi", "level", "trend", "sigma")
+
+
+@dataclass
+class SeriesBatch:
+    """Stacked yearly series: x (years) and y (values), shape (S, L), with a validity mask."""
+
+    x: np.ndarray
+    y: np.ndarray
+    mask: np.ndarray
+
+    def __len__(self) -> int:
+        return self.x.shape[0]
+
+    @property
+    def n(self) -> np.ndarray:
+        return self.mask.sum(axis=1)
+
+    @property
+    def last_x(self) -> np.ndarray:
+        return self.x[np.arange(len(self)), self.n - 1]
+
+
+@dataclass
+class LineFit:
+    """Per-series straight-line fit with residual statistics."""
+
+    slope: np.ndarray
+    intercept: np.ndarray
+    x_mean: np.ndarray
+    sxx: np.ndarray
+    n: np.ndarray
+    dof: np.ndarray
+    sigma: np.ndarray       # residual std with n - 2 degrees of freedom
+    resid_std: np.ndarray   # population std of the residuals
+    r2: np.ndarray
+    fitted: np.ndarray
+
+
+@dataclass
+class DampedFit:
+    """Per-series additive damped-trend smoothing state and parameters."""
+
+    alpha: np.ndarray
+    beta: np.ndarray
+    phi: np.ndarray
+    level: np.ndarray
+    trend: np.ndarray
+    sigma: np.ndarray
+    r2: np.ndarray
+    fitted: np.ndarray
+
+
+@dataclass
+class ClosedFormForecast:
+    """Forecast from the best closed-form model of each series."""
+
+    model_index: np.ndarray   # index into CLOSED_FORM_MODELS
+    future_x: np.ndarray      # (S, P)
+    mean: np.ndarray          # (S, P)
+    half_width: np.ndarray    # (S, P) half-width of the 90% prediction interval
+    r2: np.ndarray
+    cv_mae: np.ndarray        # (S, len(CLOSED_FORM_MODELS)) rolling-origin one-step MAE
+    fits: tuple               # full-history fits, aligned with CLOSED_FORM_MODELS
+
+
+def stack_series(series: Sequence[tuple[np.ndarray, np.ndarray]]) -> SeriesBatch:
+    """Stack (years, values) pairs of different lengths into a masked batch."""
+    lengths = np.array([len(x) for x, _ in series], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    mask = np.arange(width)[None, :] < lengths[:, None]
+    x = np.zeros(mask.shape, dtype=np.float64)
+    y = np.zeros(mask.shape, dtype=np.float64)
+    if width:
+        x[mask] = np.concatenate([np.asarray(s[0], dtype=np.float64) for s in series])
+        y[mask] = np.concatenate([np.asarray(s[1], dtype=np.float64) for s in series])
+    return SeriesBatch(x=x, y=y, mask=mask)
+
+
+def fit_ols(batch: SeriesBatch) -> LineFit:
+    """Ordinary least squares line per series."""
+    x, y, mask = batch.x, batch.y, batch.mask
+    n = batch.n
+    x_mean = (x * mask).sum(axis=1) / n
+    y_mean = (y * mask).sum(axis=1) / n
+    dx = (x - x_mean[:, None]) * mask
+    sxx = (dx * dx).sum(axis=1)
+    sxy = (dx * (y - y_mean[:, None])).sum(axis=1)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+    return _line_fit(batch, slope, y_mean - slope * x_mean)
+
+
+def fit_theil_sen(batch: SeriesBatch) -> LineFit:
+    """Theil-Sen line per series: median of pairwise slopes, median intercept."""
+    x, y, mask = batch.x, batch.y, batch.mask
+    width = x.shape[1]
+    dx = x[:, None, :] - x[:, :, None]
+    dy = y[:, None, :] - y[:, :, None]
+    upper = np.triu(np.ones((width, width), dtype=bool), k=1)
+    pair = mask[:, :, None] & mask[:, None, :] & upper & (dx != 0)
+    pair_slopes = (dy / np.where(pair, dx, 1.0)).reshape(len(batch), -1)
+    slope = np.nan_to_num(_masked_median(pair_slopes, pair.reshape(len(batch), -1)))
+    intercept = _masked_median(y - slope[:, None] * x, mask)
+    return _line_fit(batch, slope, np.nan_to_num(intercept))
+
+
+def _masked_median(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Row-wise median over the valid entries (NaN for rows with none)."""
+    counts = valid.sum(axis=1)
+    ordered = np.sort(np.where(valid, values, np.inf), axis=1)
+    rows = np.arange(len(values))
+    lo = ordered[rows, np.maximum((counts - 1) // 2, 0)]
+    hi = ordered[rows, np.maximum(counts // 2, 0) if ordered.shape[1] else 0]
+    with np.errstate(invalid="ignore"):
+        return np.where(counts > 0, (lo + hi) / 2, np.nan)
+
+
+def _line_fit(batch: SeriesBatch, slope: np.ndarray, intercept: np.ndarray) -> LineFit:
+    x, y, mask = batch.x, batch.y, batch.mask
+    n = batch.n
+    fitted = intercept[:, None] + slope[:, None] * x
+    resid = np.where(mask, y - fitted, 0.0)
+    sse = (resid * resid).sum(axis=1)
+    resid_mean = resid.sum(axis=1) / n
+    resid_std = np.sqrt((np.where(mask, resid - resid_mean[:, None], 0.0) ** 2).sum(axis=1) / n)
+    dof = np.maximum(n - 2, 1)
+    x_mean = (x * mask).sum(axis=1) / n
+    dx = (x - x_mean[:, None]) * mask
+    return LineFit(
+        slope=slope,
+        intercept=intercept,
+        x_mean=x_mean,
+        sxx=(dx * dx).sum(axis=1),
+        n=n,
+        dof=dof,
+        sigma=np.sqrt(sse / dof),
+        resid_std=resid_std,
+        r2=_r2(batch, sse),
+        fitted=fitted,
+    )
+
+
+def predict_line(fit: LineFit, x_new: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Mean and 90% prediction-interval half-width at x_new (S, P)."""
+    mean = fit.intercept[:, None] + fit.slope[:, None] * x_new
+    leverage = np.divide(
+        (x_new - fit.x_mean[:, None]) ** 2, fit.sxx[:, None],
+        out=np.zeros_like(x_new, dtype=np.float64), where=fit.sxx[:, None] > 0,
+    )
+    se = fit.sigma[:, None] * np.sqrt(1 + 1 / fit.n[:, None] + leverage)
+    return mean, stats.t.ppf(0.95, fit.dof)[:, None] * se
+
+
+def _damped_recursion(batch: SeriesBatch) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Run the damped-trend recursion for every series and grid point.
+
+    Returns (fitted, level, trend), each (S, G, L): the one-step forecast of
+    point t and the smoothing state after consuming point t. Padded points
+    carry the state forward unchanged.
+    """
+    y, mask = batch.y, batch.mask
+    alpha, beta_share, phi = _DAMPED_GRID
+    beta = alpha * beta_share
+    S, width = y.shape
+
+    # Time-major buffers so each step writes one contiguous (S, G) slab
+    level = np.empty((width, S, len(alpha)))
+    trend = np.empty((width, S, len(alpha)))
+    fitted = np.empty((width, S, len(alpha)))
+    level[0] = y[:, :1]
+    trend[0] = np.where(batch.n > 1, y[:, min(1, width - 1)] - y[:, 0], 0.0)[:, None]
+    fitted[0] = y[:, :1]
+    for t in range(1, width):
+        forecast = level[t - 1] + phi * trend[t - 1]
+        fitted[t] = forecast
+        err = y[:, t, None] - forecast
+        observed = mask[:, t, None]
+        level[t] = np.where(observed, forecast + alpha * err, level[t - 1])
+        trend[t] = np.where(observed, phi * trend[t - 1] + beta * err, trend[t - 1])
+    return fitted.transpose(1, 2, 0), level.transpose(1, 2, 0), trend.transpose(1, 2, 0)
+
+
+def _damped_sq_errors(batch: SeriesBatch, fitted: np.ndarray) -> np.ndarray:
+    return np.where(batch.mask[:, None, :], batch.y[:, None, :] - fitted, 0.0) ** 2
+
+
+def fit_damped_trend(batch: SeriesBatch) -> DampedFit:
+    """Additive damped-trend exponential smoothing, grid-searched per series."""
+    alpha, beta_share, phi = _DAMPED_GRID
+    beta = alpha * beta_share
+    fitted, level, trend = _damped_recursion(batch)
+
+    sse_grid = _damped_sq_errors(batch, fitted).sum(axis=2)
+    best = np.argmin(sse_grid, axis=1)
+    rows = np.arange(len(batch))
+    sse = sse_grid[rows, best]
+    return DampedFit(
+        alpha=alpha[best],
+        beta=beta[best],
+        phi=phi[best],
+        level=level[rows, best, -1],
+        trend=trend[rows, best, -1],
+        sigma=np.sqrt(sse / np.maximum(batch.n - 1, 1)),
+        r2=_r2(batch, sse),
+        fitted=fitted[rows, best],
+    )
+
+
+def _damped_one_step(batch: SeriesBatch, origins: np.ndarray) -> np.ndarray:
+    """
+    Damped-trend forecast of point t from a fit on the first t points, (S, T).
+
+    A prefix fit is the full recursion stopped at t - 1, with the grid point
+    chosen on the prefix SSE, so one recursion serves every origin.
+    """
+    phi = _DAMPED_GRID[2]
+    fitted, level, trend = _damped_recursion(batch)
+    prefix_sse = np.cumsum(_damped_sq_errors(batch, fitted), axis=2)[:, :, origins - 1]
+    best = np.argmin(prefix_sse, axis=1)[:, None, :]
+    last_level = np.take_along_axis(level[:, :, origins - 1], best, axis=1)[:, 0]
+    last_trend = np.take_along_axis(trend[:, :, origins - 1], best, axis=1)[:, 0]
+    best_phi = phi[best[:, 0]]
+    horizons = np.maximum(np.rint(batch.x[:, origins] - batch.x[:, origins - 1]), 1)
+    return last_level + best_phi * (1 - best_phi ** horizons) / (1 - best_phi) * last_trend
+
+
+def predict_damped_trend(fit: DampedFit, horizons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Mean and 90% half-width for integer horizons (S, P) steps past each series' last point."""
+    horizons = np.maximum(horizons.astype(np.int64), 1)
+    alpha, beta, phi = fit.alpha[:, None], fit.beta[:, None], fit.phi[:, None]
+    mean = fit.level[:, None] + phi * (1 - phi ** horizons) / (1 - phi) * fit.trend[:, None]
+    # Var(h) = sigma^2 * (1 + sum_{j<h} c_j^2), c_j = alpha + beta * phi * (1 - phi^j) / (1 - phi)
+    j = np.arange(1, int(horizons.max()))[None, :]
+    c_sq = (alpha + beta * phi * (1 - phi ** j) / (1 - phi)) ** 2
+    cum = np.concatenate([np.zeros((len(fit.alpha), 1)), np.cumsum(c_sq, axis=1)], axis=1)
+    cum_h = np.take_along_axis(cum, horizons - 1, axis=1)
+    return mean, _Z_90 * fit.sigma[:, None] * np.sqrt(1 + cum_h)
+
+
+def rolling_origin_mae(batch: SeriesBatch) -> np.ndarray:
+    """
+    One-step-ahead MAE of every closed-form model, shape (S, len(CLOSED_FORM_MODELS)).
+
+    For each origin t >= 2 the models are fitted on the first t points and
+    scored on point t. The line fits run on all (series, origin) pairs as one
+    expanded batch; the damped trend reuses a single recursion over the full
+    series. Series with fewer than 3 points get NaN.
+    """
+    S, width = batch.x.shape
+    if width < 3:
+        return np.full((S, len(CLOSED_FORM_MODELS)), np.nan)
+
+    origins = np.arange(2, width)
+    T = len(origins)
+    train_mask = batch.mask[:, None, :] & (np.arange(width)[None, None, :] < origins[None, :, None])
+    expanded = SeriesBatch(
+        x=np.repeat(batch.x, T, axis=0),
+        y=np.repeat(batch.y, T, axis=0),
+        mask=train_mask.reshape(S * T, width),
+    )
+    target_x = batch.x[:, origins].reshape(-1, 1)
+    target_y = batch.y[:, origins].reshape(-1)
+    scored = (batch.n[:, None] > origins[None, :]).reshape(-1)
+
+    ols_mean, _ = predict_line(fit_ols(expanded), target_x)
+    ts_mean, _ = predict_line(fit_theil_sen(expanded), target_x)
+    damped_mean = _damped_one_step(batch, origins).reshape(-1)
+
+    errors = np.abs(np.column_stack([ols_mean[:, 0], ts_mean[:, 0], damped_mean]) - target_y[:, None])
+    errors = np.where(scored[:, None], errors, 0.0).reshape(S, T, -1)
+    counts = scored.reshape(S, T).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return errors.sum(axis=1) / counts[:, None]
+
+
+def forecast_closed_form(batch: SeriesBatch, periods: int) -> ClosedFormForecast:
+    """Pick each series' best closed-form model by rolling-origin MAE and forecast `periods` years ahead."""
+    cv_mae = rolling_origin_mae(batch)
+    # Ties (and series too short to score) go to the first model, OLS
+    model_index = np.argmin(np.nan_to_num(cv_mae, nan=np.inf), axis=1)
+
+    steps = np.arange(1, periods + 1)
+    future_x = batch.last_x[:, None] + steps[None, :]
+    ols = fit_ols(batch)
+    theil_sen = fit_theil_sen(batch)
+    damped = fit_damped_trend(batch)
+    candidates = [
+        (*predict_line(ols, future_x), ols.r2),
+        (*predict_line(theil_sen, future_x), theil_sen.r2),
+        (*predict_damped_trend(damped, np.broadcast_to(steps, future_x.shape)), damped.r2),
+    ]
+    rows = np.arange(len(batch))
+    mean = np.stack([c[0] for c in candidates])[model_index, rows]
+    half_width = np.stack([c[1] for c in candidates])[model_index, rows]
+    r2 = np.stack([c[2] for c in candidates])[model_index, rows]
+    return ClosedFormForecast(
+        model_index=model_index,
+        future_x=future_x,
+        mean=mean,
+        half_width=half_width,
+        r2=r2,
+        cv_mae=cv_mae,
+        fits=(ols, theil_sen, damped),
+    )
+
+
+def fit_params(fit: LineFit | DampedFit, index: int) -> dict:
+    """Scalar parameters of one series' fit, enough to predict it again with predict_from_params."""
+    names = _LINE_PARAMS if isinstance(fit, LineFit) else _DAMPED_PARAMS
+    return {name: float(getattr(fit, name)[index]) for name in names}
+
+
+def predict_from_params(model: str, params: dict, last_x: float, future_x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Mean and 90% half-width at future_x (1-D) for a single exported closed-form fit."""
+    fit = SimpleNamespace(**{name: np.array([value]) for name, value in params.items()})
+    if model == "DampedTrend":
+        mean, half_width = predict_damped_trend(fit, np.rint(future_x - last_x)[None, :])
+    else:
+        mean, half_width = predict_line(fit, future_x[None, :].astype(np.float64))
+    return mean[0], half_width[0]
+
+
+def _r2(batch: SeriesBatch, sse: np.ndarray) -> np.ndarray:
+    n = batch.n
+    y_mean = (batch.y * batch.mask).sum(axis=1) / n
+    sst = (np.where(batch.mask, batch.y - y_mean[:, None], 0.0) ** 2).sum(axis=1)
+    perfect = np.isclose(sse, 0.0).astype(np.float64)
+    return np.where(sst > 0, 1 - sse / np.where(sst > 0, sst, 1.0), perfect)
@@ -1,26 +1,210 @@
 """
 Emission Forecast Service
-Uses scikit-learn/XGBoost for trend prediction with confidence intervals.
+Uses closed-form trend estimators for short histories and XGBoost for long ones,
+with confidence intervals. Closed-form fits run on the vectorized engine in
+services.forecast_engine, so many installations can be forecast in one pass.
+
+train_forecast_model / forecast_from_model split a forecast into a
+JSON-serializable fitted model and a cheap prediction step, so fitted models
+can be kept in the model store and reused until the data changes.
 """
 
+import base64
 import numpy as np
 from datetime import datetime
-from config import FORECAST_MIN_DATAPOINTS
-
-
-def forecast_emissions(emission_data: list[dict], periods: int = 12) -> dict:
+from config import (
+    FORECAST_MIN_DATAPOINTS,
+    FORECAST_XGBOOST_MIN_DATAPOINTS,
+    FORECAST_BOOTSTRAP_SAMPLES,
+    FORECAST_BOOTSTRAP_SEED,
+    FORECAST_MODEL_HORIZON,
+)
+from frames import EmissionFrame, YearlyAggregate, as_yearly
+from services.bootstrap_executor import run_bootstrap
+from services.forecast_engine import (
+    CLOSED_FORM_MODELS,
+    ClosedFormForecast,
+    fit_ols,
+    fit_params,
+    forecast_closed_form,
+    predict_from_params,
+    stack_series,
+)
+
+# Bump when the stored model layout changes so older entries are refit
+FORECAST_MODEL_VERSION = 1
+
+
+def forecast_emissions(
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+    periods: int = 12,
+    bootstrap_samples: int | None = None,
+    seed: int | None = None,
+) -> dict:
     """
     Forecast future emissions based on historical data.
 
     Args:
-        emission_data: List of emission records with reportingYear and totalCo2Emissions
+        emission_data: Emission frame, per-year aggregate or list of records with reportingYear and totalCo2Emissions
         periods: Number of future periods (months) to forecast
+        bootstrap_samples: Number of bootstrap refits for the XGBoost interval
+            (defaults to FORECAST_BOOTSTRAP_SAMPLES)
+        seed: Seed for deterministic bootstrap intervals (defaults to FORECAST_BOOTSTRAP_SEED)
 
     Returns:
         Dictionary with forecast data, trend info, and confidence intervals
     """
-    if not emission_data:
-        return {
+    years, emissions, early = _prepare_series(emission_data)
+    if early is not None:
+        return early
+
+    forecast_result = _select_and_forecast(years, emissions, periods, bootstrap_samples, seed)
+    return _success_result(years, emissions, forecast_result, _calculate_trend(years, emissions))
+
+
+def forecast_emissions_batch(
+    emission_data: dict[str, EmissionFrame | YearlyAggregate | list[dict]],
+    periods: int = 12,
+) -> tuple[dict[str, dict], list[str]]:
+    """
+    Forecast many installations, fitting every short history in one vectorized pass.
+
+    Args:
+        emission_data: Emission frame, per-year aggregate or list of records per installation id
+        periods: Number of future periods to forecast
+
+    Returns:
+        (results, pending): forecast_emissions-shaped results keyed by installation id,
+        and the ids whose histories are long enough for the per-series XGBoost path
+        (forecast those with forecast_emissions).
+    """
+    results: dict[str, dict] = {}
+    pending: list[str] = []
+    short: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    for installation_id, data in emission_data.items():
+        years, emissions, early = _prepare_series(data)
+        if early is not None:
+            results[installation_id] = early
+        elif len(years) < FORECAST_XGBOOST_MIN_DATAPOINTS:
+            short[installation_id] = (years, emissions)
+        else:
+            pending.append(installation_id)
+
+    if short:
+        batch = stack_series(list(short.values()))
+        slopes = fit_ols(batch).slope
+        forecasts = _closed_form_results(forecast_closed_form(batch, periods))
+        for (installation_id, (years, emissions)), forecast_result, slope in zip(short.items(), forecasts, slopes):
+            trend = _calculate_trend(years, emissions, slope)
+            results[installation_id] = _success_result(years, emissions, forecast_result, trend)
+
+    return results, pending
+
+
+def train_forecast_model(
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+    bootstrap_samples: int | None = None,
+    seed: int | None = None,
+    horizon: int = FORECAST_MODEL_HORIZON,
+) -> dict:
+    """
+    Fit the forecast model for an installation without producing a forecast.
+
+    Args:
+        emission_data: Emission frame, per-year aggregate or list of records with reportingYear and totalCo2Emissions
+        bootstrap_samples: Number of bootstrap refits for the XGBoost interval
+        seed: Seed for deterministic bootstrap intervals
+        horizon: Furthest period the stored bootstrap quantiles cover
+
+    Returns:
+        JSON-serializable model: the chosen estimator's parameters (XGBoost booster
+        bytes and bootstrap quantiles, or line / damped-trend coefficients) plus the
+        response fields that do not depend on the forecast horizon.
+    """
+    years, emissions, early = _prepare_series(emission_data)
+    if early is not None:
+        return {"version": FORECAST_MODEL_VERSION, "horizon": None, "result": early}
+
+    forecast_result = _select_and_forecast(years, emissions, horizon, bootstrap_samples, seed)
+    forecast_result = {**forecast_result, "predictions": []}
+    return {
+        "version": FORECAST_MODEL_VERSION,
+        "horizon": horizon,
+        "last_year": int(years[-1]),
+        "model": forecast_result["model"],
+        "params": forecast_result["params"],
+        "result": _success_result(years, emissions, forecast_result, _calculate_trend(years, emissions)),
+    }
+
+
+def forecast_from_model(model: dict, periods: int = 12) -> dict:
+    """
+    Forecast from a model built by train_forecast_model.
+
+    Returns the same dictionary forecast_emissions would for the data the model
+    was trained on. Raises ValueError if `periods` exceeds the model horizon.
+    """
+    result = dict(model["result"])
+    if result["status"] != "success":
+        return result
+    if periods > model["horizon"]:
+        raise ValueError(f"Model covers {model['horizon']} periods, {periods} requested")
+    result["forecast"] = _predict_from_model(model["model"], model["params"], model["last_year"], periods)
+    return result
+
+
+def _predict_from_model(model_name: str, params: dict, last_year: int, periods: int) -> list[dict]:
+    future_years = np.arange(last_year + 1, last_year + 1 + periods)
+
+    if model_name == "XGBoost":
+        from xgboost import Booster
+
+        booster = Booster()
+        booster.load_model(bytearray(base64.b64decode(params["booster"])))
+        predictions = booster.inplace_predict(future_years.reshape(-1, 1))
+        return _bounded_predictions(future_years, predictions, params["lower"][:periods], params["upper"][:periods])
+
+    if model_name == "LinearRegression":
+        predictions = params["intercept"] + params["slope"] * future_years
+        return _linear_predictions(future_years, predictions, params["resid_std"])
+
+    mean, half_width = predict_from_params(model_name, params, last_year, future_years)
+    return _bounded_predictions(future_years, mean, mean - half_width, mean + half_width)
+
+
+def _bounded_predictions(future_years: np.ndarray, predicted, lower, upper) -> list[dict]:
+    """Prediction rows with every value clipped at zero."""
+    return [
+        {
+            "year": int(future_years[i]),
+            "predicted": float(max(0, predicted[i])),
+            "lower_bound": float(max(0, lower[i])),
+            "upper_bound": float(max(0, upper[i])),
+        }
+        for i in range(len(future_years))
+    ]
+
+
+def _linear_predictions(future_years: np.ndarray, predictions: np.ndarray, residual_std: float) -> list[dict]:
+    return [
+        {
+            "year": int(future_years[i]),
+            "predicted": float(max(0, predictions[i])),
+            "lower_bound": float(max(0, predictions[i] - 1.645 * residual_std)),
+            "upper_bound": float(predictions[i] + 1.645 * residual_std),
+        }
+        for i in range(len(predictions))
+    ]
+
+
+def _prepare_series(
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+) -> tuple[np.ndarray, np.ndarray, dict | None]:
+    """Yearly series to forecast, or the no_data / insufficient_data response."""
+    yearly = as_yearly(emission_data)
+    if not yearly.records:
+        return None, None, {
             "status": "no_data",
             "message": "Tahmin icin yeterli veri bulunamadi",
             "forecast": [],
@@ -29,59 +213,70 @@ def forecast_emissions(emission_data: list[dict], periods: int = 12) -> dict:
         }
 
     # Aggregate emissions by year
-    yearly_data = _aggregate_by_year(emission_data)
+    years, emissions = yearly.forecast_series()
 
-    if len(yearly_data) < FORECAST_MIN_DATAPOINTS:
-        return {
+    if len(years) < FORECAST_MIN_DATAPOINTS:
+        return years, emissions, {
             "status": "insufficient_data",
-            "message": f"En az {FORECAST_MIN_DATAPOINTS} yillik veri gerekli (mevcut: {len(yearly_data)})",
+            "message": f"En az {FORECAST_MIN_DATAPOINTS} yillik veri gerekli (mevcut: {len(years)})",
             "forecast": [],
-            "historical": [{"year": y, "emissions": e} for y, e in yearly_data],
+            "historical": [{"year": int(y), "emissions": float(e)} for y, e in zip(years, emissions)],
             "trend": None,
             "confidence": None,
         }
+    return years, emissions, None
 
-    years = np.array([y for y, _ in yearly_data])
-    emissions = np.array([e for _, e in yearly_data])
-
-    # Try XGBoost first, fallback to linear regression
-    try:
-        forecast_result = _xgboost_forecast(years, emissions, periods)
-    except Exception:
-        forecast_result = _linear_forecast(years, emissions, periods)
-
-    # Calculate trend
-    trend = _calculate_trend(years, emissions)
 
+def _success_result(years: np.ndarray, emissions: np.ndarray, forecast_result: dict, trend: dict) -> dict:
     return {
         "status": "success",
         "message": "Tahmin basariyla olusturuldu",
-        "historical": [{"year": int(y), "emissions": float(e)} for y, e in yearly_data],
+        "historical": [{"year": int(y), "emissions": float(e)} for y, e in zip(years, emissions)],
         "forecast": forecast_result["predictions"],
         "trend": trend,
         "confidence": forecast_result["confidence"],
         "model": forecast_result["model"],
         "r2_score": forecast_result.get("r2_score"),
+        "bootstrap": forecast_result.get("bootstrap"),
     }
 
 
-def _aggregate_by_year(data: list[dict]) -> list[tuple]:
+def _aggregate_by_year(data: EmissionFrame | YearlyAggregate | list[dict]) -> list[tuple]:
     """Aggregate emissions by reporting year."""
-    year_totals: dict[int, float] = {}
-    for row in data:
-        year = row.get("reportingYear")
-        total = row.get("totalCo2Emissions") or row.get("directEmissions") or 0
-        if year and total:
-            try:
-                year_val = int(year)
-                total_val = float(total)
-                year_totals[year_val] = year_totals.get(year_val, 0) + total_val
-            except (ValueError, TypeError):
-                continue
-    return sorted(year_totals.items())
-
-
-def _xgboost_forecast(years: np.ndarray, emissions: np.ndarray, periods: int) -> dict:
+    years, totals = as_yearly(data).forecast_series()
+    return [(int(y), float(t)) for y, t in zip(years, totals)]
+
+
+def _select_and_forecast(
+    years: np.ndarray,
+    emissions: np.ndarray,
+    periods: int,
+    bootstrap_samples: int | None = None,
+    seed: int | None = None,
+) -> dict:
+    """
+    Model-selection stage.
+
+    Boosted trees cannot extrapolate a trend from a handful of points, so
+    histories shorter than FORECAST_XGBOOST_MIN_DATAPOINTS use the best
+    closed-form estimator. Longer histories use XGBoost, falling back to
+    linear regression if it fails.
+    """
+    if len(years) < FORECAST_XGBOOST_MIN_DATAPOINTS:
+        return _closed_form_forecast(years, emissions, periods)
+    try:
+        return _xgboost_forecast(years, emissions, periods, bootstrap_samples, seed)
+    except Exception:
+        return _linear_forecast(years, emissions, periods)
+
+
+def _xgboost_forecast(
+    years: np.ndarray,
+    emissions: np.ndarray,
+    periods: int,
+    n_bootstrap: int | None = None,
+    seed: int | None = None,
+) -> dict:
     """XGBoost-based forecast with confidence via bootstrapping."""
     from xgboost import XGBRegressor
 
@@ -101,17 +296,14 @@ def _xgboost_forecast(years: np.ndarray, emissions: np.ndarray, periods: int) ->
     future_years = np.arange(last_year + 1, last_year + 1 + periods).reshape(-1, 1)
     predictions = model.predict(future_years)
 
-    # Bootstrap confidence intervals
-    n_bootstrap = 50
-    bootstrap_preds = []
-    for _ in range(n_bootstrap):
-        indices = np.random.choice(len(X), size=len(X), replace=True)
-        X_boot, y_boot = X[indices], y[indices]
-        boot_model = XGBRegressor(n_estimators=50, max_depth=3, learning_rate=0.1, random_state=None)
-        boot_model.fit(X_boot, y_boot)
-        bootstrap_preds.append(boot_model.predict(future_years))
-
-    bootstrap_preds = np.array(bootstrap_preds)
+    # Bootstrap confidence intervals (refits spread across the shared process pool)
+    bootstrap_preds, bootstrap_stats = run_bootstrap(
+        X,
+        y,
+        future_years,
+        n_bootstrap or FORECAST_BOOTSTRAP_SAMPLES,
+        seed if seed is not None else FORECAST_BOOTSTRAP_SEED,
+    )
     lower = np.percentile(bootstrap_preds, 5, axis=0)
     upper = np.percentile(bootstrap_preds, 95, axis=0)
 
@@ -122,62 +314,84 @@ def _xgboost_forecast(years: np.ndarray, emissions: np.ndarray, periods: int) ->
 
     return {
         "model": "XGBoost",
-        "predictions": [
-            {
-                "year": int(future_years[i][0]),
-                "predicted": float(max(0, predictions[i])),
-                "lower_bound": float(max(0, lower[i])),
-                "upper_bound": float(max(0, upper[i])),
-            }
-            for i in range(len(predictions))
-        ],
+        "predictions": _bounded_predictions(future_years[:, 0], predictions, lower, upper),
         "confidence": {"level": 0.90, "method": "bootstrap"},
         "r2_score": float(r2),
+        "bootstrap": bootstrap_stats,
+        "params": {
+            "booster": base64.b64encode(bytes(model.get_booster().save_raw(raw_format="ubj"))).decode("ascii"),
+            "lower": lower.tolist(),
+            "upper": upper.tolist(),
+        },
     }
 
 
 def _linear_forecast(years: np.ndarray, emissions: np.ndarray, periods: int) -> dict:
     """Simple linear regression fallback."""
-    from sklearn.linear_model import LinearRegression
-    from sklearn.metrics import r2_score
-
-    X = years.reshape(-1, 1)
-    model = LinearRegression()
-    model.fit(X, emissions)
+    fit = fit_ols(stack_series([(years, emissions)]))
 
     last_year = int(years[-1])
-    future_years = np.arange(last_year + 1, last_year + 1 + periods).reshape(-1, 1)
-    predictions = model.predict(future_years)
+    future_years = np.arange(last_year + 1, last_year + 1 + periods)
+    predictions = fit.intercept[0] + fit.slope[0] * future_years
 
     # Simple confidence based on residual std
-    train_pred = model.predict(X)
-    residual_std = np.std(emissions - train_pred)
-    r2 = r2_score(emissions, train_pred)
+    residual_std = fit.resid_std[0]
 
     return {
         "model": "LinearRegression",
-        "predictions": [
-            {
-                "year": int(future_years[i][0]),
-                "predicted": float(max(0, predictions[i])),
-                "lower_bound": float(max(0, predictions[i] - 1.645 * residual_std)),
-                "upper_bound": float(predictions[i] + 1.645 * residual_std),
-            }
-            for i in range(len(predictions))
-        ],
+        "predictions": _linear_predictions(future_years, predictions, residual_std),
         "confidence": {"level": 0.90, "method": "residual_std"},
-        "r2_score": float(r2),
+        "r2_score": float(fit.r2[0]),
+        "params": {
+            "slope": float(fit.slope[0]),
+            "intercept": float(fit.intercept[0]),
+            "resid_std": float(residual_std),
+        },
     }
 
 
-def _calculate_trend(years: np.ndarray, emissions: np.ndarray) -> dict:
-    """Calculate emission trend statistics."""
+def _closed_form_forecast(years: np.ndarray, emissions: np.ndarray, periods: int) -> dict:
+    """Pick the closed-form estimator with the lowest rolling-origin one-step error and forecast with it."""
+    return _closed_form_results(forecast_closed_form(stack_series([(years, emissions)]), periods))[0]
+
+
+def _closed_form_results(result: ClosedFormForecast) -> list[dict]:
+    """Format a batched closed-form forecast as one forecast_result dict per series."""
+    lower = np.maximum(result.mean - result.half_width, 0.0).tolist()
+    upper = np.maximum(result.mean + result.half_width, 0.0).tolist()
+    predicted = np.maximum(result.mean, 0.0).tolist()
+    future_years = result.future_x.astype(np.int64).tolist()
+    cv_mae = np.round(result.cv_mae, 4).tolist()
+
+    return [
+        {
+            "model": CLOSED_FORM_MODELS[result.model_index[s]],
+            "predictions": [
+                {
+                    "year": future_years[s][i],
+                    "predicted": predicted[s][i],
+                    "lower_bound": lower[s][i],
+                    "upper_bound": upper[s][i],
+                }
+                for i in range(len(future_years[s]))
+            ],
+            "confidence": {"level": 0.90, "method": "analytic"},
+            "r2_score": float(result.r2[s]),
+            "cv_mae": dict(zip(CLOSED_FORM_MODELS, cv_mae[s])),
+            "params": fit_params(result.fits[result.model_index[s]], s),
+        }
+        for s in range(len(future_years))
+    ]
+
+
+def _calculate_trend(years: np.ndarray, emissions: np.ndarray, slope: float | None = None) -> dict:
+    """Calculate emission trend statistics (pass `slope` when the OLS fit is already known)."""
     if len(emissions) < 2:
         return {"direction": "unknown", "change_pct": 0, "avg_annual_change": 0}
 
     # Linear trend slope
-    coeffs = np.polyfit(years, emissions, 1)
-    slope = coeffs[0]
+    if slope is None:
+        slope = fit_ols(stack_series([(years, emissions)])).slope[0]
 
     # Percentage change
     first_val = emissions[0]
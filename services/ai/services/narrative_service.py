@@ -1,20 +1,37 @@
 """
 Smart Report Narrative Service
 Uses LangChain + Claude/GPT-4 for natural language analysis reports.
-Falls back to template-based generation when no LLM API key is configured.
+Falls back to template-based generation when no LLM API key is configured
+or the providers are failing (see llm_client). LLM completions are cached
+under a hash of the model and the exact prompt (narrative_cache).
 """
 
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+
+import numpy as np
 import structlog
 
-from config import ANTHROPIC_API_KEY, OPENAI_API_KEY, NARRATIVE_MAX_TOKENS
+from config import ANTHROPIC_API_KEY, OPENAI_API_KEY
+from cache import narrative_cache, prompt_key
+from llm_client import llm_clients, CircuitOpenError, LLM_MODELS
+from services.narrative_templates import get_template
+from frames import EmissionFrame, BalanceFrame, YearlyAggregate, as_yearly, as_balance_frame
 
 logger = structlog.get_logger(service="ecosfer-ai", module="narrative")
 
+# Template fallback message by the reason no LLM narrative was produced
+_TEMPLATE_MESSAGES = {
+    "no_api_key": "Rapor sablon tabanli olusturuldu (AI API anahtari yapilandirilmamis)",
+    "llm_budget": "Rapor sablon tabanli olusturuldu (AI cagri butcesi tukendi)",
+    "llm_unavailable": "Rapor sablon tabanli olusturuldu (AI servisi su anda kullanilamiyor)",
+}
+
 
-def generate_narrative(
+async def agenerate_narrative(
     installation_info: dict | None,
-    emission_data: list[dict],
-    balance_data: list[dict],
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+    balance_data: BalanceFrame | list[dict],
     report_type: str = "summary",
     language: str = "tr",
 ) -> dict:
@@ -23,8 +40,8 @@ def generate_narrative(
 
     Args:
         installation_info: Installation metadata
-        emission_data: Historical emission records
-        balance_data: GHG balance records
+        emission_data: Historical emission frame, per-year aggregate (or list of records)
+        balance_data: GHG balance frame (or list of records)
         report_type: Type of report (summary, detailed, executive)
         language: Output language (tr, en, de)
 
@@ -33,7 +50,39 @@ def generate_narrative(
     """
     # Prepare context data
     context = _prepare_context(installation_info, emission_data, balance_data)
+    return await _narrate(context, report_type, language)
+
+
+async def agenerate_narratives(
+    installation_info: dict | None,
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+    balance_data: BalanceFrame | list[dict],
+    report_type: str = "summary",
+    languages: list[str] = ("tr",),
+    acquire_llm: Callable[[], Awaitable[bool]] | None = None,
+) -> list[dict]:
+    """
+    Generate the same report in several languages.
+
+    The context is prepared once and the per-language generations run
+    concurrently, so the wall time is about one LLM round-trip. Returns one
+    agenerate_narrative result per language, in the given order.
+
+    acquire_llm, when given, is awaited before every LLM call (not before
+    cache hits); returning False skips the LLM and uses the template.
+    """
+    context = _prepare_context(installation_info, emission_data, balance_data)
+    return list(await asyncio.gather(*(
+        _narrate(context, report_type, language, acquire_llm) for language in languages
+    )))
 
+
+async def _narrate(
+    context: dict,
+    report_type: str,
+    language: str,
+    acquire_llm: Callable[[], Awaitable[bool]] | None = None,
+) -> dict:
     if not context["has_data"]:
         return {
             "status": "no_data",
@@ -43,40 +92,49 @@ def generate_narrative(
             "report_type": report_type,
         }
 
-    # Try LLM-based generation first
-    if ANTHROPIC_API_KEY:
-        try:
-            narrative = _generate_with_anthropic(context, report_type, language)
-            return {
-                "status": "success",
-                "message": "Rapor AI ile olusturuldu",
-                "narrative": narrative,
-                "language": language,
-                "report_type": report_type,
-                "model": "claude",
-            }
-        except Exception as e:
-            logger.warning("anthropic_api_error", error=str(e))
-
-    if OPENAI_API_KEY:
-        try:
-            narrative = _generate_with_openai(context, report_type, language)
-            return {
-                "status": "success",
-                "message": "Rapor AI ile olusturuldu",
-                "narrative": narrative,
-                "language": language,
-                "report_type": report_type,
-                "model": "gpt-4",
-            }
-        except Exception as e:
-            logger.warning("openai_api_error", error=str(e))
+    # Try LLM-based generation first, Claude then GPT-4
+    system_prompt = _get_system_prompt(language)
+    user_prompt = _get_user_prompt(context, report_type, language)
+    fallback_reason = "no_api_key"
+    for model, api_key, error_event in (
+        ("claude", ANTHROPIC_API_KEY, "anthropic_api_error"),
+        ("gpt-4", OPENAI_API_KEY, "openai_api_error"),
+    ):
+        if not api_key:
+            continue
+        key = prompt_key(LLM_MODELS[model], system_prompt, user_prompt)
+        narrative = await narrative_cache.get(key)
+        cached = narrative is not None
+        if not cached:
+            if acquire_llm is not None and not await acquire_llm():
+                fallback_reason = "llm_budget"
+                continue
+            try:
+                narrative = await llm_clients.ainvoke(model, system_prompt, user_prompt)
+            except CircuitOpenError:
+                logger.info("llm_circuit_open_skipped", model=model)
+                fallback_reason = "llm_unavailable"
+                continue
+            except Exception as e:
+                logger.warning(error_event, error=str(e) or type(e).__name__)
+                fallback_reason = "llm_unavailable"
+                continue
+            await narrative_cache.set(key, narrative)
+        return {
+            "status": "success",
+            "message": "Rapor AI ile olusturuldu",
+            "narrative": narrative,
+            "language": language,
+            "report_type": report_type,
+            "model": model,
+            "cached": cached,
+        }
 
     # Fallback: template-based generation
     narrative = _generate_template(context, report_type, language)
     return {
         "status": "success",
-        "message": "Rapor sablon tabanli olusturuldu (AI API anahtari yapilandirilmamis)",
+        "message": _TEMPLATE_MESSAGES[fallback_reason],
         "narrative": narrative,
         "language": language,
         "report_type": report_type,
@@ -84,45 +142,114 @@ def generate_narrative(
     }
 
 
+async def astream_narrative(
+    installation_info: dict | None,
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+    balance_data: BalanceFrame | list[dict],
+    report_type: str = "summary",
+    language: str = "tr",
+) -> AsyncIterator[dict]:
+    """
+    Generate a narrative incrementally.
+
+    Yields {"type": "text", "text": ...} events as the LLM produces tokens (the
+    template fallback yields one event per section), then one {"type": "done"}
+    event with the agenerate_narrative metadata (status, message, language,
+    report_type, model). The text events concatenate to the full narrative.
+
+    A provider that fails before its first token is skipped like in
+    agenerate_narrative; a failure after text was sent ends the stream with
+    status "error".
+    """
+    context = _prepare_context(installation_info, emission_data, balance_data)
+    meta = {"language": language, "report_type": report_type}
+
+    if not context["has_data"]:
+        yield {"type": "done", "status": "no_data", "message": "Rapor icin veri bulunamadi", **meta}
+        return
+
+    system_prompt = _get_system_prompt(language)
+    user_prompt = _get_user_prompt(context, report_type, language)
+    fallback_reason = "no_api_key"
+    for model, api_key, error_event in (
+        ("claude", ANTHROPIC_API_KEY, "anthropic_api_error"),
+        ("gpt-4", OPENAI_API_KEY, "openai_api_error"),
+    ):
+        if not api_key:
+            continue
+        key = prompt_key(LLM_MODELS[model], system_prompt, user_prompt)
+        narrative = await narrative_cache.get(key)
+        if narrative is not None:
+            yield {"type": "text", "text": narrative}
+            yield {"type": "done", "status": "success", "message": "Rapor AI ile olusturuldu", "model": model, "cached": True, **meta}
+            return
+        parts = []
+        try:
+            async for text in llm_clients.astream(model, system_prompt, user_prompt):
+                parts.append(text)
+                yield {"type": "text", "text": text}
+        except CircuitOpenError:
+            logger.info("llm_circuit_open_skipped", model=model)
+            fallback_reason = "llm_unavailable"
+            continue
+        except Exception as e:
+            logger.warning(error_event, error=str(e) or type(e).__name__, streamed=bool(parts))
+            if not parts:
+                fallback_reason = "llm_unavailable"
+                continue
+            yield {"type": "done", "status": "error", "message": "Rapor olusturma yarida kesildi", "model": model, **meta}
+            return
+        await narrative_cache.set(key, "".join(parts))
+        yield {"type": "done", "status": "success", "message": "Rapor AI ile olusturuldu", "model": model, "cached": False, **meta}
+        return
+
+    for section in _template_sections(context, report_type, language):
+        yield {"type": "text", "text": section}
+    yield {
+        "type": "done",
+        "status": "success",
+        "message": _TEMPLATE_MESSAGES[fallback_reason],
+        "model": "template",
+        **meta,
+    }
+
+
 def _prepare_context(
     installation_info: dict | None,
-    emission_data: list[dict],
-    balance_data: list[dict],
+    emission_data: EmissionFrame | YearlyAggregate | list[dict],
+    balance_data: BalanceFrame | list[dict],
 ) -> dict:
     """Prepare structured context for narrative generation."""
+    agg = as_yearly(emission_data)
+    balances = as_balance_frame(balance_data)
     context: dict = {
-        "has_data": bool(emission_data or balance_data),
+        "has_data": bool(agg.records or len(balances)),
         "installation": installation_info or {},
     }
 
-    # Aggregate emissions by year
-    yearly: dict[int, dict] = {}
-    for row in emission_data:
-        year = row.get("reportingYear")
-        if not year:
-            continue
-        year = int(year)
-        if year not in yearly:
-            yearly[year] = {"direct": 0, "indirect": 0, "total": 0, "count": 0}
-        yearly[year]["direct"] += float(row.get("directEmissions") or 0)
-        yearly[year]["indirect"] += float(row.get("indirectEmissions") or 0)
-        yearly[year]["total"] += float(row.get("totalCo2Emissions") or 0)
-        yearly[year]["count"] += 1
-
-    context["yearly_emissions"] = dict(sorted(yearly.items()))
-    context["years"] = sorted(yearly.keys())
-    context["total_records"] = len(emission_data)
+    # Emissions by year
+    yearly: dict[int, dict] = {
+        year: {"direct": direct, "indirect": indirect, "total": total, "count": count}
+        for year, direct, indirect, total, count in zip(
+            agg.years.tolist(), agg.direct.tolist(), agg.indirect.tolist(), agg.total.tolist(), agg.count.tolist()
+        )
+    }
+
+    context["yearly_emissions"] = yearly
+    context["years"] = list(yearly)
+    context["total_records"] = agg.records
 
     # Balance summary
-    balance_summary = []
-    for row in balance_data:
-        balance_summary.append({
-            "year": row.get("reportingYear"),
-            "direct": float(row.get("directEmissions") or 0),
-            "indirect": float(row.get("indirectEmissions") or 0),
-            "total": float(row.get("totalEmissions") or 0),
-        })
-    context["balance_summary"] = balance_summary
+    balance_years = [int(y) if y else None for y in balances.year.tolist()]
+    context["balance_summary"] = [
+        {"year": year, "direct": direct, "indirect": indirect, "total": total}
+        for year, direct, indirect, total in zip(
+            balance_years,
+            np.nan_to_num(balances.direct).tolist(),
+            np.nan_to_num(balances.indirect).tolist(),
+            np.nan_to_num(balances.total).tolist(),
+        )
+    ]
 
     # Trend calculation
     if len(context["years"]) >= 2:
@@ -146,50 +273,6 @@ def _prepare_context(
     return context
 
 
-def _generate_with_anthropic(context: dict, report_type: str, language: str) -> str:
-    """Generate narrative using Claude via LangChain."""
-    from langchain_anthropic import ChatAnthropic
-    from langchain_core.messages import SystemMessage, HumanMessage
-
-    llm = ChatAnthropic(
-        model="claude-sonnet-4-5-20250929",
-        api_key=ANTHROPIC_API_KEY,
-        max_tokens=NARRATIVE_MAX_TOKENS,
-    )
-
-    system_prompt = _get_system_prompt(language)
-    user_prompt = _get_user_prompt(context, report_type, language)
-
-    response = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=user_prompt),
-    ])
-
-    return response.content
-
-
-def _generate_with_openai(context: dict, report_type: str, language: str) -> str:
-    """Generate narrative using GPT-4 via LangChain."""
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import SystemMessage, HumanMessage
-
-    llm = ChatOpenAI(
-        model="gpt-4o",
-        api_key=OPENAI_API_KEY,
-        max_tokens=NARRATIVE_MAX_TOKENS,
-    )
-
-    system_prompt = _get_system_prompt(language)
-    user_prompt = _get_user_prompt(context, report_type, language)
-
-    response = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=user_prompt),
-    ])
-
-    return response.content
-
-
 def _get_system_prompt(language: str) -> str:
     prompts = {
         "tr": """Sen bir CBAM (Sinirda Karbon Duzenleme Mekanizmasi) emisyon analiz uzmanisin.
@@ -264,147 +347,9 @@ def _get_user_prompt(context: dict, report_type: str, language: str) -> str:
 
 def _generate_template(context: dict, report_type: str, language: str) -> str:
     """Template-based narrative generation (no LLM required)."""
-    inst = context.get("installation", {})
-    name = inst.get("installation_name", "Bilinmeyen Tesis")
-    company = inst.get("company_name", "")
-    yearly = context.get("yearly_emissions", {})
-    trend = context.get("trend")
-    years = context.get("years", [])
-
-    if language == "tr":
-        return _template_tr(name, company, yearly, trend, years, report_type)
-    elif language == "de":
-        return _template_de(name, company, yearly, trend, years, report_type)
-    return _template_en(name, company, yearly, trend, years, report_type)
-
-
-def _template_tr(name, company, yearly, trend, years, report_type) -> str:
-    sections = []
-    header = f"# {name} - Emisyon Analiz Raporu"
-    if company:
-        header += f"\n**Sirket:** {company}"
-    sections.append(header)
-
-    # General assessment
-    sections.append("\n## 1. Genel Degerlendirme")
-    if yearly:
-        total_all = sum(d["total"] for d in yearly.values())
-        sections.append(
-            f"{name} tesisi icin {len(years)} yillik emisyon verisi analiz edilmistir. "
-            f"Toplam kumulatif emisyon **{total_all:.2f} tCO2e** olarak hesaplanmistir."
-        )
-    else:
-        sections.append("Analiz icin yeterli veri bulunmamaktadir.")
-
-    # Trends
-    sections.append("\n## 2. Emisyon Trendleri")
-    if trend:
-        direction_tr = {"increasing": "artis", "decreasing": "azalis", "stable": "sabit"}.get(trend["direction"], "belirsiz")
-        sections.append(
-            f"Emisyon trendi **{direction_tr}** yonundedir. "
-            f"Incelenen donemde **%{trend['change_pct']}** oraninda degisim gozlemlenmistir."
-        )
-    if yearly:
-        sections.append("\n| Yil | Dogrudan (tCO2e) | Dolayli (tCO2e) | Toplam (tCO2e) |")
-        sections.append("|-----|------------------|-----------------|----------------|")
-        for year, data in yearly.items():
-            sections.append(f"| {year} | {data['direct']:.4f} | {data['indirect']:.4f} | {data['total']:.4f} |")
-
-    # Findings
-    sections.append("\n## 3. Onemli Bulgular")
-    findings = []
-    if len(years) >= 2 and yearly:
-        last = yearly[years[-1]]
-        prev = yearly[years[-2]]
-        if prev["total"] > 0:
-            yoy_change = (last["total"] - prev["total"]) / prev["total"] * 100
-            findings.append(f"- Son yilda emisyonlar **%{yoy_change:.1f}** oraninda degismistir ({years[-2]} -> {years[-1]}).")
-        if last["indirect"] > last["direct"]:
-            findings.append("- Dolayli emisyonlar dogrudan emisyonlardan yuksektir. Enerji verimliligi iyilestirmeleri oncelikli olmalidir.")
-        else:
-            findings.append("- Dogrudan emisyonlar baskindir. Proses optimizasyonu ve yakit degisikligi degerlendirilmelidir.")
-    if not findings:
-        findings.append("- Detayli bulgu icin daha fazla veri gerekmektedir.")
-    sections.append("\n".join(findings))
-
-    # Recommendations
-    sections.append("\n## 4. Oneriler")
-    sections.append(
-        "- Emisyon izleme suresinin artirilmasi ve veri kalitesinin iyilestirilmesi onerilir.\n"
-        "- CBAM beyanname sureci icin AB varsayilan deger tablolari ile karsilastirma yapilmalidir.\n"
-        "- Yuksek emisyonlu kaynak akimlari icin alternatif uretim yontemleri degerlendirilmelidir."
-    )
-
-    sections.append(f"\n---\n*Bu rapor Ecosfer SKDM Platform v2.0 tarafindan otomatik olusturulmustur.*")
-    return "\n".join(sections)
-
-
-def _template_en(name, company, yearly, trend, years, report_type) -> str:
-    sections = []
-    header = f"# {name} - Emission Analysis Report"
-    if company:
-        header += f"\n**Company:** {company}"
-    sections.append(header)
-
-    sections.append("\n## 1. General Assessment")
-    if yearly:
-        total_all = sum(d["total"] for d in yearly.values())
-        sections.append(
-            f"Emission data for {len(years)} year(s) has been analyzed for installation {name}. "
-            f"Total cumulative emissions: **{total_all:.2f} tCO2e**."
-        )
-
-    sections.append("\n## 2. Emission Trends")
-    if trend:
-        sections.append(f"The emission trend is **{trend['direction']}** with a **{trend['change_pct']}%** change.")
-    if yearly:
-        sections.append("\n| Year | Direct (tCO2e) | Indirect (tCO2e) | Total (tCO2e) |")
-        sections.append("|------|----------------|------------------|---------------|")
-        for year, data in yearly.items():
-            sections.append(f"| {year} | {data['direct']:.4f} | {data['indirect']:.4f} | {data['total']:.4f} |")
-
-    sections.append("\n## 3. Key Findings")
-    sections.append("- Detailed analysis requires additional data points for meaningful insights.")
-
-    sections.append("\n## 4. Recommendations")
-    sections.append(
-        "- Increase monitoring frequency and improve data quality.\n"
-        "- Compare with EU default value tables for CBAM declaration.\n"
-        "- Evaluate alternative production methods for high-emission source streams."
-    )
-
-    sections.append(f"\n---\n*This report was automatically generated by Ecosfer SKDM Platform v2.0.*")
-    return "\n".join(sections)
-
-
-def _template_de(name, company, yearly, trend, years, report_type) -> str:
-    sections = []
-    header = f"# {name} - Emissionsanalysebericht"
-    if company:
-        header += f"\n**Unternehmen:** {company}"
-    sections.append(header)
-
-    sections.append("\n## 1. Allgemeine Bewertung")
-    if yearly:
-        total_all = sum(d["total"] for d in yearly.values())
-        sections.append(
-            f"Emissionsdaten fur {len(years)} Jahr(e) wurden fur die Anlage {name} analysiert. "
-            f"Gesamtemissionen: **{total_all:.2f} tCO2e**."
-        )
-
-    sections.append("\n## 2. Emissionstrends")
-    if trend:
-        dir_de = {"increasing": "steigend", "decreasing": "sinkend", "stable": "stabil"}.get(trend["direction"], "unbekannt")
-        sections.append(f"Der Emissionstrend ist **{dir_de}** mit einer Veranderung von **{trend['change_pct']}%**.")
-
-    sections.append("\n## 3. Wichtige Erkenntnisse")
-    sections.append("- Fur detaillierte Erkenntnisse sind zusatzliche Datenpunkte erforderlich.")
+    return get_template(language).render(context)
 
-    sections.append("\n## 4. Empfehlungen")
-    sections.append(
-        "- Uberwachungshaufigkeit erhohen und Datenqualitat verbessern.\n"
-        "- Mit EU-Standardwerttabellen fur CBAM-Erklarung vergleichen."
-    )
 
-    sections.append(f"\n---\n*Dieser Bericht wurde automatisch von Ecosfer SKDM Platform v2.0 erstellt.*")
-    return "\n".join(sections)
+def _template_sections(context: dict, report_type: str, language: str) -> list[str]:
+    """The template narrative by section; the pieces join back to the full text."""
+    return get_template(language).render_sections(context)
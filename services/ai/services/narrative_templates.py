@@ -0,0 +1,164 @@
+"""
+Narrative Templates
+Template narratives (the no-LLM fallback and bulk PDF text).
+
+Each language is a string table; NarrativeTemplate lays the strings out as a
+report and fills in the installation values. The yearly emission table is
+rendered with one % over a row format built once per table length.
+render_sections returns the report split before each "## " section; the
+pieces concatenate to the full narrative.
+"""
+
+# Per-language string tables. A language without a key omits that part of the report.
+_STRINGS: dict[str, dict] = {
+    "tr": {
+        "title": "# {name} - Emisyon Analiz Raporu",
+        "company": "\n**Sirket:** {company}",
+        "headings": ("1. Genel Degerlendirme", "2. Emisyon Trendleri", "3. Onemli Bulgular", "4. Oneriler"),
+        "assessment": (
+            "{name} tesisi icin {years} yillik emisyon verisi analiz edilmistir. "
+            "Toplam kumulatif emisyon **{total:.2f} tCO2e** olarak hesaplanmistir."
+        ),
+        "assessment_no_data": "Analiz icin yeterli veri bulunmamaktadir.",
+        "trend": (
+            "Emisyon trendi **{direction}** yonundedir. "
+            "Incelenen donemde **%{change_pct}** oraninda degisim gozlemlenmistir."
+        ),
+        "directions": {"increasing": "artis", "decreasing": "azalis", "stable": "sabit"},
+        "direction_unknown": "belirsiz",
+        "table_header": (
+            "\n| Yil | Dogrudan (tCO2e) | Dolayli (tCO2e) | Toplam (tCO2e) |\n"
+            "|-----|------------------|-----------------|----------------|"
+        ),
+        "finding_change": "- Son yilda emisyonlar **%{change:.1f}** oraninda degismistir ({previous} -> {last}).",
+        "finding_indirect": "- Dolayli emisyonlar dogrudan emisyonlardan yuksektir. Enerji verimliligi iyilestirmeleri oncelikli olmalidir.",
+        "finding_direct": "- Dogrudan emisyonlar baskindir. Proses optimizasyonu ve yakit degisikligi degerlendirilmelidir.",
+        "finding_default": "- Detayli bulgu icin daha fazla veri gerekmektedir.",
+        "recommendations": (
+            "- Emisyon izleme suresinin artirilmasi ve veri kalitesinin iyilestirilmesi onerilir.\n"
+            "- CBAM beyanname sureci icin AB varsayilan deger tablolari ile karsilastirma yapilmalidir.\n"
+            "- Yuksek emisyonlu kaynak akimlari icin alternatif uretim yontemleri degerlendirilmelidir."
+        ),
+        "footer": "*Bu rapor Ecosfer SKDM Platform v2.0 tarafindan otomatik olusturulmustur.*",
+    },
+    "en": {
+        "title": "# {name} - Emission Analysis Report",
+        "company": "\n**Company:** {company}",
+        "headings": ("1. General Assessment", "2. Emission Trends", "3. Key Findings", "4. Recommendations"),
+        "assessment": (
+            "Emission data for {years} year(s) has been analyzed for installation {name}. "
+            "Total cumulative emissions: **{total:.2f} tCO2e**."
+        ),
+        "trend": "The emission trend is **{direction}** with a **{change_pct}%** change.",
+        "table_header": (
+            "\n| Year | Direct (tCO2e) | Indirect (tCO2e) | Total (tCO2e) |\n"
+            "|------|----------------|------------------|---------------|"
+        ),
+        "finding_default": "- Detailed analysis requires additional data points for meaningful insights.",
+        "recommendations": (
+            "- Increase monitoring frequency and improve data quality.\n"
+            "- Compare with EU default value tables for CBAM declaration.\n"
+            "- Evaluate alternative production methods for high-emission source streams."
+        ),
+        "footer": "*This report was automatically generated by Ecosfer SKDM Platform v2.0.*",
+    },
+    "de": {
+        "title": "# {name} - Emissionsanalysebericht",
+        "company": "\n**Unternehmen:** {company}",
+        "headings": ("1. Allgemeine Bewertung", "2. Emissionstrends", "3. Wichtige Erkenntnisse", "4. Empfehlungen"),
+        "assessment": (
+            "Emissionsdaten fur {years} Jahr(e) wurden fur die Anlage {name} analysiert. "
+            "Gesamtemissionen: **{total:.2f} tCO2e**."
+        ),
+        "trend": "Der Emissionstrend ist **{direction}** mit einer Veranderung von **{change_pct}%**.",
+        "directions": {"increasing": "steigend", "decreasing": "sinkend", "stable": "stabil"},
+        "direction_unknown": "unbekannt",
+        "finding_default": "- Fur detaillierte Erkenntnisse sind zusatzliche Datenpunkte erforderlich.",
+        "recommendations": (
+            "- Uberwachungshaufigkeit erhohen und Datenqualitat verbessern.\n"
+            "- Mit EU-Standardwerttabellen fur CBAM-Erklarung vergleichen."
+        ),
+        "footer": "*Dieser Bericht wurde automatisch von Ecosfer SKDM Platform v2.0 erstellt.*",
+    },
+}
+
+# Table rows for n years, built once per n and filled with one % over all values
+_TABLE_ROW = "| %d | %.4f | %.4f | %.4f |"
+_table_formats: dict[int, str] = {}
+
+
+def _table_rows(yearly: dict[int, dict]) -> str:
+    n = len(yearly)
+    fmt = _table_formats.get(n)
+    if fmt is None:
+        fmt = _table_formats[n] = "\n".join([_TABLE_ROW] * n)
+    values = [0] * (4 * n)
+    rows = yearly.values()
+    values[0::4] = yearly
+    values[1::4] = [r["direct"] for r in rows]
+    values[2::4] = [r["indirect"] for r in rows]
+    values[3::4] = [r["total"] for r in rows]
+    return fmt % tuple(values)
+
+
+class NarrativeTemplate:
+    """One language's string table, laid out as a report."""
+
+    def __init__(self, language: str, strings: dict):
+        self.language = language
+        self.strings = strings
+
+    def render_sections(self, context: dict) -> list[str]:
+        strings = self.strings
+        h_assessment, h_trends, h_findings, h_recommendations = (f"\n\n## {h}" for h in strings["headings"])
+        inst = context.get("installation", {})
+        name = inst.get("installation_name", "Bilinmeyen Tesis")
+        company = inst.get("company_name", "")
+        yearly = context.get("yearly_emissions", {})
+        trend = context.get("trend")
+        years = context.get("years", [])
+
+        header = strings["title"].format(name=name)
+        if company:
+            header += strings["company"].format(company=company)
+
+        assessment = h_assessment
+        if yearly:
+            total_all = sum(d["total"] for d in yearly.values())
+            assessment += "\n" + strings["assessment"].format(name=name, years=len(years), total=total_all)
+        elif "assessment_no_data" in strings:
+            assessment += "\n" + strings["assessment_no_data"]
+
+        trends = h_trends
+        if trend:
+            direction = trend["direction"]
+            if "directions" in strings:
+                direction = strings["directions"].get(direction, strings["direction_unknown"])
+            trends += "\n" + strings["trend"].format(direction=direction, change_pct=trend["change_pct"])
+        if yearly and "table_header" in strings:
+            trends += "\n" + strings["table_header"] + "\n" + _table_rows(yearly)
+
+        findings = h_findings + "\n" + strings["finding_default"]
+        if "finding_change" in strings and len(years) >= 2 and yearly:
+            last = yearly[years[-1]]
+            prev = yearly[years[-2]]
+            lines = []
+            if prev["total"] > 0:
+                change = (last["total"] - prev["total"]) / prev["total"] * 100
+                lines.append(strings["finding_change"].format(change=change, previous=years[-2], last=years[-1]))
+            lines.append(strings["finding_indirect"] if last["indirect"] > last["direct"] else strings["finding_direct"])
+            findings = h_findings + "\n" + "\n".join(lines)
+
+        closing = f"{h_recommendations}\n{strings['recommendations']}\n\n---\n{strings['footer']}"
+        return [header, assessment, trends, findings, closing]
+
+    def render(self, context: dict) -> str:
+        return "".join(self.render_sections(context))
+
+
+TEMPLATES = {language: NarrativeTemplate(language, strings) for language, strings in _STRINGS.items()}
+
+
+def get_template(language: str) -> NarrativeTemplate:
+    """The template for a language; English for unsupported ones."""
+    return TEMPLATES.get(language, TEMPLATES["en"])
@@ -26,6 +26,22 @@ if AI_SERVICE_ROOT not in sys.path:
     sys.path.insert(0, AI_SERVICE_ROOT)
 
 
+# ---------------------------------------------------------------------------
+# Background job store
+# ---------------------------------------------------------------------------
+
+@pytest.fixture(autouse=True)
+def memory_job_store(monkeypatch):
+    """Keep background job state in process and fresh per test; never talk to a real Redis."""
+    import job_store
+    from narrative_jobs import narrative_jobs
+    from scan_jobs import scan_jobs
+
+    monkeypatch.setattr(job_store, "JOB_STORE", "memory")
+    monkeypatch.setattr(scan_jobs, "store", job_store.JobStore("scans", 3600, backend="memory"))
+    monkeypatch.setattr(narrative_jobs, "store", job_store.JobStore("narratives", 3600, backend="memory"))
+
+
 # ---------------------------------------------------------------------------
 # Sample data factories
 # ---------------------------------------------------------------------------
@@ -106,14 +122,16 @@ def fastapi_client(
     emission_data: list[dict[str, Any]],
     balance_data: list[dict[str, Any]],
     installation_info: dict[str, Any],
+    tmp_path: Path,
 ):
     """
     httpx-based TestClient for the FastAPI app.
 
-    All three database fetch functions are replaced with lambdas returning
+    The database fetch functions are replaced with lambdas returning
     the sample fixture data so no real database connection is required.
     """
     from database import get_db
+    from frames import BalanceFrame, EmissionFrame
     from main import app
 
     # Override the DB dependency with a no-op generator
@@ -125,13 +143,42 @@ def fastapi_client(
     # Patch the fetch helpers at the module level where they are imported
     import main as main_module
 
-    original_fetch_emission = main_module.fetch_emission_data
-    original_fetch_installation = main_module.fetch_installation_summary
-    original_fetch_balance = main_module.fetch_balance_data
-
-    main_module.fetch_emission_data = lambda db, iid, tid: emission_data
-    main_module.fetch_installation_summary = lambda db, iid, tid: installation_info
-    main_module.fetch_balance_data = lambda db, iid, tid: balance_data
+    original_fetch_yearly = main_module.fetch_yearly_emissions
+    original_fetch_yearly_many = main_module.fetch_yearly_emissions_many
+    original_fetch_bundle = main_module.fetch_installation_bundle
+    original_fetch_fingerprint = main_module.fetch_data_fingerprint
+    original_stream_emissions = main_module.stream_emission_data
+
+    def _fake_bundle(db, iid, tid, include=("installation", "emissions", "balances")):
+        bundle = {
+            "installation": installation_info,
+            "emissions": EmissionFrame.from_records(emission_data),
+            "yearly": EmissionFrame.from_records(emission_data).yearly,
+            "balances": BalanceFrame.from_records(balance_data),
+        }
+        return {part: bundle[part] for part in include}
+
+    main_module.fetch_yearly_emissions = lambda db, iid, tid: EmissionFrame.from_records(emission_data).yearly
+    main_module.fetch_yearly_emissions_many = lambda db, iids, tid: {
+        iid: EmissionFrame.from_records(emission_data).yearly for iid in iids
+    }
+    main_module.fetch_installation_bundle = _fake_bundle
+    main_module.fetch_data_fingerprint = lambda db, iid, tid: {"emission_count": len(emission_data)}
+    main_module.stream_emission_data = lambda db, iid, tid: iter([
+        EmissionFrame.from_records(emission_data[i:i + 2]) for i in range(0, len(emission_data), 2)
+    ])
+
+    # Never talk to a real Redis and never leak cached results between tests
+    from cache import anomaly_model_cache, result_cache
+    original_redis_url = result_cache._redis_url
+    result_cache._redis_url = ""
+    result_cache.local.clear()
+    anomaly_model_cache.clear()
+
+    # Keep fitted models on a per-test local disk store
+    from model_store import forecast_model_store
+    original_store = (forecast_model_store.backend, forecast_model_store._directory)
+    forecast_model_store.backend, forecast_model_store._directory = "disk", str(tmp_path / "models")
 
     from httpx import ASGITransport, AsyncClient
     # Use a synchronous test client approach via httpx
@@ -142,7 +189,24 @@ def fastapi_client(
     yield client
 
     # Restore originals
-    main_module.fetch_emission_data = original_fetch_emission
-    main_module.fetch_installation_summary = original_fetch_installation
-    main_module.fetch_balance_data = original_fetch_balance
+    main_module.fetch_yearly_emissions = original_fetch_yearly
+    main_module.fetch_yearly_emissions_many = original_fetch_yearly_many
+    main_module.fetch_installation_bundle = original_fetch_bundle
+    main_module.fetch_data_fingerprint = original_fetch_fingerprint
+    main_module.stream_emission_data = original_stream_emissions
+    result_cache._redis_url = original_redis_url
+    result_cache.local.clear()
+    anomaly_model_cache.clear()
+    forecast_model_store.backend, forecast_model_store._directory = original_store
     app.dependency_overrides.clear()
+
+
+@pytest.fixture(autouse=True)
+def _isolated_narrative_cache(monkeypatch):
+    """Keep cached LLM narratives in process and per test."""
+    from cache import narrative_cache
+
+    monkeypatch.setattr(narrative_cache, "_redis_url", "")
+    narrative_cache.local.clear()
+    yield
+    narrative_cache.local.clear()
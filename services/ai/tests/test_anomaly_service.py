@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
+import asyncio
 import sys
+import threading
 from pathlib import Path
 from typing import Any
 
@@ -12,13 +14,27 @@ _SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
 if _SERVICE_ROOT not in sys.path:
     sys.path.insert(0, _SERVICE_ROOT)
 
+import numpy as np
+
+from frames import BalanceFrame, EmissionFrame
 from services.anomaly_service import (
+    BALANCE_RULES,
+    Rule,
+    _apply_rules,
     _calculate_quality_score,
     _cross_validate,
     _detect_balance_anomalies,
+    _reservoir_update,
     _safe_float,
     _score_to_severity,
+    adetect_anomalies_streaming,
+    afit_emission_model_sampled,
+    astream_anomalies,
     detect_anomalies,
+    detect_anomalies_streaming,
+    fit_emission_model,
+    fit_emission_model_sampled,
+    stream_anomalies,
 )
 
 
@@ -163,6 +179,273 @@ class TestSuddenChange:
         assert len(anomalies) == 0
 
 
+# ---------------------------------------------------------------------------
+# Streaming detection (large installations)
+# ---------------------------------------------------------------------------
+
+def _large_emission_data(n: int = 400) -> list[dict[str, Any]]:
+    rng = np.random.default_rng(7)
+    records = []
+    for i in range(n):
+        direct = float(rng.normal(100.0, 5.0)) if i % 97 else 900.0
+        records.append({
+            "id": f"e{i}",
+            "reportingYear": 2020 + i % 4,
+            "aDValue": float(rng.normal(50.0, 2.0)),
+            "eFValue": 2.0,
+            "directEmissions": direct,
+            "indirectEmissions": 10.0,
+            "totalCo2Emissions": direct + 10.0,
+            "emission_type": "Fuel",
+        })
+    return records
+
+
+def _chunked(records: list[dict[str, Any]], size: int):
+    return lambda: iter([EmissionFrame.from_records(records[i:i + size]) for i in range(0, len(records), size)])
+
+
+class TestReservoirSample:
+    """Algorithm R over chunks keeps a bounded sample of all rows."""
+
+    def test_fills_before_replacing(self) -> None:
+        reservoir = np.empty((10, 1))
+        seen = _reservoir_update(reservoir, 0, np.arange(6.0).reshape(-1, 1), np.random.default_rng(0))
+        assert seen == 6
+        assert reservoir[:6, 0].tolist() == [0, 1, 2, 3, 4, 5]
+
+    def test_sample_bounded_and_drawn_from_all_chunks(self) -> None:
+        reservoir = np.empty((50, 1))
+        rng = np.random.default_rng(0)
+        seen = 0
+        for start in range(0, 1000, 100):
+            seen = _reservoir_update(reservoir, seen, np.arange(start, start + 100.0).reshape(-1, 1), rng)
+        assert seen == 1000
+        assert reservoir.shape == (50, 1)
+        assert len(set(reservoir[:, 0].tolist())) == 50
+        # Roughly uniform: later chunks are represented, not only the first 50 rows
+        assert (reservoir[:, 0] >= 500).sum() > 10
+
+
+class TestStreamingDetection:
+    """Chunked scoring agrees with the in-memory detector."""
+
+    def test_matches_in_memory_when_sample_holds_all_rows(self) -> None:
+        records = _large_emission_data()
+        expected = detect_anomalies(records, [])
+        result = detect_anomalies_streaming(
+            _chunked(records, 64), EmissionFrame.from_records(records).yearly, [], sample_size=1000,
+        )
+        assert result["summary"] == expected["summary"]
+        assert [a["record_id"] for a in result["anomalies"]] == [a["record_id"] for a in expected["anomalies"]]
+
+    def test_injected_outliers_found_with_small_sample(self) -> None:
+        records = _large_emission_data()
+        result = detect_anomalies_streaming(
+            _chunked(records, 64), EmissionFrame.from_records(records).yearly, [], sample_size=100,
+        )
+        flagged = {a["record_id"] for a in result["anomalies"]}
+        assert {"e0", "e97", "e194", "e291", "e388"} <= flagged
+
+    def test_yields_per_chunk_then_checks(self) -> None:
+        records = _large_emission_data(200)
+        chunks = list(stream_anomalies(_chunked(records, 50), EmissionFrame.from_records(records).yearly, []))
+        assert len(chunks) == 4 + 1  # four scored chunks, then the year-over-year check
+
+    def test_no_data(self) -> None:
+        result = detect_anomalies_streaming(lambda: iter([]), EmissionFrame.from_records([]).yearly, [])
+        assert result["status"] == "no_data"
+
+    def test_fitted_model_skips_sampling_pass(self) -> None:
+        records = _large_emission_data()
+        passes = []
+
+        def chunks():
+            passes.append(1)
+            return _chunked(records, 64)()
+
+        model = fit_emission_model_sampled(chunks, sample_size=100)
+        passes.clear()
+        yearly = EmissionFrame.from_records(records).yearly
+        result = detect_anomalies_streaming(chunks, yearly, [], threshold=0.1, model=model)
+        assert len(passes) == 1
+        assert result == detect_anomalies_streaming(_chunked(records, 64), yearly, [], threshold=0.1, sample_size=100)
+
+
+class TestAsyncStreamingDetection:
+    """The async variants read chunks on the db executor and match the blocking ones."""
+
+    async def test_matches_blocking_detection(self) -> None:
+        records = _large_emission_data()
+        yearly = EmissionFrame.from_records(records).yearly
+        expected = detect_anomalies_streaming(_chunked(records, 64), yearly, [], threshold=0.1, sample_size=100)
+        result = await adetect_anomalies_streaming(_chunked(records, 64), yearly, [], threshold=0.1, sample_size=100)
+        assert result == expected
+
+    async def test_yields_the_same_chunks(self) -> None:
+        records = _large_emission_data(200)
+        yearly = EmissionFrame.from_records(records).yearly
+        model = await afit_emission_model_sampled(_chunked(records, 50), sample_size=100)
+        found = [chunk async for chunk in astream_anomalies(_chunked(records, 50), yearly, [], model=model)]
+        assert found == list(stream_anomalies(_chunked(records, 50), yearly, [], model=model))
+
+    async def test_cursor_is_read_on_the_db_executor(self) -> None:
+        records = _large_emission_data(200)
+        threads = []
+        closed = []
+
+        def chunks():
+            for frame in _chunked(records, 50)():
+                threads.append(threading.current_thread().name)
+                yield frame
+            closed.append(threading.current_thread().name)
+
+        await adetect_anomalies_streaming(chunks, EmissionFrame.from_records(records).yearly, [], sample_size=100)
+        assert len(threads) == 8  # sampling pass and scoring pass
+        assert all(name.startswith("ai-db") for name in threads + closed)
+
+    async def test_cancelled_read_finishes_before_close(self) -> None:
+        records = _large_emission_data(200)
+        reading, release = threading.Event(), threading.Event()
+        closed = []
+
+        def chunks():
+            try:
+                for i, frame in enumerate(_chunked(records, 50)()):
+                    if i == 1:
+                        reading.set()
+                        release.wait(5)
+                    yield frame
+            finally:
+                closed.append(True)
+
+        task = asyncio.create_task(afit_emission_model_sampled(chunks, sample_size=100))
+        await asyncio.to_thread(reading.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        assert not task.done()  # waiting for the running read
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert closed == [True]
+
+
+# ---------------------------------------------------------------------------
+# Fitted model reuse (re-thresholding without a refit)
+# ---------------------------------------------------------------------------
+
+class TestEmissionModelReuse:
+    """One fitted model serves every threshold with the same result as a fresh fit."""
+
+    @pytest.mark.parametrize("threshold", [0.01, 0.05, 0.2, 0.5])
+    def test_rethreshold_matches_fresh_fit(self, threshold: float) -> None:
+        records = _large_emission_data()
+        model = fit_emission_model(records)
+        assert detect_anomalies(records, [], threshold, model) == detect_anomalies(records, [], threshold)
+
+    def test_higher_threshold_flags_more_rows(self) -> None:
+        records = _large_emission_data()
+        model = fit_emission_model(records)
+        low = detect_anomalies(records, [], 0.02, model)["summary"]["total_anomalies"]
+        high = detect_anomalies(records, [], 0.2, model)["summary"]["total_anomalies"]
+        assert high > low
+
+    def test_rescores_when_rows_differ(self) -> None:
+        records = _large_emission_data()
+        model = fit_emission_model(records)
+        subset = records[::-1][:100]
+        result = detect_anomalies(subset, [], 0.05, model)
+        flagged = {a["record_id"] for a in result["anomalies"]}
+        assert flagged <= {r["id"] for r in subset}
+        assert "e388" in flagged
+
+    def test_too_few_rows_has_no_model(self) -> None:
+        assert fit_emission_model(_large_emission_data(4)) is None
+
+
+# ---------------------------------------------------------------------------
+# Rule engine
+# ---------------------------------------------------------------------------
+
+class TestRuleEngine:
+    """Declarative vectorized rules over column arrays."""
+
+    def test_custom_rule(self) -> None:
+        described = []
+        rule = Rule(
+            type="too_large",
+            source="validation",
+            check=lambda c: (c["total"] > 10, np.full(len(c["total"]), 0.5)),
+            describe=lambda r: described.append(r["id"]) or f"{r['id']} too large",
+            values=lambda r: {"total": r["total"]},
+        )
+        columns = {"id": np.array(["a", "b", "c"], dtype=object), "year": np.array([2023, 0, 2024]),
+                   "total": np.array([5.0, 20.0, np.nan])}
+        anomalies = _apply_rules([rule], columns)
+        assert len(anomalies) == 1
+        assert anomalies[0]["record_id"] == "b"
+        assert anomalies[0]["year"] is None
+        assert anomalies[0]["severity"] == "warning"
+        assert anomalies[0]["values"] == {"total": 20.0}
+        # Descriptions are only built for flagged rows
+        assert described == ["b"]
+
+    def test_ordered_by_row_then_rule(self) -> None:
+        frame = BalanceFrame.from_records([
+            {"id": "b1", "reportingYear": 2023, "directEmissions": -1.0, "indirectEmissions": 5.0, "totalEmissions": -2.0},
+            {"id": "b2", "reportingYear": 2024, "directEmissions": 10.0, "indirectEmissions": 5.0, "totalEmissions": 30.0},
+        ])
+        anomalies = _detect_balance_anomalies(frame, 0.05)
+        assert [(a["record_id"], a["type"]) for a in anomalies] == [
+            ("b1", "balance_mismatch"), ("b1", "negative_value"), ("b1", "negative_value"), ("b2", "balance_mismatch"),
+        ]
+        assert [list(a["values"]) for a in anomalies[1:3]] == [["directEmissions"], ["totalEmissions"]]
+
+
+def _row_by_row_balance_anomalies(frame: BalanceFrame) -> list[tuple]:
+    """Reference loop for the balance rules (the pre-vectorized implementation)."""
+    found = []
+    for i in range(len(frame)):
+        row = frame.row(i)
+        direct, indirect, total = row["directEmissions"], row["indirectEmissions"], row["totalEmissions"]
+        if direct and indirect and total:
+            expected = direct + indirect
+            diff = abs(total - expected)
+            if expected > 0 and diff / expected > 0.1:
+                found.append((row["id"], "balance_mismatch", round(min(diff / expected, 1.0), 4),
+                              f"Fark: {diff:.2f} tCO2e"))
+        for field_name, value in [("directEmissions", direct), ("indirectEmissions", indirect), ("totalEmissions", total)]:
+            if value is not None and value < 0:
+                found.append((row["id"], "negative_value", 1.0, f"{field_name} negatif deger ({value:.4f})"))
+    return found
+
+
+def _balance_frame(n: int, seed: int = 0) -> BalanceFrame:
+    """Random balance rows with a sprinkle of mismatched, negative and missing values."""
+    rng = np.random.default_rng(seed)
+    direct, indirect = rng.normal(100, 5, n), rng.normal(20, 2, n)
+    total = direct + indirect
+    total[rng.random(n) < 0.01] *= 1.5
+    direct[rng.random(n) < 0.002] *= -1
+    direct[rng.random(n) < 0.02] = np.nan
+    return BalanceFrame(
+        id=np.array([f"b{i}" for i in range(n)], dtype=object),
+        year=rng.integers(2015, 2025, n), direct=direct, indirect=indirect, total=total,
+    )
+
+
+class TestVectorizedBalanceRules:
+    """The vectorized rules flag the same rows as the row-by-row loop (timings: benchmarks/balance_rules.py)."""
+
+    def test_matches_row_by_row_loop(self) -> None:
+        frame = _balance_frame(5_000)
+        expected = _row_by_row_balance_anomalies(frame)
+        anomalies = _detect_balance_anomalies(frame, 0.05)
+        assert any(e[1] == "negative_value" for e in expected)
+        assert [(a["record_id"], a["type"], a["severity_score"]) for a in anomalies] == [e[:3] for e in expected]
+        assert all(e[3] in a["description"] for a, e in zip(anomalies, expected))
+
+
 # ---------------------------------------------------------------------------
 # Quality score
 # ---------------------------------------------------------------------------
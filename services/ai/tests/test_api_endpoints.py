@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
 import sys
 from pathlib import Path
 from typing import Any
@@ -13,6 +15,8 @@ _SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
 if _SERVICE_ROOT not in sys.path:
     sys.path.insert(0, _SERVICE_ROOT)
 
+from frames import EmissionFrame
+
 
 # ---------------------------------------------------------------------------
 # POST /api/v1/forecast/emissions
@@ -82,6 +86,59 @@ class TestForecastEndpoint:
         assert response.status_code == 422
 
 
+# ---------------------------------------------------------------------------
+# POST /api/v1/forecast/emissions:batch
+# ---------------------------------------------------------------------------
+
+class TestBatchForecastEndpoint:
+    """Tests for the NDJSON batch forecast API."""
+
+    def _post(self, client: Any, body: dict) -> Any:
+        return client.post(
+            "/api/v1/forecast/emissions:batch",
+            json=body,
+            headers={"X-Tenant-Id": "tenant-1"},
+        )
+
+    def test_streams_one_line_per_installation(self, fastapi_client: Any) -> None:
+        response = self._post(fastapi_client, {"installation_ids": ["a", "b", "c"], "periods": 2})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["installation_id"] for line in lines) == ["a", "b", "c"]
+        assert all(line["status"] == "success" and len(line["forecast"]) == 2 for line in lines)
+
+    def test_duplicate_ids_forecast_once(self, fastapi_client: Any) -> None:
+        response = self._post(fastapi_client, {"installation_ids": ["a", "a"], "periods": 1})
+        assert len(response.text.splitlines()) == 1
+
+    def test_partial_failure_reported_per_item(self, fastapi_client: Any) -> None:
+        import main as main_module
+
+        original = main_module.forecast_emissions
+
+        def _flaky(frame, periods, *args):
+            if len(frame) == 0:
+                raise ValueError("broken installation")
+            return original(frame, periods, *args)
+
+        fetch_many = main_module.fetch_yearly_emissions_many
+        main_module.fetch_yearly_emissions_many = lambda db, iids, tid: {
+            **fetch_many(db, iids, tid), "bad": EmissionFrame.from_records([]).yearly
+        }
+        # Route every installation through the per-item path, as long histories would be
+        with patch.object(main_module, "forecast_emissions", _flaky), \
+                patch.object(main_module, "forecast_emissions_batch", lambda frames, periods: ({}, list(frames))):
+            response = self._post(fastapi_client, {"installation_ids": ["good", "bad"], "periods": 1})
+        lines = {line["installation_id"]: line for line in map(json.loads, response.text.splitlines())}
+        assert lines["good"]["status"] == "success"
+        assert lines["bad"]["status"] == "error"
+        assert "broken installation" in lines["bad"]["message"]
+
+    def test_empty_list_rejected(self, fastapi_client: Any) -> None:
+        assert self._post(fastapi_client, {"installation_ids": []}).status_code == 422
+
+
 # ---------------------------------------------------------------------------
 # POST /api/v1/analysis/anomalies
 # ---------------------------------------------------------------------------
@@ -150,6 +207,189 @@ class TestAnomaliesEndpoint:
         )
         assert response.status_code == 422
 
+    def test_large_installation_uses_streaming(self, fastapi_client: Any, monkeypatch) -> None:
+        import main as main_module
+
+        monkeypatch.setattr(main_module, "ANOMALY_STREAMING_MIN_ROWS", 1)
+        calls = []
+
+        async def _detect(chunks, yearly, balances, threshold, model):
+            calls.append(list(chunks()))
+            return main_module.detect_anomalies([], [])
+
+        monkeypatch.setattr(main_module, "adetect_anomalies_streaming", _detect)
+        response = fastapi_client.post(
+            "/api/v1/analysis/anomalies",
+            json={"installation_id": "inst-1"},
+            headers={"X-Tenant-Id": "tenant-1"},
+        )
+        assert response.status_code == 200
+        assert len(calls) == 1 and calls[0]
+
+
+    def test_threshold_change_reuses_fitted_model(self, fastapi_client: Any, monkeypatch) -> None:
+        import main as main_module
+
+        fits = []
+        real_fit = main_module.fit_emission_model
+        monkeypatch.setattr(main_module, "fit_emission_model", lambda frame: fits.append(1) or real_fit(frame))
+        responses = [
+            fastapi_client.post(
+                "/api/v1/analysis/anomalies",
+                json={"installation_id": "inst-1", "threshold": threshold},
+                headers={"X-Tenant-Id": "tenant-1"},
+            )
+            for threshold in (0.05, 0.2)
+        ]
+        assert [r.status_code for r in responses] == [200, 200]
+        assert len(fits) == 1
+
+
+class TestAnomalyStreamEndpoint:
+    """POST /api/v1/analysis/anomalies:stream returns NDJSON lines."""
+
+    def test_streams_items_then_summary(self, fastapi_client: Any) -> None:
+        response = fastapi_client.post(
+            "/api/v1/analysis/anomalies:stream",
+            json={"installation_id": "inst-1"},
+            headers={"X-Tenant-Id": "tenant-1"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        *items, final = lines
+        assert final["status"] == "success"
+        assert final["summary"]["total_anomalies"] == len(items)
+        assert all("severity" in item and "type" in item for item in items)
+
+
+class TestAnomalyScanEndpoints:
+    """Submitting and polling tenant-wide scan jobs."""
+
+    def test_submit_returns_202_with_job_id(self, fastapi_client: Any, monkeypatch) -> None:
+        import main as main_module
+
+        submitted = []
+
+        async def _submit(tid, threshold, ids):
+            submitted.append((tid, threshold, ids))
+            return _finished_job(tid)
+
+        monkeypatch.setattr(main_module.scan_jobs, "submit", _submit)
+        response = fastapi_client.post(
+            "/api/v1/analysis/anomalies/scans",
+            json={"threshold": 0.1},
+            headers={"X-Tenant-Id": "tenant-1"},
+        )
+        assert response.status_code == 202
+        assert response.json()["job_id"] == "job-1"
+        assert submitted == [("tenant-1", 0.1, None)]
+
+    def test_status_and_results(self, fastapi_client: Any) -> None:
+        _store_scan_job(_finished_job("tenant-1"))
+        status = fastapi_client.get("/api/v1/analysis/anomalies/scans/job-1", headers={"X-Tenant-Id": "tenant-1"})
+        assert status.status_code == 200
+        assert status.json()["status"] == "completed"
+        assert "results" not in status.json()
+
+        results = fastapi_client.get(
+            "/api/v1/analysis/anomalies/scans/job-1/results", headers={"X-Tenant-Id": "tenant-1"}
+        ).json()
+        assert results["results"][0]["installation_id"] == "inst-1"
+        assert results["results"][0]["summary"]["data_quality_score"] == 97.0
+
+    def test_other_tenant_gets_404(self, fastapi_client: Any) -> None:
+        _store_scan_job(_finished_job("tenant-1"))
+        response = fastapi_client.get("/api/v1/analysis/anomalies/scans/job-1", headers={"X-Tenant-Id": "tenant-2"})
+        assert response.status_code == 404
+
+
+class TestNarrativeJobEndpoints:
+    """Submitting bulk narrative jobs and fetching narratives per installation."""
+
+    def test_submit_returns_202_with_job_id(self, fastapi_client: Any, monkeypatch) -> None:
+        import main as main_module
+
+        submitted = []
+
+        async def _submit(tid, ids, report_type, languages):
+            submitted.append((tid, ids, report_type, languages))
+            return _narrative_job(tid)
+
+        monkeypatch.setattr(main_module.narrative_jobs, "submit", _submit)
+        response = fastapi_client.post(
+            "/api/v1/analysis/report-narrative/jobs",
+            json={"installation_ids": ["inst-1", "inst-2"], "languages": ["tr", "en"]},
+            headers={"X-Tenant-Id": "tenant-1"},
+        )
+        assert response.status_code == 202
+        assert response.json()["job_id"] == "njob-1"
+        assert submitted == [("tenant-1", ["inst-1", "inst-2"], "summary", ["tr", "en"])]
+
+    def test_empty_installation_list_rejected(self, fastapi_client: Any) -> None:
+        response = fastapi_client.post(
+            "/api/v1/analysis/report-narrative/jobs", json={"installation_ids": []}, headers={"X-Tenant-Id": "tenant-1"}
+        )
+        assert response.status_code == 422
+
+    def test_status_and_item(self, fastapi_client: Any) -> None:
+        _store_narrative_job(_narrative_job("tenant-1"))
+        status = fastapi_client.get("/api/v1/analysis/report-narrative/jobs/njob-1", headers={"X-Tenant-Id": "tenant-1"})
+        assert status.json()["processed"] == 1
+
+        item = fastapi_client.get(
+            "/api/v1/analysis/report-narrative/jobs/njob-1/narratives/inst-1", headers={"X-Tenant-Id": "tenant-1"}
+        )
+        assert item.status_code == 200
+        assert item.json()["narratives"][0]["narrative"] == "# Plant"
+
+        pending = fastapi_client.get(
+            "/api/v1/analysis/report-narrative/jobs/njob-1/narratives/inst-2", headers={"X-Tenant-Id": "tenant-1"}
+        )
+        assert pending.status_code == 202
+        assert pending.json()["status"] == "pending"
+
+        unknown = fastapi_client.get(
+            "/api/v1/analysis/report-narrative/jobs/njob-1/narratives/other", headers={"X-Tenant-Id": "tenant-1"}
+        )
+        assert unknown.status_code == 404
+
+    def test_other_tenant_gets_404(self, fastapi_client: Any) -> None:
+        _store_narrative_job(_narrative_job("tenant-1"))
+        response = fastapi_client.get("/api/v1/analysis/report-narrative/jobs/njob-1", headers={"X-Tenant-Id": "tenant-2"})
+        assert response.status_code == 404
+
+
+def _narrative_job(tenant_id: str):
+    from narrative_jobs import NarrativeJob
+
+    return NarrativeJob(
+        id="njob-1", tenant_id=tenant_id, installation_ids=["inst-1", "inst-2"], status="running", total=2, processed=1,
+    )
+
+
+def _store_narrative_job(job) -> None:
+    from narrative_jobs import narrative_jobs
+
+    narrative = {"status": "success", "message": "ok", "narrative": "# Plant", "language": "tr",
+                 "report_type": "summary", "model": "template"}
+    results = {"inst-1": {"status": "success", "narratives": [narrative]}}
+    asyncio.run(narrative_jobs.store.save(job.id, job.to_fields(), results))
+
+
+def _finished_job(tenant_id: str):
+    from scan_jobs import ScanJob
+
+    return ScanJob(id="job-1", tenant_id=tenant_id, threshold=0.1, status="completed", total=1, processed=1)
+
+
+def _store_scan_job(job) -> None:
+    from scan_jobs import scan_jobs
+
+    summary = {"total_anomalies": 1, "critical": 0, "warning": 0, "info": 3, "data_quality_score": 97.0}
+    results = {"inst-1": {"status": "success", "summary": summary}}
+    asyncio.run(scan_jobs.store.save(job.id, job.to_fields(), results))
+
 
 # ---------------------------------------------------------------------------
 # POST /api/v1/analysis/report-narrative
@@ -232,6 +472,196 @@ class TestNarrativeEndpoint:
         ).json()
         assert data["language"] == "tr"
 
+    @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
+    @patch("services.narrative_service.OPENAI_API_KEY", "")
+    def test_async_engine_loads_the_bundle(self, fastapi_client: Any, monkeypatch) -> None:
+        import main as main_module
+
+        engine = object()
+        calls = []
+
+        async def _afetch(eng, iid, tid, include):
+            calls.append((eng, include))
+            return main_module.fetch_installation_bundle(None, iid, tid, include)
+
+        monkeypatch.setattr(main_module, "async_engine", engine)
+        monkeypatch.setattr(main_module, "afetch_installation_bundle", _afetch)
+        data = fastapi_client.post(
+            "/api/v1/analysis/report-narrative",
+            json={"installation_id": "inst-1"},
+            headers={"X-Tenant-Id": "tenant-1"},
+        ).json()
+        assert data["status"] == "success"
+        assert calls == [(engine, ("installation", "yearly", "balances"))]
+
+
+    @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
+    @patch("services.narrative_service.OPENAI_API_KEY", "")
+    def test_narrative_multiple_languages(self, fastapi_client: Any) -> None:
+        import main as main_module
+
+        calls = []
+        fetch = main_module.fetch_installation_bundle
+        main_module.fetch_installation_bundle = lambda *args: calls.append(args[1]) or fetch(*args)
+        data = fastapi_client.post(
+            "/api/v1/analysis/report-narrative",
+            json={"installation_id": "inst-1", "languages": ["en", "de", "tr", "en"]},
+            headers={"X-Tenant-Id": "tenant-1"},
+        ).json()
+        assert [n["language"] for n in data["narratives"]] == ["en", "de", "tr"]
+        assert data["language"] == "en"
+        assert data["narrative"] == data["narratives"][0]["narrative"]
+        assert "Allgemeine Bewertung" in data["narratives"][1]["narrative"]
+        assert len(calls) == 1
+
+    @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
+    @patch("services.narrative_service.OPENAI_API_KEY", "")
+    def test_single_language_has_no_narratives_list(self, fastapi_client: Any) -> None:
+        data = fastapi_client.post(
+            "/api/v1/analysis/report-narrative",
+            json={"installation_id": "inst-1"},
+            headers={"X-Tenant-Id": "tenant-1"},
+        ).json()
+        assert data["narratives"] == []
+
+
+def _sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestNarrativeStreamEndpoint:
+    """POST /api/v1/analysis/report-narrative:stream returns Server-Sent Events."""
+
+    @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
+    @patch("services.narrative_service.OPENAI_API_KEY", "")
+    def test_template_streams_sections_then_done(self, fastapi_client: Any) -> None:
+        body = {"installation_id": "inst-1", "language": "en"}
+        resp = fastapi_client.post("/api/v1/analysis/report-narrative:stream", json=body, headers={"X-Tenant-Id": "tenant-1"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = _sse_events(resp.text)
+        kinds = [kind for kind, _ in events]
+        assert kinds[-1] == "done" and kinds.count("done") == 1
+        assert kinds.count("text") > 1  # one event per template section
+        done = events[-1][1]
+        assert done["model"] == "template"
+        assert done["status"] == "success"
+        assert "narrative" not in done
+
+        full = fastapi_client.post("/api/v1/analysis/report-narrative", json=body, headers={"X-Tenant-Id": "tenant-1"}).json()
+        assert "".join(data["text"] for kind, data in events if kind == "text") == full["narrative"]
+
+    def test_multiple_languages_rejected(self, fastapi_client: Any) -> None:
+        resp = fastapi_client.post(
+            "/api/v1/analysis/report-narrative:stream",
+            json={"installation_id": "inst-1", "languages": ["en", "de"]},
+            headers={"X-Tenant-Id": "tenant-1"},
+        )
+        assert resp.status_code == 422
+
+    def test_no_data_sends_only_done(self, fastapi_client: Any, monkeypatch) -> None:
+        import main as main_module
+        from frames import BalanceFrame, YearlyAggregate
+
+        monkeypatch.setattr(main_module, "fetch_installation_bundle", lambda db, iid, tid, parts: {
+            "installation": None, "yearly": YearlyAggregate.empty(), "balances": BalanceFrame.from_records([]),
+        })
+        resp = fastapi_client.post(
+            "/api/v1/analysis/report-narrative:stream", json={"installation_id": "x"}, headers={"X-Tenant-Id": "tenant-1"}
+        )
+        assert _sse_events(resp.text) == [("done", {
+            "status": "no_data", "message": "Rapor icin veri bulunamadi", "language": "tr", "report_type": "summary", "model": None, "cached": False,
+        })]
+
+
+# ---------------------------------------------------------------------------
+# Result cache
+# ---------------------------------------------------------------------------
+
+class TestResultCaching:
+    """Repeated calls for unchanged data are served from the result cache."""
+
+    def test_repeated_forecast_skips_data_fetch(self, fastapi_client: Any) -> None:
+        import main as main_module
+
+        calls = []
+        fetch = main_module.fetch_yearly_emissions
+        main_module.fetch_yearly_emissions = lambda db, iid, tid: calls.append(iid) or fetch(db, iid, tid)
+        body = {"installation_id": "inst-1", "periods": 3, "seed": 1}
+        first = fastapi_client.post("/api/v1/forecast/emissions", json=body, headers={"X-Tenant-Id": "tenant-1"}).json()
+        second = fastapi_client.post("/api/v1/forecast/emissions", json=body, headers={"X-Tenant-Id": "tenant-1"}).json()
+        assert first == second
+        assert len(calls) == 1
+
+    def test_changed_fingerprint_misses_cache(self, fastapi_client: Any) -> None:
+        import main as main_module
+
+        calls = []
+        fetch = main_module.fetch_installation_bundle
+        main_module.fetch_installation_bundle = lambda db, iid, tid, *a: calls.append(iid) or fetch(db, iid, tid, *a)
+        body = {"installation_id": "inst-1"}
+        fastapi_client.post("/api/v1/analysis/anomalies", json=body, headers={"X-Tenant-Id": "tenant-1"})
+        main_module.fetch_data_fingerprint = lambda db, iid, tid: {"emission_count": 999}
+        fastapi_client.post("/api/v1/analysis/anomalies", json=body, headers={"X-Tenant-Id": "tenant-1"})
+        assert len(calls) == 2
+
+
+# ---------------------------------------------------------------------------
+# Forecast model store
+# ---------------------------------------------------------------------------
+
+class TestForecastModelStore:
+    """Fitted forecast models are reused until the installation's data changes."""
+
+    def _forecast(self, client: Any, **body: Any) -> dict:
+        body = {"installation_id": "inst-1", "periods": 3, "seed": 1, **body}
+        return client.post("/api/v1/forecast/emissions", json=body, headers={"X-Tenant-Id": "tenant-1"}).json()
+
+    def test_stored_model_serves_other_horizons_without_refit(self, fastapi_client: Any) -> None:
+        import main as main_module
+        from cache import result_cache
+
+        calls = []
+        fetch = main_module.fetch_yearly_emissions
+        main_module.fetch_yearly_emissions = lambda db, iid, tid: calls.append(iid) or fetch(db, iid, tid)
+        with patch.object(result_cache, "enabled", False):
+            first = self._forecast(fastapi_client, periods=3)
+            second = self._forecast(fastapi_client, periods=6)
+        assert len(calls) == 1
+        assert second["forecast"][:3] == first["forecast"]
+        assert len(second["forecast"]) == 6
+
+    def test_changed_fingerprint_refits(self, fastapi_client: Any) -> None:
+        import main as main_module
+        from cache import result_cache
+
+        calls = []
+        fetch = main_module.fetch_yearly_emissions
+        main_module.fetch_yearly_emissions = lambda db, iid, tid: calls.append(iid) or fetch(db, iid, tid)
+        with patch.object(result_cache, "enabled", False):
+            self._forecast(fastapi_client)
+            main_module.fetch_data_fingerprint = lambda db, iid, tid: {"emission_count": 999}
+            self._forecast(fastapi_client)
+        assert len(calls) == 2
+
+    def test_stored_model_older_than_horizon_is_refit(self, fastapi_client: Any) -> None:
+        import main as main_module
+        from cache import result_cache
+
+        calls = []
+        fetch = main_module.fetch_yearly_emissions
+        main_module.fetch_yearly_emissions = lambda db, iid, tid: calls.append(iid) or fetch(db, iid, tid)
+        short = main_module.train_forecast_model(fetch(None, "inst-1", "tenant-1"), None, 1, horizon=3)
+        with patch.object(result_cache, "enabled", False), \
+                patch.object(main_module.forecast_model_store, "get", lambda *a: short):
+            result = self._forecast(fastapi_client, periods=24)
+        assert len(result["forecast"]) == 24
+        assert len(calls) == 1
+
 
 # ---------------------------------------------------------------------------
 # Cross-endpoint edge cases
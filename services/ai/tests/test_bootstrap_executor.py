@@ -0,0 +1,76 @@
+"""Tests for services/bootstrap_executor.py."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from services import bootstrap_executor
+from services.bootstrap_executor import run_bootstrap, shutdown_pool
+from services.forecast_service import _xgboost_forecast
+
+X = np.array([2019, 2020, 2021, 2022, 2023, 2024]).reshape(-1, 1)
+Y = np.array([100.0, 108.0, 115.0, 121.0, 133.0, 140.0])
+FUTURE_X = np.array([2025, 2026, 2027]).reshape(-1, 1)
+
+
+@pytest.fixture(autouse=True)
+def _shutdown_pool():
+    yield
+    shutdown_pool()
+
+
+class TestRunBootstrap:
+    """Tests for the bootstrap refit executor."""
+
+    @patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1)
+    def test_inline_prediction_shape(self) -> None:
+        preds, stats = run_bootstrap(X, Y, FUTURE_X, n_bootstrap=12, seed=7)
+        assert preds.shape == (12, 3)
+        assert stats["samples"] == 12
+        assert stats["workers"] == 1
+
+    @patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1)
+    def test_fixed_seed_is_deterministic(self) -> None:
+        first, _ = run_bootstrap(X, Y, FUTURE_X, n_bootstrap=10, seed=42)
+        second, _ = run_bootstrap(X, Y, FUTURE_X, n_bootstrap=10, seed=42)
+        np.testing.assert_array_equal(first, second)
+
+    @patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1)
+    def test_stats_fields(self) -> None:
+        _, stats = run_bootstrap(X, Y, FUTURE_X, n_bootstrap=5, seed=1)
+        for key in ("wall_seconds", "serial_seconds", "saved_seconds"):
+            assert stats[key] >= 0
+
+    @pytest.mark.slow
+    def test_pool_matches_inline_for_same_seed(self) -> None:
+        with patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1):
+            inline, _ = run_bootstrap(X, Y, FUTURE_X, n_bootstrap=8, seed=3)
+        with patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 2):
+            pooled, stats = run_bootstrap(X, Y, FUTURE_X, n_bootstrap=8, seed=3)
+        assert stats["workers"] == 2
+        np.testing.assert_allclose(inline, pooled)
+
+
+class TestXGBoostForecastBootstrap:
+    """The XGBoost forecast path reports bootstrap stats and honours the sample count."""
+
+    @patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1)
+    def test_reports_bootstrap_stats(self) -> None:
+        result = _xgboost_forecast(X.ravel(), Y, periods=3, n_bootstrap=10, seed=5)
+        assert result["bootstrap"]["samples"] == 10
+        assert len(result["predictions"]) == 3
+
+    @patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1)
+    def test_seeded_bounds_are_reproducible(self) -> None:
+        first = _xgboost_forecast(X.ravel(), Y, periods=3, n_bootstrap=10, seed=5)
+        second = _xgboost_forecast(X.ravel(), Y, periods=3, n_bootstrap=10, seed=5)
+        assert first["predictions"] == second["predictions"]
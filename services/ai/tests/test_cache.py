@@ -0,0 +1,124 @@
+"""Tests for cache.py (L1 LRU + Redis L2 result cache)."""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from cache import LRUCache, ResultCache, prompt_key
+from metrics import CACHE_EVICTIONS
+
+
+class FakeRedis:
+    """Minimal async stand-in for redis.asyncio.Redis."""
+
+    def __init__(self, fail: bool = False):
+        self.store: dict[str, str] = {}
+        self.fail = fail
+
+    async def get(self, key: str):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.store.get(key)
+
+    async def set(self, key: str, value: str, ex: int | None = None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.store[key] = value
+
+
+def _cache_with(redis: FakeRedis | None) -> ResultCache:
+    cache = ResultCache("test", redis_url="redis://fake" if redis else "", enabled=True)
+    if redis is not None:
+        cache._client = lambda: None if time.monotonic() < cache._redis_down_until else redis
+    return cache
+
+
+class TestLRUCache:
+    """Tests for the in-process LRU tier."""
+
+    def test_get_returns_stored_value(self) -> None:
+        cache = LRUCache("t", maxsize=2, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = LRUCache("lru-test", maxsize=2, ttl=60)
+        before = CACHE_EVICTIONS.labels(cache="lru-test", reason="lru")._value.get()
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert CACHE_EVICTIONS.labels(cache="lru-test", reason="lru")._value.get() == before + 1
+
+    def test_expired_entries_are_dropped(self) -> None:
+        cache = LRUCache("t", maxsize=2, ttl=0)
+        cache.set("a", 1)
+        time.sleep(0.001)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestResultCache:
+    """Tests for the two-tier result cache."""
+
+    def test_key_depends_on_fingerprint(self) -> None:
+        cache = _cache_with(None)
+        k1 = cache.make_key("t1", "i1", "forecast", {"periods": 3}, {"emission_count": 5})
+        k2 = cache.make_key("t1", "i1", "forecast", {"periods": 3}, {"emission_count": 6})
+        assert k1 != k2
+        assert k1 == cache.make_key("t1", "i1", "forecast", {"periods": 3}, {"emission_count": 5})
+
+    def test_key_is_tenant_scoped(self) -> None:
+        cache = _cache_with(None)
+        assert cache.make_key("t1", "i1", "forecast", {}, {}) != cache.make_key("t2", "i1", "forecast", {}, {})
+
+    async def test_miss_then_l1_hit(self) -> None:
+        cache = _cache_with(None)
+        assert await cache.get("k") is None
+        await cache.set("k", {"status": "success"})
+        assert await cache.get("k") == {"status": "success"}
+
+    async def test_l2_hit_populates_l1(self) -> None:
+        redis = FakeRedis()
+        writer = _cache_with(redis)
+        await writer.set("k", {"value": 1.5})
+
+        reader = _cache_with(redis)
+        assert await reader.get("k") == {"value": 1.5}
+        assert reader.local.get("k") == {"value": 1.5}
+
+    async def test_redis_failure_degrades_to_l1(self) -> None:
+        cache = _cache_with(FakeRedis(fail=True))
+        await cache.set("k", {"a": 1})
+        assert cache._redis_down_until > time.monotonic()
+        assert await cache.get("k") == {"a": 1}
+
+    async def test_disabled_cache_never_stores(self) -> None:
+        cache = ResultCache("test", redis_url="", enabled=False)
+        await cache.set("k", {"a": 1})
+        assert await cache.get("k") is None
+
+
+class TestPromptKey:
+    """Narrative cache keys address the exact model and prompt."""
+
+    def test_same_prompt_same_key(self) -> None:
+        assert prompt_key("m", "system", "user") == prompt_key("m", "system", "user")
+
+    def test_any_change_changes_key(self) -> None:
+        base = prompt_key("m", "system", "user")
+        assert prompt_key("m2", "system", "user") != base
+        assert prompt_key("m", "system2", "user") != base
+        assert prompt_key("m", "system", "user2") != base
+        # The separator keeps shifted boundaries apart
+        assert prompt_key("m", "sys", "temuser") != prompt_key("m", "system", "user")
@@ -0,0 +1,504 @@
+"""Tests for database.py query helpers (no real database required)."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+import database
+from database import (
+    BUNDLE_PARTS,
+    BUNDLE_YEARLY,
+    afetch_installation_bundle,
+    copy_balance_data_many,
+    copy_emission_data_many,
+    fetch_balance_data,
+    fetch_balance_data_many,
+    fetch_emission_data,
+    fetch_emission_data_many,
+    fetch_installation_bundle,
+    fetch_tenant_installation_ids,
+    fetch_yearly_emissions,
+    fetch_yearly_emissions_many,
+    stream_balance_data,
+    stream_emission_data,
+)
+from frames import BalanceFrame, EmissionFrame, YearlyAggregate
+from metrics import DB_QUERY_DURATION
+
+
+def _db_returning(mapping: dict) -> MagicMock:
+    db = MagicMock()
+    row = MagicMock()
+    row._mapping = mapping
+    db.execute.return_value.fetchone.return_value = row
+    return db
+
+
+def _observation_count(query_type: str) -> float:
+    for sample in DB_QUERY_DURATION.collect()[0].samples:
+        if sample.name.endswith("_count") and sample.labels.get("query_type") == query_type:
+            return sample.value
+    return 0.0
+
+
+class TestFetchInstallationBundle:
+    """Tests for the single-statement bundle loader."""
+
+    def test_runs_one_statement(self) -> None:
+        db = _db_returning({"installation": {"id": "i1"}, "emissions": {"id": []}, "balances": {"id": []}})
+        fetch_installation_bundle(db, "i1", "t1")
+        assert db.execute.call_count == 1
+
+    def test_returns_requested_parts_as_frames(self) -> None:
+        db = _db_returning({
+            "emissions": {"id": ["e1"], "reportingYear": [2024], "totalCo2Emissions": [12.5]},
+            "balances": {"id": ["b1"]},
+        })
+        bundle = fetch_installation_bundle(db, "i1", "t1", ("emissions", "balances"))
+        assert set(bundle) == {"emissions", "balances"}
+        assert isinstance(bundle["emissions"], EmissionFrame)
+        assert isinstance(bundle["balances"], BalanceFrame)
+        assert bundle["emissions"].total.tolist() == [12.5]
+        assert bundle["emissions"].year.tolist() == [2024]
+
+    def test_missing_aggregates_give_empty_frames(self) -> None:
+        bundle = fetch_installation_bundle(_db_returning({"emissions": None}), "i1", "t1", ("emissions",))
+        assert len(bundle["emissions"]) == 0
+
+    def test_query_only_selects_requested_parts(self) -> None:
+        db = _db_returning({"emissions": {}})
+        fetch_installation_bundle(db, "i1", "t1", ("emissions",))
+        sql = str(db.execute.call_args[0][0])
+        assert '"Emission"' in sql
+        assert '"GhgBalanceByType"' not in sql
+        assert '"Installation" inst' not in sql
+
+    def test_yearly_part_is_aggregated_in_sql(self) -> None:
+        db = _db_returning({"yearly": {"year": [2024, 2023], "total": [5.0, 3.0], "count": [2, 1]}})
+        bundle = fetch_installation_bundle(db, "i1", "t1", ("yearly",))
+        sql = str(db.execute.call_args[0][0])
+        assert "GROUP BY" in sql
+        assert isinstance(bundle["yearly"], YearlyAggregate)
+        assert bundle["yearly"].years.tolist() == [2023, 2024]
+        assert bundle["yearly"].records == 3
+
+    def test_shares_installation_data_cte(self) -> None:
+        db = _db_returning({})
+        fetch_installation_bundle(db, "i1", "t1")
+        sql = str(db.execute.call_args[0][0])
+        assert sql.count('FROM "InstallationData"') == 1
+
+    def test_records_query_duration(self) -> None:
+        before = _observation_count("bundle")
+        fetch_installation_bundle(_db_returning({}), "i1", "t1")
+        assert _observation_count("bundle") == before + 1
+
+
+class TestFetchEmissionData:
+    """fetch_emission_data converts cursor chunks into one frame, never calling fetchall."""
+
+    def test_returns_frame(self) -> None:
+        db = MagicMock()
+        result = db.execute.return_value
+        result.keys.return_value = ["id", "reportingYear", "totalCo2Emissions"]
+        result.partitions.return_value = iter([[("e1", 2023, 10.0)], [("e2", 2024, None)]])
+        frame = fetch_emission_data(db, "i1", "t1")
+        assert isinstance(frame, EmissionFrame)
+        assert frame.id.tolist() == ["e1", "e2"]
+        assert frame.year.tolist() == [2023, 2024]
+        assert frame.total[0] == 10.0
+        assert frame.total[1] != frame.total[1]  # NaN
+        assert db.execute.call_args[0][0].get_execution_options()["stream_results"] is True
+        result.fetchall.assert_not_called()
+        result.close.assert_called_once()
+
+    def test_no_rows(self) -> None:
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = ["id", "totalCo2Emissions"]
+        db.execute.return_value.partitions.return_value = iter([])
+        assert len(fetch_emission_data(db, "i1", "t1")) == 0
+
+
+class TestStreamEmissionData:
+    """stream_emission_data reads through a server-side cursor in fixed-size chunks."""
+
+    def test_yields_frames_per_partition(self) -> None:
+        db = MagicMock()
+        result = db.execute.return_value
+        result.keys.return_value = ["id", "totalCo2Emissions"]
+        result.partitions.return_value = iter([[("e1", 1.0), ("e2", 2.0)], [("e3", 3.0)]])
+        frames = list(stream_emission_data(db, "i1", "t1", chunk_size=2))
+        assert [f.id.tolist() for f in frames] == [["e1", "e2"], ["e3"]]
+        result.partitions.assert_called_once_with(2)
+        result.close.assert_called_once()
+        options = db.execute.call_args[0][0].get_execution_options()
+        assert options["stream_results"] is True
+        assert options["yield_per"] == 2
+
+    def test_closes_cursor_when_abandoned(self) -> None:
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = ["id"]
+        db.execute.return_value.partitions.return_value = iter([[("e1",)], [("e2",)]])
+        frames = stream_emission_data(db, "i1", "t1", chunk_size=1)
+        next(frames)
+        frames.close()
+        db.execute.return_value.close.assert_called_once()
+
+
+class TestNumericPrecision:
+    """Decimal(28,10) columns are cast to float8 in SQL."""
+
+    def _sql(self, fetch) -> str:
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = ["id"]
+        db.execute.return_value.partitions.return_value = iter([])
+        fetch(db, "i1", "t1")
+        return str(db.execute.call_args[0][0])
+
+    def test_emissions_cast_to_float8(self) -> None:
+        sql = self._sql(fetch_emission_data)
+        assert 'e."totalCo2Emissions"::float8 AS "totalCo2Emissions"' in sql
+        assert sql.count("::float8") == 5
+
+    def test_balances_cast_to_float8(self) -> None:
+        assert self._sql(fetch_balance_data).count("::float8") == 3
+
+    def test_yearly_sums_cast_once_per_year(self) -> None:
+        assert "SUM(COALESCE(e.\"totalCo2Emissions\", 0))::float8" in database._YEARLY_LIVE_QUERY
+
+    def test_decimal_and_float8_rows_give_the_same_frame(self) -> None:
+        keys = ["id", "aDValue", "totalCo2Emissions"]
+        text_values = [("e1", "12.3456789012", "0.1000000000"), ("e2", None, "987654321.0123456789")]
+        exact = EmissionFrame.from_rows([(i, *(Decimal(v) if v else None for v in r)) for i, *r in text_values], keys)
+        fast = EmissionFrame.from_rows([(i, *(float(v) if v else None for v in r)) for i, *r in text_values], keys)
+        assert np.array_equal(exact.ad_value, fast.ad_value, equal_nan=True)
+        assert np.array_equal(exact.total, fast.total)
+
+
+class TestFetchBalanceData:
+    """Balances are read through the same chunked server-side cursor as emissions."""
+
+    def test_returns_frame(self) -> None:
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = ["id", "totalEmissions", "reportingYear"]
+        db.execute.return_value.partitions.return_value = iter([[("b1", 5.0, 2023), ("b2", 7.0, 2024)]])
+        frame = fetch_balance_data(db, "i1", "t1")
+        assert isinstance(frame, BalanceFrame)
+        assert frame.total.tolist() == [5.0, 7.0]
+        db.execute.return_value.fetchall.assert_not_called()
+
+    def test_stream_yields_chunks(self) -> None:
+        db = MagicMock()
+        result = db.execute.return_value
+        result.keys.return_value = ["id", "reportingYear"]
+        result.partitions.return_value = iter([[("b1", 2023)], [("b2", 2024)]])
+        frames = list(stream_balance_data(db, "i1", "t1", chunk_size=1))
+        assert [f.year.tolist() for f in frames] == [[2023], [2024]]
+        result.partitions.assert_called_once_with(1)
+        assert db.execute.call_args[0][0].get_execution_options()["yield_per"] == 1
+        result.close.assert_called_once()
+
+
+class TestFetchEmissionDataMany:
+    """fetch_emission_data_many runs one ANY() query and splits rows per installation."""
+
+    def test_splits_rows_per_installation(self) -> None:
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = ["installation_id", "id", "reportingYear", "totalCo2Emissions"]
+        db.execute.return_value.fetchall.return_value = [
+            ("i1", "e1", 2023, 1.0),
+            ("i1", "e2", 2024, 2.0),
+            ("i2", "e3", 2024, 3.0),
+        ]
+        frames = fetch_emission_data_many(db, ["i1", "i2", "i3"], "t1")
+        assert db.execute.call_count == 1
+        assert frames["i1"].id.tolist() == ["e1", "e2"]
+        assert frames["i2"].total.tolist() == [3.0]
+        assert len(frames["i3"]) == 0
+
+
+class TestFetchBalanceDataMany:
+    """fetch_balance_data_many runs one ANY() query and splits rows per installation."""
+
+    def test_splits_rows_per_installation(self) -> None:
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = ["installation_id", "id", "totalEmissions", "reportingYear"]
+        db.execute.return_value.fetchall.return_value = [("i1", "b1", 5.0, 2023), ("i2", "b2", 7.0, 2024)]
+        frames = fetch_balance_data_many(db, ["i1", "i2", "i3"], "t1")
+        assert db.execute.call_count == 1
+        assert isinstance(frames["i1"], BalanceFrame)
+        assert frames["i2"].id.tolist() == ["b2"]
+        assert len(frames["i3"]) == 0
+
+
+class _CopyCursor:
+    """psycopg2 cursor stand-in: copy_expert writes a fixed CSV export."""
+
+    def __init__(self, csv: str):
+        self.csv = csv
+        self.statements: list[str] = []
+        self.closed = False
+
+    def mogrify(self, sql: str, params: dict) -> bytes:
+        assert "%(installation_ids)s" in sql and "%(tenant_id)s" in sql and "::float8" in sql
+        return sql.encode()
+
+    def copy_expert(self, sql: str, file) -> None:
+        self.statements.append(sql)
+        file.write(self.csv.encode())
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _db_copying(csv: str) -> tuple[MagicMock, _CopyCursor]:
+    cursor = _CopyCursor(csv)
+    db = MagicMock()
+    db.connection.return_value.connection.cursor.return_value = cursor
+    return db, cursor
+
+
+class TestCopyDataMany:
+    """copy_*_data_many export the bulk queries with COPY and parse them into frames."""
+
+    EMISSIONS_CSV = (
+        "installation_id,id,createdAt,reportingYear,emission_type,aDValue,eFValue,"
+        "directEmissions,indirectEmissions,totalCo2Emissions\n"
+        "i1,e1,2024-01-01 00:00:00,2023,CO2,1.5,0.1,10.25,,12.75\n"
+        'i1,"e,2",2024-01-02 00:00:00,,,,,,,0\n'
+        "i2,e3,2024-01-03 00:00:00,2024,N2O,2,0.30000000000000004,1,2,3\n"
+    )
+
+    def test_emissions_split_per_installation(self) -> None:
+        db, cursor = _db_copying(self.EMISSIONS_CSV)
+        frames = copy_emission_data_many(db, ["i1", "i2", "i3"], "t1")
+        assert cursor.statements[0].startswith("COPY (") and "FORMAT csv" in cursor.statements[0]
+        assert cursor.closed
+        assert frames["i1"].id.tolist() == ["e1", "e,2"]
+        assert frames["i1"].year.tolist() == [2023, 0]
+        assert frames["i1"].emission_type.tolist() == ["CO2", None]
+        assert frames["i1"].created_at[0] == datetime(2024, 1, 1)
+        assert np.isnan(frames["i1"].indirect[0]) and frames["i1"].total.tolist() == [12.75, 0.0]
+        assert frames["i2"].ef_value.tolist() == [0.30000000000000004]
+        assert len(frames["i3"]) == 0
+
+    def test_matches_cursor_fetch(self) -> None:
+        db, _ = _db_copying(self.EMISSIONS_CSV)
+        copied = copy_emission_data_many(db, ["i1", "i2"], "t1")
+        rows = [line.split(",") for line in self.EMISSIONS_CSV.replace('"e,2"', "e2").splitlines()]
+        keys, rows = rows[0], [[v or None for v in row] for row in rows[1:]]
+        rows = [row[:3] + [int(row[3]) if row[3] else None, row[4]] + [float(v) if v else None for v in row[5:]] for row in rows]
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = keys
+        db.execute.return_value.fetchall.return_value = [tuple(row) for row in rows]
+        fetched = fetch_emission_data_many(db, ["i1", "i2"], "t1")
+        for iid in ("i1", "i2"):
+            assert copied[iid].yearly == fetched[iid].yearly
+            np.testing.assert_array_equal(copied[iid].total, fetched[iid].total)
+
+    def test_balances(self) -> None:
+        db, _ = _db_copying(
+            "installation_id,id,createdAt,reportingYear,directEmissions,indirectEmissions,totalEmissions\n"
+            "i2,b2,2024-01-01 00:00:00,2024,1,2,3\n"
+        )
+        frames = copy_balance_data_many(db, ["i1", "i2"], "t1")
+        assert isinstance(frames["i2"], BalanceFrame)
+        assert frames["i2"].total.tolist() == [3.0]
+        assert len(frames["i1"]) == 0
+
+    def test_empty_export(self) -> None:
+        db, _ = _db_copying("installation_id,id,createdAt,reportingYear,directEmissions,indirectEmissions,totalEmissions\n")
+        frames = copy_balance_data_many(db, ["i1"], "t1")
+        assert len(frames["i1"]) == 0
+
+
+class TestFetchTenantInstallationIds:
+    def test_returns_ids(self) -> None:
+        db = MagicMock()
+        db.execute.return_value.fetchall.return_value = [("i1",), ("i2",)]
+        assert fetch_tenant_installation_ids(db, "t1") == ["i1", "i2"]
+        assert db.execute.call_args[0][1] == {"tenant_id": "t1"}
+
+
+class TestFetchYearlyEmissions:
+    """Per-year sums are grouped in Postgres and split per installation."""
+
+    KEYS = ["installation_id", "year", "total", "count", "forecast_total", "forecast_count", "total_count"]
+
+    def _db(self, rows: list[tuple]) -> MagicMock:
+        db = MagicMock()
+        db.execute.return_value.keys.return_value = self.KEYS
+        db.execute.return_value.fetchall.return_value = rows
+        return db
+
+    def test_splits_aggregates_per_installation(self) -> None:
+        db = self._db([
+            ("i1", 2023, 10.0, 2, 10.0, 2, 2),
+            ("i1", 2024, 12.0, 3, 12.0, 3, 3),
+            ("i2", 2024, 7.0, 1, 7.0, 1, 1),
+        ])
+        yearly = fetch_yearly_emissions_many(db, ["i1", "i2", "i3"], "t1")
+        assert db.execute.call_count == 1
+        assert "GROUP BY" in str(db.execute.call_args[0][0])
+        assert yearly["i1"].forecast_series()[1].tolist() == [10.0, 12.0]
+        assert yearly["i1"].records == 5
+        assert yearly["i3"].records == 0
+
+    def test_single_installation(self) -> None:
+        yearly = fetch_yearly_emissions(self._db([("i1", 2024, 4.0, 1, 4.0, 1, 1)]), "i1", "t1")
+        assert yearly.years.tolist() == [2024]
+
+    def test_rollup_used_only_once_created(self, monkeypatch) -> None:
+        monkeypatch.setattr(database, "EMISSION_ROLLUP_ENABLED", True)
+        monkeypatch.setattr(database, "_rollup_ready", False)
+        db = self._db([])
+        fetch_yearly_emissions_many(db, ["i1"], "t1")
+        assert database.EMISSION_ROLLUP_VIEW not in str(db.execute.call_args[0][0])
+
+        monkeypatch.setattr(database, "_rollup_ready", True)
+        fetch_yearly_emissions_many(db, ["i1"], "t1")
+        sql = str(db.execute.call_args[0][0])
+        assert database.EMISSION_ROLLUP_VIEW in sql
+        assert "stale" in sql
+
+    def test_staleness_check_reads_no_emission_rows(self) -> None:
+        staleness = database._YEARLY_ROLLUP_QUERY.split("SELECT installation_id, year")[0]
+        # Only the latest updatedAt per InstallationData row, served by the (installationDataId, updatedAt) index
+        assert 'SELECT MAX(e."updatedAt") FROM "Emission" e WHERE e."installationDataId" = d.id' in staleness
+        assert "JOIN \"Emission\"" not in staleness and "COUNT(*)" not in staleness
+
+    def test_first_refresh_creates_the_staleness_index(self, monkeypatch) -> None:
+        monkeypatch.setattr(database, "_rollup_ready", False)
+        db = MagicMock()
+        db.execute.return_value.scalar.return_value = False
+        database.refresh_emission_rollup(db)
+        conn = db.get_bind.return_value.connect.return_value.execution_options.return_value.__enter__.return_value
+        assert db.get_bind.return_value.connect.return_value.execution_options.call_args.kwargs == {
+            "isolation_level": "AUTOCOMMIT"
+        }
+        assert "CREATE INDEX CONCURRENTLY IF NOT EXISTS" in str(conn.execute.call_args[0][0])
+        assert database._rollup_ready
+
+
+# ---------------------------------------------------------------------------
+# Async engine
+# ---------------------------------------------------------------------------
+
+class _FakeResult:
+    def __init__(self, keys: list[str], rows: list[tuple]):
+        self._keys, self._rows = keys, rows
+
+    def keys(self) -> list[str]:
+        return self._keys
+
+    def fetchone(self):
+        return MagicMock(_mapping=dict(zip(self._keys, self._rows[0]))) if self._rows else None
+
+    def fetchall(self) -> list[tuple]:
+        return self._rows
+
+    async def partitions(self, size: int):
+        for i in range(0, len(self._rows), size):
+            yield self._rows[i:i + size]
+
+
+class _FakeAsyncEngine:
+    """Answers by the table a query reads; records how many connections were open at once."""
+
+    def __init__(self, results: dict[str, _FakeResult]):
+        self.results = results
+        self.open = 0
+        self.peak = 0
+        self.streamed: list[dict] = []
+
+    def connect(self):
+        return _FakeConnection(self)
+
+
+class _FakeConnection:
+    def __init__(self, engine: _FakeAsyncEngine):
+        self.engine = engine
+
+    async def __aenter__(self):
+        self.engine.open += 1
+        self.engine.peak = max(self.engine.peak, self.engine.open)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.engine.open -= 1
+
+    async def execute(self, query, params=None) -> _FakeResult:
+        await asyncio.sleep(0.01)
+        return self._result(query)
+
+    async def stream(self, query, params=None) -> _FakeResult:
+        self.engine.streamed.append(query.get_execution_options())
+        await asyncio.sleep(0.01)
+        return self._result(query)
+
+    def _result(self, query) -> _FakeResult:
+        sql = str(query)
+        for table, result in self.engine.results.items():
+            if f'FROM "{table}"' in sql:
+                return result
+        raise AssertionError(f"unexpected query: {sql}")
+
+
+def _async_engine() -> _FakeAsyncEngine:
+    return _FakeAsyncEngine({
+        "Installation": _FakeResult(["id", "installation_name"], [("i1", "Plant")]),
+        "Emission": _FakeResult(["id", "reportingYear", "totalCo2Emissions"], [("e1", 2023, 1.0), ("e2", 2024, 2.0)]),
+        "GhgBalanceByType": _FakeResult(["id", "totalEmissions", "reportingYear"], [("b1", 5.0, 2023)]),
+    })
+
+
+class TestAfetchInstallationBundle:
+    """The async bundle runs one query per part, concurrently on separate connections."""
+
+    async def test_returns_requested_parts_as_frames(self) -> None:
+        engine = _async_engine()
+        bundle = await afetch_installation_bundle(engine, "i1", "t1", BUNDLE_PARTS)
+        assert bundle["installation"] == {"id": "i1", "installation_name": "Plant"}
+        assert isinstance(bundle["emissions"], EmissionFrame)
+        assert bundle["emissions"].total.tolist() == [1.0, 2.0]
+        assert bundle["balances"].id.tolist() == ["b1"]
+        assert BUNDLE_YEARLY not in bundle
+
+    async def test_parts_run_concurrently(self) -> None:
+        engine = _async_engine()
+        await afetch_installation_bundle(engine, "i1", "t1", BUNDLE_PARTS)
+        assert engine.peak == len(BUNDLE_PARTS)
+        assert engine.open == 0
+
+    async def test_frames_are_read_through_a_server_side_cursor(self) -> None:
+        engine = _async_engine()
+        await afetch_installation_bundle(engine, "i1", "t1", ("emissions",))
+        assert engine.streamed[0]["yield_per"] == database.ANOMALY_STREAM_CHUNK_ROWS
+
+    async def test_yearly_part(self) -> None:
+        engine = _async_engine()
+        engine.results["Emission"] = _FakeResult(
+            ["installation_id", "year", "direct", "indirect", "total", "count", "forecast_total", "forecast_count", "total_count"],
+            [("i1", 2023, 1.0, 0.0, 1.0, 2, 1.0, 2, 2)],
+        )
+        bundle = await afetch_installation_bundle(engine, "i1", "t1", ("installation", BUNDLE_YEARLY))
+        assert bundle[BUNDLE_YEARLY].years.tolist() == [2023]
+        assert bundle[BUNDLE_YEARLY].records == 2
+
+    async def test_unknown_installation(self) -> None:
+        engine = _async_engine()
+        engine.results["Installation"] = _FakeResult(["id"], [])
+        bundle = await afetch_installation_bundle(engine, "i9", "t1", ("installation",))
+        assert bundle == {"installation": None}
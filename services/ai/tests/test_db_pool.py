@@ -0,0 +1,109 @@
+"""Tests for db_pool.py (pool settings and instrumentation)."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+import db_pool
+from db_pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, engine_options, instrument_engine
+from metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_WAIT, DB_POOL_OVERFLOW, DB_POOL_PRE_PING
+
+
+def _observations(histogram, pool: str) -> float:
+    for sample in histogram.collect()[0].samples:
+        if sample.name.endswith("_count") and sample.labels.get("pool") == pool:
+            return sample.value
+    return 0.0
+
+
+def _gauge(gauge, pool: str) -> float:
+    return gauge.labels(pool=pool)._value.get()
+
+
+@pytest.fixture()
+def sqlite_engine(tmp_path, request):
+    name = request.node.name
+    options = {**engine_options(name), "pool_size": 1, "max_overflow": 1, "pool_pre_ping": True}
+    engine = instrument_engine(create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **options), name)
+    yield engine, name
+    engine.dispose()
+
+
+# ---------------------------------------------------------------------------
+# Settings
+# ---------------------------------------------------------------------------
+
+class TestEngineOptions:
+    """Pool settings come from config; the PgBouncer profile changes the asyncpg connect args."""
+
+    def test_defaults(self) -> None:
+        options = engine_options("sync")
+        assert options["poolclass"] is InstrumentedQueuePool
+        assert options["pool_logging_name"] == "sync"
+        assert options["pool_size"] == db_pool.DB_POOL_SIZE
+        assert "connect_args" not in options
+
+    def test_async_pool_class(self) -> None:
+        assert engine_options("async", async_driver=True)["poolclass"] is InstrumentedAsyncQueuePool
+
+    def test_pgbouncer_disables_prepared_statement_reuse(self, monkeypatch) -> None:
+        monkeypatch.setattr(db_pool, "DB_PGBOUNCER", True)
+        args = engine_options("async", async_driver=True)["connect_args"]
+        assert args["statement_cache_size"] == 0
+        assert args["prepared_statement_cache_size"] == 0
+        assert args["prepared_statement_name_func"]() != args["prepared_statement_name_func"]()
+        # psycopg2 does not prepare statements
+        assert "connect_args" not in engine_options("sync")
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+class TestInstrumentEngine:
+    """Checkout/checkin events drive the occupancy gauges; waits and pings are timed."""
+
+    def test_checked_out_gauge(self, sqlite_engine) -> None:
+        engine, name = sqlite_engine
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            assert _gauge(DB_POOL_CHECKED_OUT, name) == 1
+        assert _gauge(DB_POOL_CHECKED_OUT, name) == 0
+
+    def test_overflow_gauge(self, sqlite_engine) -> None:
+        engine, name = sqlite_engine
+        with engine.connect(), engine.connect():
+            assert _gauge(DB_POOL_CHECKED_OUT, name) == 2
+            assert _gauge(DB_POOL_OVERFLOW, name) == 1
+        assert _gauge(DB_POOL_OVERFLOW, name) == 0
+
+    def test_checkout_wait_recorded(self, sqlite_engine) -> None:
+        engine, name = sqlite_engine
+        for _ in range(3):
+            with engine.connect():
+                pass
+        assert _observations(DB_POOL_CHECKOUT_WAIT, name) == 3
+
+    def test_pre_ping_only_for_reused_connections(self, sqlite_engine) -> None:
+        engine, name = sqlite_engine
+        with engine.connect():
+            pass
+        assert _observations(DB_POOL_PRE_PING, name) == 0
+        with engine.connect():
+            pass
+        assert _observations(DB_POOL_PRE_PING, name) == 1
+
+    def test_survives_dispose(self, sqlite_engine) -> None:
+        engine, name = sqlite_engine
+        engine.dispose()
+        with engine.connect():
+            assert _gauge(DB_POOL_CHECKED_OUT, name) == 1
+        assert _observations(DB_POOL_CHECKOUT_WAIT, name) == 1
@@ -0,0 +1,83 @@
+"""Tests for executors.py (bounded execution layer)."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from executors import BoundedExecutor, ExecutorSaturatedError
+from metrics import EXECUTOR_WAIT_DURATION
+
+
+@pytest.fixture()
+def executor():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=1)
+    yield pool
+    pool.shutdown()
+
+
+class TestBoundedExecutor:
+    """Tests for BoundedExecutor."""
+
+    async def test_returns_function_result(self, executor: BoundedExecutor) -> None:
+        assert await executor.run(lambda a, b=0: a + b, 2, b=3) == 5
+
+    async def test_runs_off_the_event_loop_thread(self, executor: BoundedExecutor) -> None:
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run(threading.get_ident)
+        assert worker_thread != loop_thread
+
+    async def test_event_loop_stays_responsive(self, executor: BoundedExecutor) -> None:
+        task = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        assert time.perf_counter() - start < 0.15
+        await task
+
+    async def test_rejects_when_queue_full(self, executor: BoundedExecutor) -> None:
+        running = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        queued = asyncio.ensure_future(executor.run(time.sleep, 0.01))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(time.sleep, 0.01)
+        await asyncio.gather(running, queued)
+
+    async def test_exceptions_propagate_and_release_slot(self, executor: BoundedExecutor) -> None:
+        def boom() -> None:
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await executor.run(boom)
+        assert await executor.run(lambda: "ok") == "ok"
+
+    async def test_cancelled_queued_task_releases_its_slot(self, executor: BoundedExecutor) -> None:
+        running = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        queued = asyncio.ensure_future(executor.run(time.sleep, 0.01))
+        await asyncio.sleep(0.01)
+        assert executor.queued == 1
+        queued.cancel()  # the awaiting request went away before the task started
+        await asyncio.sleep(0.01)
+        assert executor.queued == 0
+        await running
+        # The queue has room again
+        assert await executor.run(lambda: "ok") == "ok"
+        assert executor.queued == 0
+
+    async def test_records_wait_time(self, executor: BoundedExecutor) -> None:
+        before = EXECUTOR_WAIT_DURATION.labels(pool="test")._sum.get()
+        await asyncio.gather(executor.run(time.sleep, 0.05), executor.run(lambda: None))
+        assert EXECUTOR_WAIT_DURATION.labels(pool="test")._sum.get() > before
+        assert executor.queued == 0
+
+    async def test_usable_after_shutdown(self, executor: BoundedExecutor) -> None:
+        executor.shutdown()
+        assert await executor.run(lambda: 1) == 1
@@ -0,0 +1,114 @@
+"""Tests for services/forecast_engine.py."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from services.forecast_engine import (
+    CLOSED_FORM_MODELS,
+    fit_damped_trend,
+    fit_ols,
+    fit_theil_sen,
+    forecast_closed_form,
+    stack_series,
+)
+
+
+def _ragged_batch():
+    return stack_series([
+        (np.array([2020, 2021, 2022, 2023, 2024]), np.array([100.0, 110.0, 120.0, 130.0, 140.0])),
+        (np.array([2022, 2023, 2024]), np.array([50.0, 45.0, 41.0])),
+        (np.array([2018, 2019, 2020, 2021, 2022, 2023, 2024]), np.array([10.0, 14.0, 13.0, 18.0, 17.0, 22.0, 21.0])),
+    ])
+
+
+# ---------------------------------------------------------------------------
+# stack_series
+# ---------------------------------------------------------------------------
+
+class TestStackSeries:
+    """Ragged series are left-aligned and masked."""
+
+    def test_shapes_and_mask(self) -> None:
+        batch = _ragged_batch()
+        assert batch.x.shape == (3, 7)
+        assert batch.n.tolist() == [5, 3, 7]
+        assert batch.last_x.tolist() == [2024.0, 2024.0, 2024.0]
+        assert not batch.mask[1, 3:].any()
+
+
+# ---------------------------------------------------------------------------
+# Fits
+# ---------------------------------------------------------------------------
+
+class TestFits:
+    """Batched fits agree with per-series reference implementations."""
+
+    def test_ols_matches_polyfit_per_series(self) -> None:
+        batch = _ragged_batch()
+        fit = fit_ols(batch)
+        for s in range(len(batch)):
+            x, y = batch.x[s, batch.mask[s]], batch.y[s, batch.mask[s]]
+            slope, intercept = np.polyfit(x, y, 1)
+            assert fit.slope[s] == pytest.approx(slope)
+            assert fit.intercept[s] == pytest.approx(intercept)
+            assert fit.resid_std[s] == pytest.approx(np.std(y - (intercept + slope * x)), abs=1e-6)
+
+    def test_perfect_line_has_unit_r2(self) -> None:
+        assert fit_ols(_ragged_batch()).r2[0] == pytest.approx(1.0)
+
+    def test_theil_sen_ignores_single_outlier(self) -> None:
+        x = np.array([2018.0, 2019, 2020, 2021, 2022, 2023, 2024])
+        y = np.array([100.0, 110.0, 120.0, 500.0, 140.0, 150.0, 160.0])
+        assert fit_theil_sen(stack_series([(x, y)])).slope[0] == pytest.approx(10.0)
+
+    def test_damped_trend_flattens_over_horizon(self) -> None:
+        x = np.array([2020.0, 2021, 2022, 2023, 2024])
+        y = np.array([100.0, 110.0, 120.0, 130.0, 140.0])
+        fit = fit_damped_trend(stack_series([(x, y)]))
+        assert 0 < fit.phi[0] < 1
+        assert fit.trend[0] > 0
+
+
+# ---------------------------------------------------------------------------
+# forecast_closed_form
+# ---------------------------------------------------------------------------
+
+class TestForecastClosedForm:
+    """Per-series model selection over a stacked batch."""
+
+    def test_batch_matches_individual_forecasts(self) -> None:
+        batch = _ragged_batch()
+        together = forecast_closed_form(batch, periods=3)
+        for s in range(len(batch)):
+            alone = forecast_closed_form(
+                stack_series([(batch.x[s, batch.mask[s]], batch.y[s, batch.mask[s]])]), periods=3
+            )
+            assert together.model_index[s] == alone.model_index[0]
+            np.testing.assert_allclose(together.mean[s], alone.mean[0])
+            np.testing.assert_allclose(together.half_width[s], alone.half_width[0])
+            np.testing.assert_allclose(together.cv_mae[s], alone.cv_mae[0])
+
+    def test_perfect_line_selects_ols(self) -> None:
+        result = forecast_closed_form(_ragged_batch(), periods=2)
+        assert CLOSED_FORM_MODELS[result.model_index[0]] == "OLS"
+        np.testing.assert_allclose(result.mean[0], [150.0, 160.0])
+        assert result.future_x[0].tolist() == [2025.0, 2026.0]
+
+    def test_many_series_in_one_call(self) -> None:
+        rng = np.random.default_rng(0)
+        series = [
+            (np.arange(2024 - n + 1, 2025), 100 + rng.normal(0, 5, n).cumsum())
+            for n in rng.integers(3, 10, size=500)
+        ]
+        result = forecast_closed_form(stack_series(series), periods=6)
+        assert result.mean.shape == (500, 6)
+        assert np.all(result.half_width >= 0)
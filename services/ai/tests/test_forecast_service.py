@@ -2,10 +2,13 @@
 
 from __future__ import annotations
 
+import json
 import sys
 from pathlib import Path
 from typing import Any
 
+from unittest.mock import patch
+
 import numpy as np
 import pytest
 
@@ -14,11 +17,17 @@ _SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
 if _SERVICE_ROOT not in sys.path:
     sys.path.insert(0, _SERVICE_ROOT)
 
+from services import bootstrap_executor
 from services.forecast_service import (
     _aggregate_by_year,
     _calculate_trend,
+    _closed_form_forecast,
     _linear_forecast,
+    _select_and_forecast,
     forecast_emissions,
+    forecast_emissions_batch,
+    forecast_from_model,
+    train_forecast_model,
 )
 
 
@@ -279,3 +288,120 @@ class TestLinearForecast:
         result = _linear_forecast(years, emissions, periods=3)
         for pred in result["predictions"]:
             assert pred["upper_bound"] >= pred["predicted"]
+
+
+# ---------------------------------------------------------------------------
+# Model selection and closed-form estimators
+# ---------------------------------------------------------------------------
+
+class TestModelSelection:
+    """Short series take the closed-form path, long ones XGBoost."""
+
+    def test_short_series_uses_closed_form(self) -> None:
+        years = np.array([2020, 2021, 2022, 2023, 2024])
+        emissions = np.array([100.0, 110.0, 120.0, 130.0, 140.0])
+        result = _select_and_forecast(years, emissions, periods=2)
+        assert result["model"] in ("OLS", "TheilSen", "DampedTrend")
+        assert result["confidence"]["method"] == "analytic"
+        assert "bootstrap" not in result
+
+    @patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1)
+    def test_long_series_uses_xgboost(self) -> None:
+        years = np.arange(2010, 2025)
+        emissions = 100.0 + 3.0 * np.arange(15)
+        result = _select_and_forecast(years, emissions, periods=2, bootstrap_samples=10, seed=1)
+        assert result["model"] == "XGBoost"
+
+    def test_forecast_emissions_reports_chosen_model(self, emission_data: list[dict[str, Any]]) -> None:
+        result = forecast_emissions(emission_data, periods=2)
+        assert result["model"] in ("OLS", "TheilSen", "DampedTrend")
+
+
+class TestClosedFormForecast:
+    """Tests for the closed-form fast path."""
+
+    def test_perfect_line_is_extrapolated(self) -> None:
+        years = np.array([2020, 2021, 2022, 2023, 2024])
+        emissions = np.array([100.0, 110.0, 120.0, 130.0, 140.0])
+        result = _closed_form_forecast(years, emissions, periods=2)
+        assert result["model"] == "OLS"
+        assert result["predictions"][0]["predicted"] == pytest.approx(150.0)
+        assert result["predictions"][1]["predicted"] == pytest.approx(160.0)
+        assert result["r2_score"] == pytest.approx(1.0)
+
+    def test_three_points_is_enough(self) -> None:
+        result = _closed_form_forecast(np.array([2022, 2023, 2024]), np.array([10.0, 12.0, 13.0]), periods=3)
+        assert len(result["predictions"]) == 3
+
+    def test_intervals_contain_prediction_and_widen(self) -> None:
+        years = np.array([2019, 2020, 2021, 2022, 2023, 2024])
+        emissions = np.array([100.0, 115.0, 108.0, 130.0, 126.0, 140.0])
+        preds = _closed_form_forecast(years, emissions, periods=4)["predictions"]
+        for p in preds:
+            assert p["lower_bound"] <= p["predicted"] <= p["upper_bound"]
+        widths = [p["upper_bound"] - p["lower_bound"] for p in preds]
+        assert widths == sorted(widths)
+
+
+class TestForecastEmissionsBatch:
+    """Tests for the vectorized multi-installation forecast."""
+
+    def test_matches_single_installation_forecast(self, emission_data: list[dict[str, Any]]) -> None:
+        data = {
+            "full": emission_data,
+            "short": emission_data[2:],
+            "none": [],
+        }
+        results, pending = forecast_emissions_batch(data, periods=3)
+        assert pending == []
+        assert results["none"]["status"] == "no_data"
+        for installation_id in ("full", "short"):
+            expected = forecast_emissions(data[installation_id], periods=3)
+            got = results[installation_id]
+            assert got["model"] == expected["model"]
+            assert got["trend"] == expected["trend"]
+            assert got["r2_score"] == pytest.approx(expected["r2_score"])
+            for g, e in zip(got["forecast"], expected["forecast"]):
+                assert g["year"] == e["year"]
+                assert g["predicted"] == pytest.approx(e["predicted"])
+                assert g["upper_bound"] == pytest.approx(e["upper_bound"])
+
+    def test_long_histories_left_pending(self) -> None:
+        long = [{"reportingYear": y, "totalCo2Emissions": 100.0 + y - 2010} for y in range(2010, 2025)]
+        results, pending = forecast_emissions_batch({"long": long}, periods=2)
+        assert results == {}
+        assert pending == ["long"]
+
+
+class TestStoredForecastModel:
+    """A trained model reproduces forecast_emissions for any horizon it covers."""
+
+    def _roundtrip(self, data: list[dict[str, Any]], periods: int, **kwargs: Any) -> tuple[dict, dict]:
+        model = json.loads(json.dumps(train_forecast_model(data, horizon=12, **kwargs)))
+        return forecast_from_model(model, periods), forecast_emissions(data, periods, **kwargs)
+
+    def test_closed_form_matches_direct_forecast(self, emission_data: list[dict[str, Any]]) -> None:
+        served, direct = self._roundtrip(emission_data, periods=4)
+        assert served["model"] == direct["model"]
+        assert served["forecast"] == pytest.approx(direct["forecast"])
+
+    def test_linear_fallback_matches_direct_forecast(self) -> None:
+        data = [{"reportingYear": y, "totalCo2Emissions": 100.0 + 2 * (y - 2010)} for y in range(2010, 2025)]
+        with patch("services.forecast_service._xgboost_forecast", side_effect=RuntimeError("no xgboost")):
+            served, direct = self._roundtrip(data, periods=3)
+        assert served["model"] == "LinearRegression"
+        assert served["forecast"] == direct["forecast"]
+
+    @patch.object(bootstrap_executor, "FORECAST_BOOTSTRAP_WORKERS", 1)
+    def test_xgboost_booster_matches_direct_forecast(self) -> None:
+        data = [{"reportingYear": y, "totalCo2Emissions": 100.0 + 3 * (y - 2010)} for y in range(2010, 2025)]
+        served, direct = self._roundtrip(data, periods=3, bootstrap_samples=10, seed=7)
+        assert served["model"] == "XGBoost"
+        assert served["forecast"] == pytest.approx(direct["forecast"])
+
+    def test_early_result_is_stored(self) -> None:
+        assert forecast_from_model(train_forecast_model([]), 3)["status"] == "no_data"
+
+    def test_periods_beyond_horizon_rejected(self, emission_data: list[dict[str, Any]]) -> None:
+        with pytest.raises(ValueError):
+            forecast_from_model(train_forecast_model(emission_data, horizon=2), 3)
@@ -0,0 +1,187 @@
+"""Tests for frames.py (columnar emission / balance containers)."""
+
+from __future__ import annotations
+
+import sys
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from frames import (
+    BalanceFrame,
+    EmissionFrame,
+    YearlyAggregate,
+    as_emission_frame,
+    as_yearly,
+    float_column,
+    timestamp_column,
+    year_column,
+)
+
+
+class TestColumnConversion:
+    """Tests for the column conversion helpers."""
+
+    def test_float_column_handles_none_decimal_and_strings(self) -> None:
+        col = float_column([1.5, None, Decimal("2.25"), "3"])
+        assert col.dtype == np.float64
+        assert col[0] == 1.5
+        assert np.isnan(col[1])
+        assert col[2] == 2.25
+        assert col[3] == 3.0
+
+    def test_float_column_invalid_string_is_nan(self) -> None:
+        col = float_column([1.0, "not-a-number"])
+        assert col[0] == 1.0
+        assert np.isnan(col[1])
+
+    def test_year_column_missing_is_zero(self) -> None:
+        assert year_column([2023, None, "2024", "bad"]).tolist() == [2023, 0, 2024, 0]
+
+    def test_timestamp_column_parses_iso_strings(self) -> None:
+        created = datetime(2024, 1, 2, 3, 4, 5, 123456)
+        col = timestamp_column([created, "2024-01-02T03:04:05.123456", "2024-01-02 03:04:05.123456", None, "bad"])
+        assert col.tolist() == [created, created, created, None, None]
+
+    def test_bundle_and_row_fetches_agree_on_created_at(self) -> None:
+        created = datetime(2024, 1, 2, 3, 4, 5)
+        # json_agg delivers timestamps as ISO strings; the cursor path as datetimes
+        bundled = EmissionFrame.from_columns({"id": ["e1"], "createdAt": ["2024-01-02T03:04:05"]})
+        fetched = EmissionFrame.from_rows([("e1", created)], ["id", "createdAt"])
+        assert bundled.row(0)["createdAt"] == fetched.row(0)["createdAt"] == created
+
+
+class TestEmissionFrame:
+    """Tests for EmissionFrame construction and yearly aggregation."""
+
+    def test_from_records_length(self, emission_data: list[dict[str, Any]]) -> None:
+        assert len(EmissionFrame.from_records(emission_data)) == 5
+
+    def test_from_records_tolerates_missing_keys(self) -> None:
+        frame = EmissionFrame.from_records([{"reportingYear": 2024, "totalCo2Emissions": 1.0}])
+        assert np.isnan(frame.direct[0])
+        assert frame.id[0] is None
+
+    def test_yearly_sums(self) -> None:
+        frame = EmissionFrame.from_records([
+            {"reportingYear": 2023, "totalCo2Emissions": 50.0, "directEmissions": 30.0, "indirectEmissions": 20.0},
+            {"reportingYear": 2023, "totalCo2Emissions": 70.0, "directEmissions": 50.0, "indirectEmissions": None},
+            {"reportingYear": 2024, "totalCo2Emissions": None, "directEmissions": 40.0},
+            {"reportingYear": None, "totalCo2Emissions": 99.0},
+        ])
+        agg = frame.yearly
+        assert agg.years.tolist() == [2023, 2024]
+        assert agg.total.tolist() == [120.0, 0.0]
+        assert agg.direct.tolist() == [80.0, 40.0]
+        assert agg.indirect.tolist() == [20.0, 0.0]
+        assert agg.count.tolist() == [2, 1]
+
+    def test_forecast_series_falls_back_to_direct(self) -> None:
+        frame = EmissionFrame.from_records([
+            {"reportingYear": 2023, "totalCo2Emissions": None, "directEmissions": 42.0},
+            {"reportingYear": 2024, "totalCo2Emissions": 0, "directEmissions": 0},
+        ])
+        years, totals = frame.yearly.forecast_series()
+        assert years.tolist() == [2023]
+        assert totals.tolist() == [42.0]
+
+    def test_total_series_skips_years_without_totals(self) -> None:
+        frame = EmissionFrame.from_records([
+            {"reportingYear": 2022, "totalCo2Emissions": 10.0},
+            {"reportingYear": 2023, "totalCo2Emissions": None, "directEmissions": 5.0},
+            {"reportingYear": 2024, "totalCo2Emissions": 30.0},
+        ])
+        years, totals = frame.yearly.total_series()
+        assert years.tolist() == [2022, 2024]
+        assert totals.tolist() == [10.0, 30.0]
+
+    def test_yearly_is_computed_once(self, emission_data: list[dict[str, Any]]) -> None:
+        frame = EmissionFrame.from_records(emission_data)
+        assert frame.yearly is frame.yearly
+
+    def test_empty_frame_yearly(self) -> None:
+        agg = EmissionFrame.from_records([]).yearly
+        assert len(agg) == 0
+        assert agg.forecast_series()[0].tolist() == []
+
+    def test_yearly_counts_records_without_valid_year(self) -> None:
+        agg = EmissionFrame.from_records([{"reportingYear": None, "totalCo2Emissions": 1.0}]).yearly
+        assert len(agg) == 0
+        assert agg.records == 1
+
+    def test_sql_aggregate_matches_frame_yearly(self, emission_data: list[dict[str, Any]]) -> None:
+        from decimal import Decimal
+
+        expected = EmissionFrame.from_records(emission_data + [{"reportingYear": None}]).yearly
+        # Rows as the per-year SQL aggregate returns them: unordered, Decimal sums, year 0 for missing years
+        columns = ["year", "direct", "indirect", "total", "count", "forecast_total", "forecast_count", "total_count"]
+        rows = [
+            (int(y), Decimal(str(d)), Decimal(str(i)), Decimal(str(t)), int(c), Decimal(str(f)), int(fc), int(tc))
+            for y, d, i, t, c, f, fc, tc in zip(*(getattr(expected, name).tolist() for name in (
+                "years", "direct", "indirect", "total", "count", "forecast_total", "forecast_count", "total_count"
+            )))
+        ][::-1] + [(0, None, None, None, 1, None, 0, 0)]
+        agg = YearlyAggregate.from_rows(rows, columns)
+        assert agg.years.tolist() == expected.years.tolist()
+        assert agg.forecast_total.tolist() == pytest.approx(expected.forecast_total.tolist())
+        assert agg.total_count.tolist() == expected.total_count.tolist()
+        assert agg.records == expected.records == len(emission_data) + 1
+
+    def test_as_yearly_accepts_aggregates_and_frames(self, emission_data: list[dict[str, Any]]) -> None:
+        frame = EmissionFrame.from_records(emission_data)
+        assert as_yearly(frame) is frame.yearly
+        assert as_yearly(frame.yearly) is frame.yearly
+        assert as_yearly(emission_data).years.tolist() == frame.yearly.years.tolist()
+
+    def test_row_round_trip(self, emission_data: list[dict[str, Any]]) -> None:
+        row = EmissionFrame.from_records(emission_data).row(0)
+        assert row["id"] == "e1"
+        assert row["reportingYear"] == 2020
+        assert row["totalCo2Emissions"] == pytest.approx(100.5)
+
+    def test_from_rows_matches_from_records(self) -> None:
+        keys = ["id", "reportingYear", "totalCo2Emissions"]
+        rows = [("e1", 2023, Decimal("10.5")), ("e2", 2024, Decimal("11.5"))]
+        frame = EmissionFrame.from_rows(rows, keys)
+        assert frame.total.tolist() == [10.5, 11.5]
+        assert frame.year.tolist() == [2023, 2024]
+
+    def test_concat_matches_single_frame(self, emission_data: list[dict[str, Any]]) -> None:
+        whole = EmissionFrame.from_records(emission_data)
+        joined = EmissionFrame.concat(EmissionFrame.from_records(emission_data[i:i + 2]) for i in range(0, 5, 2))
+        assert joined.id.tolist() == whole.id.tolist()
+        assert joined.year.dtype == np.int64
+        assert joined.total.tolist() == whole.total.tolist()
+        assert joined.yearly.forecast_total.tolist() == whole.yearly.forecast_total.tolist()
+
+    def test_concat_empty(self) -> None:
+        assert len(EmissionFrame.concat([])) == 0
+
+    def test_as_emission_frame_passes_frames_through(self, emission_data: list[dict[str, Any]]) -> None:
+        frame = EmissionFrame.from_records(emission_data)
+        assert as_emission_frame(frame) is frame
+        assert len(as_emission_frame(None)) == 0
+
+
+class TestBalanceFrame:
+    """Tests for BalanceFrame."""
+
+    def test_from_records(self, balance_data: list[dict[str, Any]]) -> None:
+        frame = BalanceFrame.from_records(balance_data)
+        assert len(frame) == 5
+        assert frame.total.tolist()[0] == 100.0
+
+    def test_from_columns_empty(self) -> None:
+        assert len(BalanceFrame.from_columns(None)) == 0
+
+    def test_concat(self, balance_data: list[dict[str, Any]]) -> None:
+        joined = BalanceFrame.concat([BalanceFrame.from_records(balance_data[:2]), BalanceFrame.from_records(balance_data[2:])])
+        assert joined.total.tolist() == BalanceFrame.from_records(balance_data).total.tolist()
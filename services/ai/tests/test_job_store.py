@@ -0,0 +1,146 @@
+"""Tests for job_store.py (background job state shared across workers)."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from job_store import JobStore, JobStoreUnavailableError
+
+
+class FakePipeline:
+    """Minimal stand-in for a redis.asyncio transaction pipeline."""
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands: list[tuple] = []
+
+    async def __aenter__(self) -> FakePipeline:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    def hset(self, key: str, mapping: dict[str, str]) -> None:
+        self.commands.append(("hset", key, mapping))
+
+    def expire(self, key: str, seconds: int) -> None:
+        self.commands.append(("expire", key, seconds))
+
+    async def execute(self) -> None:
+        if self.redis.fail:
+            raise ConnectionError("redis down")
+        for command, key, arg in self.commands:
+            if command == "hset":
+                self.redis.hashes.setdefault(key, {}).update({k.encode(): v.encode() for k, v in arg.items()})
+            elif key in self.redis.hashes:
+                self.redis.ttls[key] = arg
+
+
+class FakeRedis:
+    """Minimal stand-in for redis.asyncio.Redis (bytes in, bytes out)."""
+
+    def __init__(self, fail: bool = False):
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+        self.ttls: dict[str, int] = {}
+        self.fail = fail
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        assert transaction
+        return FakePipeline(self)
+
+    async def hgetall(self, key: str) -> dict[bytes, bytes]:
+        if self.fail:
+            raise ConnectionError("redis down")
+        return dict(self.hashes.get(key, {}))
+
+    async def hget(self, key: str, field: str) -> bytes | None:
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.hashes.get(key, {}).get(field.encode())
+
+
+def _redis_store(redis: FakeRedis, ttl: int = 60) -> JobStore:
+    store = JobStore("scans", ttl, backend="redis", redis_url="redis://fake")
+    store._client = lambda: redis
+    return store
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request) -> JobStore:
+    if request.param == "memory":
+        return JobStore("scans", 60, backend="memory")
+    return _redis_store(FakeRedis())
+
+
+# ---------------------------------------------------------------------------
+# Fields and results
+# ---------------------------------------------------------------------------
+
+
+class TestJobStore:
+    """Job fields merge across writes; item results accumulate."""
+
+    async def test_roundtrip(self, store: JobStore) -> None:
+        await store.save("j1", {"status": "running", "processed": 0, "ids": ["a", "b"]})
+        await store.save("j1", {"processed": 1}, {"a": {"status": "success", "summary": {"n": 1}}})
+        await store.save("j1", {"status": "completed", "processed": 2}, {"b": {"status": "no_data", "summary": None}})
+
+        assert await store.load("j1") == {"status": "completed", "processed": 2, "ids": ["a", "b"]}
+        assert await store.load_results("j1") == {
+            "a": {"status": "success", "summary": {"n": 1}},
+            "b": {"status": "no_data", "summary": None},
+        }
+        assert await store.load_result("j1", "b") == {"status": "no_data", "summary": None}
+
+    async def test_unknown_job(self, store: JobStore) -> None:
+        assert await store.load("missing") is None
+        assert await store.load_results("missing") == {}
+        assert await store.load_result("missing", "a") is None
+
+    async def test_keys_are_scoped_by_kind(self) -> None:
+        redis = FakeRedis()
+        scans = _redis_store(redis)
+        narratives = JobStore("narratives", 60, backend="redis")
+        narratives._client = lambda: redis
+        await scans.save("j1", {"status": "running"})
+        assert await narratives.load("j1") is None
+        assert "ai:jobs:scans:j1" in redis.hashes
+
+
+# ---------------------------------------------------------------------------
+# Expiry and failures
+# ---------------------------------------------------------------------------
+
+
+class TestJobStoreExpiry:
+    """Both keys expire `ttl` seconds after the job's last write."""
+
+    async def test_redis_writes_restart_the_ttl(self) -> None:
+        redis = FakeRedis()
+        store = _redis_store(redis, ttl=90)
+        await store.save("j1", {"status": "running"}, {"a": {"status": "success"}})
+        assert redis.ttls == {"ai:jobs:scans:j1": 90, "ai:jobs:scans:j1:results": 90}
+
+    async def test_memory_entries_expire(self) -> None:
+        store = JobStore("scans", 0, backend="memory")
+        await store.save("j1", {"status": "running"}, {"a": {"status": "success"}})
+        await asyncio.sleep(0.01)
+        assert await store.load("j1") is None
+        assert await store.load_results("j1") == {}
+
+    async def test_backend_errors_are_raised(self) -> None:
+        store = _redis_store(FakeRedis(fail=True))
+        with pytest.raises(JobStoreUnavailableError):
+            await store.save("j1", {"status": "running"})
+        with pytest.raises(JobStoreUnavailableError):
+            await store.load("j1")
+        with pytest.raises(JobStoreUnavailableError):
+            await store.load_result("j1", "a")
@@ -0,0 +1,487 @@
+"""Tests for llm_client.py against a local stub of the provider HTTP APIs."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+import services.narrative_service as narrative_service
+from llm_client import CircuitBreaker, CircuitOpenError, LLMClientPool, LLMProvider
+
+
+class _StubState:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0.0
+        self.status = 200
+        self.chunks = ["stub", " narrative"]
+        self.chunk_delay = 0.0
+        self.fail_mid_stream = False
+        self.lock = threading.Lock()
+
+
+def _anthropic_body(text: str) -> dict:
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-stub",
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": 10, "output_tokens": 5},
+    }
+
+
+def _openai_body(text: str) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-stub",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+def _anthropic_events(state: _StubState):
+    message = _anthropic_body("") | {"content": [], "stop_reason": None}
+    yield "message_start", {"type": "message_start", "message": message}
+    yield "content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+    for i, text in enumerate(state.chunks):
+        if state.fail_mid_stream and i:
+            yield "error", {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}
+            return
+        time.sleep(state.chunk_delay)
+        yield "content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}}
+    yield "content_block_stop", {"type": "content_block_stop", "index": 0}
+    yield "message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 5}}
+    yield "message_stop", {"type": "message_stop"}
+
+
+def _openai_events(state: _StubState):
+    base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": "gpt-stub"}
+    for text in state.chunks:
+        time.sleep(state.chunk_delay)
+        yield None, base | {"choices": [{"index": 0, "delta": {"role": "assistant", "content": text}, "finish_reason": None}]}
+    yield None, base | {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+
+@pytest.fixture()
+def stub_server():
+    """Serve /v1/messages (Anthropic) and /v1/chat/completions (OpenAI) on localhost."""
+    state = _StubState()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            with state.lock:
+                state.hits += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                time.sleep(state.delay)
+                if request.get("stream") and state.status == 200:
+                    self._stream(_anthropic_events(state) if self.path.endswith("/messages") else _openai_events(state))
+                    return
+                if state.status != 200:
+                    payload = {"type": "error", "error": {"type": "api_error", "message": "stub failure"}}
+                elif self.path.endswith("/messages"):
+                    payload = _anthropic_body("stub narrative")
+                else:
+                    payload = _openai_body("stub narrative")
+                body = json.dumps(payload).encode()
+                self.send_response(state.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up (timeout tests)
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def _stream(self, events) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for event, data in events:
+                prefix = f"event: {event}\n" if event else ""
+                self.wfile.write(f"{prefix}data: {json.dumps(data)}\n\n".encode())
+                self.wfile.flush()
+            if not self.path.endswith("/messages"):
+                self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def _anthropic_factory(url: str):
+    def factory():
+        from langchain_anthropic import ChatAnthropic
+
+        return ChatAnthropic(model="claude-stub", api_key="test", base_url=url, max_retries=0)
+
+    return factory
+
+
+def _openai_factory(url: str):
+    def factory():
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model="gpt-stub", api_key="test", base_url=f"{url}/v1", max_retries=0)
+
+    return factory
+
+
+# ---------------------------------------------------------------------------
+# LLMProvider - calls through the stub server
+# ---------------------------------------------------------------------------
+
+class TestLLMProvider:
+    """Providers reuse one client, bound concurrency and time out hard."""
+
+    async def test_anthropic_completion(self, stub_server: _StubState) -> None:
+        provider = LLMProvider("claude", _anthropic_factory(stub_server.url))
+        assert await provider.ainvoke("system", "user") == "stub narrative"
+
+    async def test_openai_completion(self, stub_server: _StubState) -> None:
+        provider = LLMProvider("gpt-4", _openai_factory(stub_server.url))
+        assert await provider.ainvoke("system", "user") == "stub narrative"
+
+    async def test_client_reused_across_calls(self, stub_server: _StubState) -> None:
+        created = []
+
+        def factory():
+            created.append(1)
+            return _anthropic_factory(stub_server.url)()
+
+        provider = LLMProvider("claude", factory)
+        for _ in range(3):
+            await provider.ainvoke("system", "user")
+        assert len(created) == 1
+        assert stub_server.hits == 3
+
+    async def test_concurrency_is_bounded(self, stub_server: _StubState) -> None:
+        stub_server.delay = 0.05
+        provider = LLMProvider("claude", _anthropic_factory(stub_server.url), max_concurrency=2)
+        await asyncio.gather(*(provider.ainvoke("system", "user") for _ in range(6)))
+        assert stub_server.hits == 6
+        assert stub_server.max_in_flight == 2
+
+    async def test_timeout_is_enforced(self, stub_server: _StubState) -> None:
+        stub_server.delay = 0.5
+        provider = LLMProvider("claude", _anthropic_factory(stub_server.url), timeout=0.05)
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            await provider.ainvoke("system", "user")
+        assert time.perf_counter() - start < 0.4
+
+    async def test_breaker_opens_after_consecutive_failures(self, stub_server: _StubState) -> None:
+        stub_server.status = 500
+        breaker = CircuitBreaker("claude", failures=2, reset_seconds=60)
+        provider = LLMProvider("claude", _anthropic_factory(stub_server.url), breaker=breaker)
+        for _ in range(2):
+            with pytest.raises(Exception):
+                await provider.ainvoke("system", "user")
+        with pytest.raises(CircuitOpenError):
+            await provider.ainvoke("system", "user")
+        assert stub_server.hits == 2
+
+
+# ---------------------------------------------------------------------------
+# LLMProvider.astream - token streaming
+# ---------------------------------------------------------------------------
+
+class TestLLMProviderStream:
+    """astream yields text as the provider sends it, under the same guards."""
+
+    async def test_anthropic_stream(self, stub_server: _StubState) -> None:
+        provider = LLMProvider("claude", _anthropic_factory(stub_server.url))
+        assert [text async for text in provider.astream("system", "user")] == ["stub", " narrative"]
+
+    async def test_openai_stream(self, stub_server: _StubState) -> None:
+        provider = LLMProvider("gpt-4", _openai_factory(stub_server.url))
+        assert "".join([text async for text in provider.astream("system", "user")]) == "stub narrative"
+
+    async def test_timeout_bounds_whole_stream(self, stub_server: _StubState) -> None:
+        stub_server.chunks = ["a", "b", "c", "d", "e", "f"]
+        stub_server.chunk_delay = 0.3
+        provider = LLMProvider("claude", _anthropic_factory(stub_server.url), timeout=1.0)
+        received = []
+        with pytest.raises(TimeoutError):
+            async for text in provider.astream("system", "user"):
+                received.append(text)
+        assert 0 < len(received) < 6
+        assert provider.breaker._consecutive == 1
+
+    async def test_consumer_close_does_not_count_as_failure(self, stub_server: _StubState) -> None:
+        provider = LLMProvider("claude", _anthropic_factory(stub_server.url))
+        stream = provider.astream("system", "user")
+        assert await anext(stream) == "stub"
+        await stream.aclose()
+        assert provider.breaker._consecutive == 0
+        assert provider._slots._value == provider.max_concurrency
+
+
+# ---------------------------------------------------------------------------
+# Narrative cache - completions keyed on model + prompt
+# ---------------------------------------------------------------------------
+
+class TestNarrativeCache:
+    """Identical prompts are answered from the cache without another completion."""
+
+    async def _generate(self, pool: LLMClientPool, emission_data, installation_info, **kwargs) -> dict:
+        with patch.object(narrative_service, "llm_clients", pool), \
+                patch.object(narrative_service, "ANTHROPIC_API_KEY", "test"), \
+                patch.object(narrative_service, "OPENAI_API_KEY", ""):
+            return await narrative_service.agenerate_narrative(installation_info, emission_data, [], **kwargs)
+
+    async def test_identical_prompt_is_served_from_cache(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        first = await self._generate(pool, emission_data, installation_info)
+        second = await self._generate(pool, emission_data, installation_info)
+        assert first["cached"] is False and second["cached"] is True
+        assert first["narrative"] == second["narrative"] == "stub narrative"
+        assert stub_server.hits == 1
+
+    async def test_changed_prompt_misses_cache(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        await self._generate(pool, emission_data, installation_info, language="tr")
+        await self._generate(pool, emission_data, installation_info, language="en")
+        await self._generate(pool, emission_data[:-1], installation_info, language="en")
+        assert stub_server.hits == 3
+
+    async def test_cache_hit_bypasses_open_circuit(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        await self._generate(pool, emission_data, installation_info)
+        pool.providers["claude"].breaker._opened_at = time.monotonic()
+        result = await self._generate(pool, emission_data, installation_info)
+        assert result["model"] == "claude" and result["cached"] is True
+        assert stub_server.hits == 1
+
+
+# ---------------------------------------------------------------------------
+# agenerate_narratives - several languages from one context
+# ---------------------------------------------------------------------------
+
+class TestMultiLanguageNarratives:
+    """Languages share one prepared context and run their completions concurrently."""
+
+    async def test_languages_generated_concurrently(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        stub_server.delay = 0.3
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        prepare = narrative_service._prepare_context
+        calls = []
+        with patch.object(narrative_service, "llm_clients", pool), \
+                patch.object(narrative_service, "ANTHROPIC_API_KEY", "test"), \
+                patch.object(narrative_service, "_prepare_context", lambda *a: calls.append(1) or prepare(*a)):
+            start = time.perf_counter()
+            results = await narrative_service.agenerate_narratives(
+                installation_info, emission_data, [], languages=["tr", "en", "de"]
+            )
+            elapsed = time.perf_counter() - start
+        assert [r["language"] for r in results] == ["tr", "en", "de"]
+        assert all(r["model"] == "claude" for r in results)
+        assert len(calls) == 1
+        assert stub_server.max_in_flight == 3
+        assert elapsed < 0.8  # about one round-trip, not three
+
+
+# ---------------------------------------------------------------------------
+# CircuitBreaker - state transitions
+# ---------------------------------------------------------------------------
+
+class TestCircuitBreaker:
+    """Closed -> open after N failures -> one half-open trial after the reset window."""
+
+    def test_success_resets_failure_count(self) -> None:
+        breaker = CircuitBreaker("p", failures=2, reset_seconds=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert not breaker.is_open
+
+    def test_half_open_allows_single_trial(self) -> None:
+        breaker = CircuitBreaker("p", failures=1, reset_seconds=0)
+        breaker.record_failure()
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.allow()
+
+    def test_failed_trial_reopens(self) -> None:
+        breaker = CircuitBreaker("p", failures=1, reset_seconds=60)
+        breaker.record_failure()
+        breaker._opened_at -= 61
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+
+# ---------------------------------------------------------------------------
+# agenerate_narrative - provider fallback
+# ---------------------------------------------------------------------------
+
+class TestNarrativeFallback:
+    """Narratives fall back to the next provider, then to the template."""
+
+    async def test_uses_llm_when_available(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url), "gpt-4": _openai_factory(stub_server.url)})
+        with patch.object(narrative_service, "llm_clients", pool), \
+                patch.object(narrative_service, "ANTHROPIC_API_KEY", "test"):
+            result = await narrative_service.agenerate_narrative(installation_info, emission_data, [])
+        assert result["model"] == "claude"
+        assert result["narrative"] == "stub narrative"
+
+    async def test_open_circuit_falls_back_to_template(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        stub_server.status = 500
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        pool.providers["claude"].breaker = CircuitBreaker("claude", failures=1, reset_seconds=60)
+        with patch.object(narrative_service, "llm_clients", pool), \
+                patch.object(narrative_service, "ANTHROPIC_API_KEY", "test"), \
+                patch.object(narrative_service, "OPENAI_API_KEY", ""):
+            first = await narrative_service.agenerate_narrative(installation_info, emission_data, [])
+            second = await narrative_service.agenerate_narrative(installation_info, emission_data, [])
+        assert first["model"] == second["model"] == "template"
+        assert len(second["narrative"]) > 0
+        # The open breaker skips the provider without another round-trip
+        assert stub_server.hits == 1
+
+
+class TestNarrativeStream:
+    """astream_narrative streams LLM text, or template sections when no provider answers."""
+
+    @staticmethod
+    async def _events(pool: LLMClientPool, emission_data, installation_info) -> list[dict]:
+        with patch.object(narrative_service, "llm_clients", pool), \
+                patch.object(narrative_service, "ANTHROPIC_API_KEY", "test"), \
+                patch.object(narrative_service, "OPENAI_API_KEY", ""):
+            return [e async for e in narrative_service.astream_narrative(installation_info, emission_data, [], language="en")]
+
+    async def test_streams_llm_text(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        events = await self._events(pool, emission_data, installation_info)
+        assert [e["text"] for e in events[:-1]] == ["stub", " narrative"]
+        assert events[-1] == {
+            "type": "done", "status": "success", "message": "Rapor AI ile olusturuldu",
+            "model": "claude", "cached": False, "language": "en", "report_type": "summary",
+        }
+
+    async def test_failure_before_first_token_falls_back_to_template(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        stub_server.status = 500
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        events = await self._events(pool, emission_data, installation_info)
+        assert events[-1]["model"] == "template"
+        context = narrative_service._prepare_context(installation_info, emission_data, [])
+        assert "".join(e["text"] for e in events[:-1]) == narrative_service._generate_template(context, "summary", "en")
+
+    async def test_failure_mid_stream_ends_with_error(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        stub_server.fail_mid_stream = True
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        events = await self._events(pool, emission_data, installation_info)
+        assert [e["type"] for e in events] == ["text", "done"]
+        assert events[-1]["status"] == "error"
+        assert events[-1]["model"] == "claude"
+
+    async def test_streamed_text_is_cached(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        await self._events(pool, emission_data, installation_info)
+        events = await self._events(pool, emission_data, installation_info)
+        assert events == [
+            {"type": "text", "text": "stub narrative"},
+            {"type": "done", "status": "success", "message": "Rapor AI ile olusturuldu",
+             "model": "claude", "cached": True, "language": "en", "report_type": "summary"},
+        ]
+        assert stub_server.hits == 1
+
+    async def test_interrupted_stream_is_not_cached(
+        self,
+        stub_server: _StubState,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        stub_server.fail_mid_stream = True
+        pool = LLMClientPool({"claude": _anthropic_factory(stub_server.url)})
+        await self._events(pool, emission_data, installation_info)
+        stub_server.fail_mid_stream = False
+        events = await self._events(pool, emission_data, installation_info)
+        assert events[-1]["cached"] is False
+        assert stub_server.hits == 2
@@ -0,0 +1,86 @@
+"""Tests for model_store.py (fingerprint-checked fitted-model store)."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from model_store import ModelStore, forecast_fingerprint
+
+
+class FakeRedis:
+    """Minimal stand-in for redis.Redis."""
+
+    def __init__(self, fail: bool = False):
+        self.store: dict[str, str] = {}
+        self.fail = fail
+
+    def get(self, key: str):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.store.get(key)
+
+    def set(self, key: str, value: str, ex: int | None = None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.store[key] = value
+
+
+MODEL = {"version": 1, "model": "OLS", "params": {"slope": 2.0}}
+PARAMS = {"bootstrap_samples": None, "seed": 1}
+FINGERPRINT = {"emission_count": 5, "emission_max_created": "2024-01-01"}
+
+
+def _redis_store(redis: FakeRedis) -> ModelStore:
+    store = ModelStore("test", backend="redis", redis_url="redis://fake")
+    store._client = lambda: redis
+    return store
+
+
+class TestModelStore:
+    """Stored models are returned only for the fingerprint they were trained on."""
+
+    def test_disk_roundtrip(self, tmp_path: Path) -> None:
+        store = ModelStore("test", backend="disk", directory=str(tmp_path))
+        store.put("t1", "inst-1", PARAMS, FINGERPRINT, MODEL)
+        assert store.get("t1", "inst-1", PARAMS, FINGERPRINT) == MODEL
+        assert list(tmp_path.rglob("*.tmp")) == []
+
+    def test_redis_roundtrip(self) -> None:
+        store = _redis_store(FakeRedis())
+        store.put("t1", "inst-1", PARAMS, FINGERPRINT, MODEL)
+        assert store.get("t1", "inst-1", PARAMS, FINGERPRINT) == MODEL
+
+    def test_changed_fingerprint_is_stale(self, tmp_path: Path) -> None:
+        store = ModelStore("test", backend="disk", directory=str(tmp_path))
+        store.put("t1", "inst-1", PARAMS, FINGERPRINT, MODEL)
+        assert store.get("t1", "inst-1", PARAMS, {**FINGERPRINT, "emission_count": 6}) is None
+
+    def test_balance_changes_keep_forecast_models(self, tmp_path: Path) -> None:
+        store = ModelStore("test", backend="disk", directory=str(tmp_path))
+        fingerprint = {**FINGERPRINT, "balance_count": 3, "balance_max_created": "2024-01-01"}
+        store.put("t1", "inst-1", PARAMS, forecast_fingerprint(fingerprint), MODEL)
+        edited = {**fingerprint, "balance_count": 4, "balance_max_created": "2024-02-01"}
+        assert store.get("t1", "inst-1", PARAMS, forecast_fingerprint(edited)) == MODEL
+        assert store.get("t1", "inst-1", PARAMS, forecast_fingerprint({**edited, "emission_count": 6})) is None
+
+    def test_entries_are_scoped_by_tenant_and_params(self, tmp_path: Path) -> None:
+        store = ModelStore("test", backend="disk", directory=str(tmp_path))
+        store.put("t1", "inst-1", PARAMS, FINGERPRINT, MODEL)
+        assert store.get("t2", "inst-1", PARAMS, FINGERPRINT) is None
+        assert store.get("t1", "inst-1", {**PARAMS, "seed": 2}, FINGERPRINT) is None
+
+    def test_backend_errors_are_swallowed(self) -> None:
+        store = _redis_store(FakeRedis(fail=True))
+        store.put("t1", "inst-1", PARAMS, FINGERPRINT, MODEL)
+        assert store.get("t1", "inst-1", PARAMS, FINGERPRINT) is None
+
+    def test_off_backend_disables_store(self) -> None:
+        store = ModelStore("test", backend="off")
+        assert not store.enabled
+        store.put("t1", "inst-1", PARAMS, FINGERPRINT, MODEL)
+        assert store.get("t1", "inst-1", PARAMS, FINGERPRINT) is None
@@ -0,0 +1,213 @@
+"""Tests for narrative_jobs.py (bulk report narrative jobs)."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+import narrative_jobs
+import services.narrative_service as narrative_service
+from frames import BalanceFrame, EmissionFrame
+from job_store import JobStore
+from narrative_jobs import NarrativeJobManager, RateLimiter
+
+
+class FakeLLMPool:
+    """Stands in for llm_clients; answers every prompt and counts the calls."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def ainvoke(self, model: str, system_prompt: str, user_prompt: str) -> str:
+        self.calls += 1
+        return f"llm narrative {self.calls}"
+
+
+@pytest.fixture()
+def fake_db(monkeypatch, emission_data: list[dict[str, Any]], balance_data: list[dict[str, Any]]) -> dict:
+    """Patch the bulk fetches; returns a dict recording the batches that were loaded."""
+    calls: dict[str, list] = {"installations": [], "yearly": [], "balances": []}
+
+    def _installations(db, ids, tid):
+        calls["installations"].append(list(ids))
+        return {iid: None if iid == "missing" else {"installation_name": f"Plant {iid}"} for iid in ids}
+
+    def _yearly(db, ids, tid):
+        calls["yearly"].append(list(ids))
+        return {iid: EmissionFrame.from_records(emission_data if iid != "empty" else []).yearly for iid in ids}
+
+    def _balances(db, ids, tid):
+        calls["balances"].append(list(ids))
+        return {iid: BalanceFrame.from_records(balance_data if iid != "empty" else []) for iid in ids}
+
+    monkeypatch.setattr(narrative_jobs, "SessionLocal", MagicMock)
+    monkeypatch.setattr(narrative_jobs, "fetch_installation_summary_many", _installations)
+    monkeypatch.setattr(narrative_jobs, "fetch_yearly_emissions_many", _yearly)
+    monkeypatch.setattr(narrative_jobs, "fetch_balance_data_many", _balances)
+    return calls
+
+
+@pytest.fixture()
+def fake_llm(monkeypatch) -> FakeLLMPool:
+    pool = FakeLLMPool()
+    monkeypatch.setattr(narrative_service, "llm_clients", pool)
+    monkeypatch.setattr(narrative_service, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(narrative_service, "OPENAI_API_KEY", "")
+    return pool
+
+
+async def _wait(manager: NarrativeJobManager, job_id: str, tenant_id: str = "t1"):
+    for _ in range(500):
+        job = await manager.get(job_id, tenant_id)
+        if job.finished:
+            job.results = await manager.store.load_results(job_id)
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("narrative job did not finish")
+
+
+class TestNarrativeJobManager:
+    """Jobs narrate installations in bulk batches under a shared LLM rate limit and budget."""
+
+    async def test_narrates_all_installations_in_batches(self, fake_db: dict, fake_llm: FakeLLMPool) -> None:
+        manager = NarrativeJobManager(batch_size=2, llm_rate=0)
+        ids = [f"inst-{i}" for i in range(5)]
+        job = await _wait(manager, (await manager.submit("t1", ids, languages=["tr", "en"])).id)
+        assert job.status == "completed"
+        assert job.total == job.processed == 5
+        item = job.results["inst-3"]
+        assert item["status"] == "success"
+        assert [n["language"] for n in item["narratives"]] == ["tr", "en"]
+        assert all(n["model"] == "claude" for n in item["narratives"])
+        assert job.llm_calls == fake_llm.calls == 10
+        # One query per data set per batch
+        assert fake_db["installations"] == [["inst-0", "inst-1"], ["inst-2", "inst-3"], ["inst-4"]]
+        assert fake_db["yearly"] == fake_db["balances"] == fake_db["installations"]
+
+    async def test_over_budget_uses_template(self, fake_db: dict, fake_llm: FakeLLMPool) -> None:
+        manager = NarrativeJobManager(llm_rate=0, llm_budget=3)
+        job = await _wait(manager, (await manager.submit("t1", ["a", "b"], languages=["tr", "en", "de"])).id)
+        models = [n["model"] for item in job.results.values() for n in item["narratives"]]
+        assert models.count("claude") == 3
+        assert models.count("template") == job.template_narratives == 3
+        assert job.llm_calls == fake_llm.calls == 3
+        messages = {n["message"] for item in job.results.values() for n in item["narratives"] if n["model"] == "template"}
+        assert messages == {"Rapor sablon tabanli olusturuldu (AI cagri butcesi tukendi)"}
+
+    async def test_cache_hits_do_not_use_budget(self, fake_db: dict, fake_llm: FakeLLMPool) -> None:
+        manager = NarrativeJobManager(llm_rate=0)
+        await _wait(manager, (await manager.submit("t1", ["a"])).id)
+        job = await _wait(manager, (await manager.submit("t1", ["a"])).id)
+        assert job.llm_calls == 0
+        assert job.results["a"]["narratives"][0]["cached"] is True
+
+    async def test_unknown_and_empty_installations(self, fake_db: dict, fake_llm: FakeLLMPool) -> None:
+        manager = NarrativeJobManager(llm_rate=0)
+        job = await _wait(manager, (await manager.submit("t1", ["missing", "empty", "missing"])).id)
+        assert job.total == 2
+        assert job.results["missing"] == {"status": "not_found", "narratives": []}
+        assert job.results["empty"]["status"] == "no_data"
+        assert job.failed == 1
+        assert fake_llm.calls == 0
+
+    async def test_item_error_does_not_fail_job(self, fake_db: dict, monkeypatch) -> None:
+        async def _fail(*args, **kwargs):
+            raise ValueError("boom")
+
+        monkeypatch.setattr(narrative_jobs, "agenerate_narratives", _fail)
+        manager = NarrativeJobManager()
+        job = await _wait(manager, (await manager.submit("t1", ["a", "b"])).id)
+        assert job.status == "completed"
+        assert job.failed == 2
+        assert job.results["a"] == {"status": "error", "narratives": [], "message": "boom"}
+
+    async def test_fetch_error_fails_job(self, fake_db: dict, monkeypatch) -> None:
+        def _fail(db, ids, tid):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr(narrative_jobs, "fetch_yearly_emissions_many", _fail)
+        manager = NarrativeJobManager()
+        job = await _wait(manager, (await manager.submit("t1", ["a"])).id)
+        assert job.status == "failed"
+        assert job.error == "db down"
+
+    async def test_jobs_are_tenant_scoped(self, fake_db: dict, fake_llm: FakeLLMPool) -> None:
+        manager = NarrativeJobManager(llm_rate=0)
+        job = await manager.submit("t1", ["a"])
+        assert await manager.get(job.id, "t2") is None
+        await _wait(manager, job.id)
+
+    async def test_any_worker_serves_the_narratives(self, fake_db: dict, fake_llm: FakeLLMPool) -> None:
+        store = JobStore("narratives", 60, backend="memory")
+        accepting, polled = NarrativeJobManager(llm_rate=0, store=store), NarrativeJobManager(store=store)
+        job = await _wait(polled, (await accepting.submit("t1", ["a", "b"])).id)
+        assert job.status == "completed"
+        assert job.installation_ids == ["a", "b"]
+        assert (await polled.result(job.id, "b"))["status"] == "success"
+
+    async def test_narratives_are_stored_as_generated(self, fake_db: dict, fake_llm: FakeLLMPool, monkeypatch) -> None:
+        release = asyncio.Event()
+        generate = narrative_jobs.agenerate_narratives
+
+        async def _slow_b(installation, *args, **kwargs):
+            if installation["installation_name"] == "Plant b":
+                await release.wait()
+            return await generate(installation, *args, **kwargs)
+
+        monkeypatch.setattr(narrative_jobs, "agenerate_narratives", _slow_b)
+        manager = NarrativeJobManager(llm_rate=0)
+        job = await manager.submit("t1", ["a", "b"])
+        for _ in range(200):
+            if await manager.result(job.id, "a") is not None:
+                break
+            await asyncio.sleep(0.01)
+        assert (await manager.result(job.id, "a"))["status"] == "success"
+        assert await manager.result(job.id, "b") is None
+        assert (await manager.get(job.id, "t1")).processed == 1
+        release.set()
+        await _wait(manager, job.id)
+
+    async def test_finished_jobs_expire(self, fake_db: dict, fake_llm: FakeLLMPool) -> None:
+        manager = NarrativeJobManager(llm_rate=0, ttl=0)
+        job = await manager.submit("t1", ["a"])
+        await asyncio.sleep(0.05)
+        assert await manager.get(job.id, "t1") is None
+        assert await manager.result(job.id, "a") is None
+
+    async def test_shutdown_cancels_running_jobs(self, fake_db: dict, monkeypatch) -> None:
+        monkeypatch.setattr(narrative_jobs, "fetch_installation_summary_many", lambda db, ids, tid: time.sleep(0.2) or {})
+        manager = NarrativeJobManager()
+        job = await manager.submit("t1", ["a"])
+        await asyncio.sleep(0.05)
+        await manager.shutdown()
+        assert job.status == "cancelled"
+        assert (await manager.get(job.id, "t1")).status == "cancelled"
+
+
+class TestRateLimiter:
+    """The token bucket spaces acquisitions after the burst is spent."""
+
+    async def test_rate_after_burst(self) -> None:
+        limiter = RateLimiter(rate=50, burst=2)
+        start = time.monotonic()
+        for _ in range(7):
+            await limiter.acquire()
+        # Two from the burst, then five at 50/s
+        assert 0.08 <= time.monotonic() - start < 0.5
+
+    async def test_zero_rate_is_unlimited(self) -> None:
+        limiter = RateLimiter(rate=0, burst=1)
+        start = time.monotonic()
+        for _ in range(100):
+            await limiter.acquire()
+        assert time.monotonic() - start < 0.05
@@ -13,22 +13,23 @@ _SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
 if _SERVICE_ROOT not in sys.path:
     sys.path.insert(0, _SERVICE_ROOT)
 
+from llm_client import CircuitOpenError
 from services.narrative_service import (
     _generate_template,
     _prepare_context,
-    generate_narrative,
+    agenerate_narrative,
 )
 
 
 # ---------------------------------------------------------------------------
-# generate_narrative - top-level function
+# agenerate_narrative - top-level function
 # ---------------------------------------------------------------------------
 
 class TestGenerateNarrative:
-    """Tests for the main generate_narrative entry point."""
+    """Tests for the main agenerate_narrative entry point."""
 
-    def test_no_data_returns_no_data_status(self) -> None:
-        result = generate_narrative(
+    async def test_no_data_returns_no_data_status(self) -> None:
+        result = await agenerate_narrative(
             installation_info=None,
             emission_data=[],
             balance_data=[],
@@ -42,12 +43,12 @@ class TestGenerateNarrative:
 
     @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
     @patch("services.narrative_service.OPENAI_API_KEY", "")
-    def test_template_fallback_when_no_api_keys(
+    async def test_template_fallback_when_no_api_keys(
         self,
         emission_data: list[dict[str, Any]],
         installation_info: dict[str, Any],
     ) -> None:
-        result = generate_narrative(
+        result = await agenerate_narrative(
             installation_info=installation_info,
             emission_data=emission_data,
             balance_data=[],
@@ -60,12 +61,12 @@ class TestGenerateNarrative:
 
     @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
     @patch("services.narrative_service.OPENAI_API_KEY", "")
-    def test_template_fallback_message_mentions_api_key(
+    async def test_template_fallback_message_mentions_api_key(
         self,
         emission_data: list[dict[str, Any]],
         installation_info: dict[str, Any],
     ) -> None:
-        result = generate_narrative(
+        result = await agenerate_narrative(
             installation_info=installation_info,
             emission_data=emission_data,
             balance_data=[],
@@ -74,15 +75,33 @@ class TestGenerateNarrative:
         )
         assert "sablon" in result["message"].lower() or "API" in result["message"]
 
+    @patch("services.narrative_service.ANTHROPIC_API_KEY", "test")
+    @patch("services.narrative_service.OPENAI_API_KEY", "test")
+    async def test_template_fallback_message_when_providers_fail(
+        self,
+        emission_data: list[dict[str, Any]],
+        installation_info: dict[str, Any],
+    ) -> None:
+        class FailingLLMPool:
+            async def ainvoke(self, model: str, system_prompt: str, user_prompt: str) -> str:
+                if model == "claude":
+                    raise CircuitOpenError(model)
+                raise TimeoutError()
+
+        with patch("services.narrative_service.llm_clients", FailingLLMPool()):
+            result = await agenerate_narrative(installation_info, emission_data, [], "summary", "tr")
+        assert result["model"] == "template"
+        assert result["message"] == "Rapor sablon tabanli olusturuldu (AI servisi su anda kullanilamiyor)"
+
     @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
     @patch("services.narrative_service.OPENAI_API_KEY", "")
-    def test_language_is_preserved(
+    async def test_language_is_preserved(
         self,
         emission_data: list[dict[str, Any]],
         installation_info: dict[str, Any],
     ) -> None:
         for lang in ("tr", "en", "de"):
-            result = generate_narrative(
+            result = await agenerate_narrative(
                 installation_info=installation_info,
                 emission_data=emission_data,
                 balance_data=[],
@@ -93,13 +112,13 @@ class TestGenerateNarrative:
 
     @patch("services.narrative_service.ANTHROPIC_API_KEY", "")
     @patch("services.narrative_service.OPENAI_API_KEY", "")
-    def test_report_type_is_preserved(
+    async def test_report_type_is_preserved(
         self,
         emission_data: list[dict[str, Any]],
         installation_info: dict[str, Any],
     ) -> None:
         for rtype in ("summary", "detailed", "executive"):
-            result = generate_narrative(
+            result = await agenerate_narrative(
                 installation_info=installation_info,
                 emission_data=emission_data,
                 balance_data=[],
@@ -151,6 +170,12 @@ class TestPrepareContext:
         ctx = _prepare_context(None, emission_data, [])
         assert ctx["total_records"] == 5
 
+    def test_yearly_aggregate_input_matches_rows(self, emission_data: list[dict[str, Any]]) -> None:
+        from frames import EmissionFrame
+
+        aggregate = EmissionFrame.from_records(emission_data).yearly
+        assert _prepare_context(None, aggregate, []) == _prepare_context(None, emission_data, [])
+
     def test_trend_increasing(self, emission_data: list[dict[str, Any]]) -> None:
         ctx = _prepare_context(None, emission_data, [])
         trend = ctx["trend"]
@@ -0,0 +1,130 @@
+"""Tests for services/narrative_templates.py (per-language template narratives)."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+from services.narrative_service import _prepare_context
+from services.narrative_templates import TEMPLATES, get_template
+
+
+def _context(n_years: int, trend: dict | None = None) -> dict:
+    years = list(range(2025 - n_years, 2025))
+    yearly = {
+        year: {"direct": 1000.0 + i * 13.37, "indirect": 250.0 + i / 3, "total": 1250.0 + i * 13.7, "count": 12}
+        for i, year in enumerate(years)
+    }
+    return {
+        "installation": {"installation_name": "Kiln 3", "company_name": "Ecosfer"},
+        "yearly_emissions": yearly,
+        "years": years,
+        "trend": trend or {"direction": "increasing", "change_pct": 21.9},
+    }
+
+
+def _hand_written_tr(name, company, yearly, trend, years) -> str:
+    """Reference: the f-string / list.append Turkish template the string tables replaced."""
+    sections = [f"# {name} - Emisyon Analiz Raporu" + (f"\n**Sirket:** {company}" if company else "")]
+    sections.append("\n## 1. Genel Degerlendirme")
+    if yearly:
+        total_all = sum(d["total"] for d in yearly.values())
+        sections.append(
+            f"{name} tesisi icin {len(years)} yillik emisyon verisi analiz edilmistir. "
+            f"Toplam kumulatif emisyon **{total_all:.2f} tCO2e** olarak hesaplanmistir."
+        )
+    else:
+        sections.append("Analiz icin yeterli veri bulunmamaktadir.")
+    sections.append("\n## 2. Emisyon Trendleri")
+    if trend:
+        direction_tr = {"increasing": "artis", "decreasing": "azalis", "stable": "sabit"}.get(trend["direction"], "belirsiz")
+        sections.append(
+            f"Emisyon trendi **{direction_tr}** yonundedir. "
+            f"Incelenen donemde **%{trend['change_pct']}** oraninda degisim gozlemlenmistir."
+        )
+    if yearly:
+        sections.append("\n| Yil | Dogrudan (tCO2e) | Dolayli (tCO2e) | Toplam (tCO2e) |")
+        sections.append("|-----|------------------|-----------------|----------------|")
+        for year, data in yearly.items():
+            sections.append(f"| {year} | {data['direct']:.4f} | {data['indirect']:.4f} | {data['total']:.4f} |")
+    sections.append("\n## 3. Onemli Bulgular")
+    findings = []
+    if len(years) >= 2 and yearly:
+        last = yearly[years[-1]]
+        prev = yearly[years[-2]]
+        if prev["total"] > 0:
+            yoy_change = (last["total"] - prev["total"]) / prev["total"] * 100
+            findings.append(f"- Son yilda emisyonlar **%{yoy_change:.1f}** oraninda degismistir ({years[-2]} -> {years[-1]}).")
+        if last["indirect"] > last["direct"]:
+            findings.append("- Dolayli emisyonlar dogrudan emisyonlardan yuksektir. Enerji verimliligi iyilestirmeleri oncelikli olmalidir.")
+        else:
+            findings.append("- Dogrudan emisyonlar baskindir. Proses optimizasyonu ve yakit degisikligi degerlendirilmelidir.")
+    if not findings:
+        findings.append("- Detayli bulgu icin daha fazla veri gerekmektedir.")
+    sections.append("\n".join(findings))
+    sections.append("\n## 4. Oneriler")
+    sections.append(
+        "- Emisyon izleme suresinin artirilmasi ve veri kalitesinin iyilestirilmesi onerilir.\n"
+        "- CBAM beyanname sureci icin AB varsayilan deger tablolari ile karsilastirma yapilmalidir.\n"
+        "- Yuksek emisyonlu kaynak akimlari icin alternatif uretim yontemleri degerlendirilmelidir."
+    )
+    sections.append("\n---\n*Bu rapor Ecosfer SKDM Platform v2.0 tarafindan otomatik olusturulmustur.*")
+    return "\n".join(sections)
+
+
+def _reference(context: dict) -> str:
+    inst = context["installation"]
+    return _hand_written_tr(
+        inst.get("installation_name", "Bilinmeyen Tesis"), inst.get("company_name", ""),
+        context["yearly_emissions"], context["trend"], context["years"],
+    )
+
+
+# ---------------------------------------------------------------------------
+# NarrativeTemplate
+# ---------------------------------------------------------------------------
+
+class TestNarrativeTemplate:
+    """Templates render the same text as the hand-written ones."""
+
+    @pytest.mark.parametrize("n_years", [0, 1, 2, 20])
+    def test_tr_matches_hand_written_template(self, n_years: int) -> None:
+        context = _context(n_years)
+        assert get_template("tr").render(context) == _reference(context)
+
+    def test_tr_findings_follow_latest_year(self) -> None:
+        context = _context(3)
+        context["yearly_emissions"][2024]["indirect"] = 5000.0
+        narrative = get_template("tr").render(context)
+        assert "Dolayli emisyonlar dogrudan emisyonlardan yuksektir" in narrative
+        assert narrative == _reference(context)
+
+    def test_unknown_direction_uses_fallback_word(self) -> None:
+        context = _context(2, trend={"direction": "unknown", "change_pct": 0})
+        assert "**belirsiz**" in get_template("tr").render(context)
+        assert "**unbekannt**" in get_template("de").render(context)
+        assert "**unknown**" in get_template("en").render(context)
+
+    def test_sections_join_to_full_text(self) -> None:
+        context = _context(5)
+        for template in TEMPLATES.values():
+            sections = template.render_sections(context)
+            assert len(sections) == 5
+            assert "".join(sections) == template.render(context)
+            assert all(section.startswith("\n\n## ") for section in sections[1:])
+
+    def test_de_has_no_table(self, emission_data: list[dict[str, Any]], installation_info: dict[str, Any]) -> None:
+        context = _prepare_context(installation_info, emission_data, [])
+        assert "| 20" not in get_template("de").render(context)
+        assert "| 2020" in get_template("en").render(context)
+
+    def test_unsupported_language_falls_back_to_english(self) -> None:
+        assert get_template("fr") is TEMPLATES["en"]
+
@@ -0,0 +1,198 @@
+"""Tests for scan_jobs.py (tenant-wide anomaly scan jobs)."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+
+_SERVICE_ROOT = str(Path(__file__).resolve().parent.parent)
+if _SERVICE_ROOT not in sys.path:
+    sys.path.insert(0, _SERVICE_ROOT)
+
+import scan_jobs
+from frames import BalanceFrame, EmissionFrame, YearlyAggregate
+from job_store import JobStore, JobStoreUnavailableError
+from metrics import ANOMALY_SCAN_INSTALLATIONS
+from scan_jobs import ScanJobManager
+
+
+@pytest.fixture()
+def fake_db(monkeypatch, emission_data: list[dict[str, Any]], balance_data: list[dict[str, Any]]) -> dict:
+    """Patch the bulk fetches; returns a dict recording the batches that were loaded."""
+    calls: dict[str, list] = {"emissions": [], "balances": []}
+
+    def _yearly(db, ids, tid):
+        return {iid: EmissionFrame.from_records(emission_data if iid != "empty" else []).yearly for iid in ids}
+
+    def _emissions(db, ids, tid):
+        calls["emissions"].append(list(ids))
+        return {iid: EmissionFrame.from_records(emission_data if iid != "empty" else []) for iid in ids}
+
+    def _balances(db, ids, tid):
+        calls["balances"].append(list(ids))
+        return {iid: BalanceFrame.from_records(balance_data if iid != "empty" else []) for iid in ids}
+
+    monkeypatch.setattr(scan_jobs, "SessionLocal", MagicMock)
+    monkeypatch.setattr(scan_jobs, "fetch_tenant_installation_ids", lambda db, tid: [f"inst-{i}" for i in range(5)])
+    monkeypatch.setattr(scan_jobs, "fetch_yearly_emissions_many", _yearly)
+    monkeypatch.setattr(scan_jobs, "copy_emission_data_many", _emissions)
+    monkeypatch.setattr(scan_jobs, "copy_balance_data_many", _balances)
+    return calls
+
+
+async def _wait(manager: ScanJobManager, job_id: str, tenant_id: str = "t1"):
+    for _ in range(500):
+        job = await manager.get(job_id, tenant_id)
+        if job.finished:
+            job.results = await manager.results(job_id)
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("scan job did not finish")
+
+
+def _scanned(status: str) -> float:
+    return ANOMALY_SCAN_INSTALLATIONS.labels(status=status)._value.get()
+
+
+class TestScanJobManager:
+    """Jobs scan every installation in bulk batches and keep per-installation summaries."""
+
+    async def test_scans_all_tenant_installations(self, fake_db: dict) -> None:
+        manager = ScanJobManager(batch_size=2, workers=2)
+        job = await _wait(manager, (await manager.submit("t1", 0.05)).id)
+        assert job.status == "completed"
+        assert job.total == job.processed == 5
+        assert sorted(job.results) == [f"inst-{i}" for i in range(5)]
+        summary = job.results["inst-0"]["summary"]
+        assert isinstance(summary["data_quality_score"], float)
+        # One emission and one balance query per batch
+        assert fake_db["emissions"] == [["inst-0", "inst-1"], ["inst-2", "inst-3"], ["inst-4"]]
+        assert fake_db["balances"] == fake_db["emissions"]
+
+    async def test_explicit_installations(self, fake_db: dict) -> None:
+        manager = ScanJobManager()
+        job = await _wait(manager, (await manager.submit("t1", 0.05, ["a", "empty", "a"])).id)
+        assert job.total == 2
+        assert job.results["empty"] == {"status": "no_data", "summary": None}
+        assert job.results["a"]["status"] == "success"
+
+    async def test_item_error_does_not_fail_job(self, fake_db: dict, monkeypatch) -> None:
+        def _detect(emissions, balances, threshold):
+            raise ValueError("boom")
+
+        monkeypatch.setattr(scan_jobs, "detect_anomalies", _detect)
+        before = _scanned("error")
+        manager = ScanJobManager()
+        job = await _wait(manager, (await manager.submit("t1", 0.05, ["a", "b"])).id)
+        assert job.status == "completed"
+        assert job.failed == 2
+        assert job.results["a"] == {"status": "error", "summary": None, "message": "boom"}
+        assert _scanned("error") == before + 2
+
+    async def test_large_installations_are_streamed(
+        self, fake_db: dict, monkeypatch, emission_data: list[dict[str, Any]], balance_data: list[dict[str, Any]]
+    ) -> None:
+        streamed = []
+        threads = []
+
+        def _stream(db, iid, tid):
+            streamed.append(iid)
+            for frame in (EmissionFrame.from_records(emission_data[:3]), EmissionFrame.from_records(emission_data[3:])):
+                threads.append(threading.current_thread().name)
+                yield frame
+
+        monkeypatch.setattr(scan_jobs, "stream_emission_data", _stream)
+        manager = ScanJobManager(streaming_min_rows=len(emission_data))
+        job = await _wait(manager, (await manager.submit("t1", 0.05, ["a", "empty"])).id)
+        # Only the small installation is loaded with the batch; the large one is read in chunks
+        assert fake_db["emissions"] == [["empty"]]
+        assert fake_db["balances"] == [["a", "empty"]]
+        assert set(streamed) == {"a"}
+        # The cursor is read on the db executor, not on a cpu slot
+        assert threads and all(name.startswith("ai-db") for name in threads)
+        assert job.results["a"]["status"] == "success"
+        # The sample covers every row, so the chunked scan matches a full load
+        expected = scan_jobs.detect_anomalies(EmissionFrame.from_records(emission_data), BalanceFrame.from_records(balance_data), 0.05)
+        assert job.results["a"]["summary"] == expected["summary"]
+
+    async def test_fetch_error_fails_job(self, fake_db: dict, monkeypatch) -> None:
+        def _fail(db, tid):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr(scan_jobs, "fetch_tenant_installation_ids", _fail)
+        manager = ScanJobManager()
+        job = await _wait(manager, (await manager.submit("t1", 0.05)).id)
+        assert job.status == "failed"
+        assert job.error == "db down"
+
+    async def test_jobs_are_tenant_scoped(self, fake_db: dict) -> None:
+        manager = ScanJobManager()
+        job = await manager.submit("t1", 0.05, ["a"])
+        assert await manager.get(job.id, "t2") is None
+        await _wait(manager, job.id)
+
+    async def test_progress_reports_throughput(self, fake_db: dict) -> None:
+        manager = ScanJobManager()
+        job = await _wait(manager, (await manager.submit("t1", 0.05)).id)
+        progress = job.progress()
+        assert progress["processed"] == 5
+        assert progress["elapsed_seconds"] > 0
+        assert progress["installations_per_second"] > 0
+
+    async def test_any_worker_serves_the_job(self, fake_db: dict) -> None:
+        store = JobStore("scans", 60, backend="memory")
+        accepting, polled = ScanJobManager(store=store), ScanJobManager(store=store)
+        job = await _wait(polled, (await accepting.submit("t1", 0.05, ["a", "b"])).id)
+        assert job.status == "completed"
+        assert job.processed == 2
+        assert sorted(job.results) == ["a", "b"]
+
+    async def test_progress_is_stored_per_installation(self, fake_db: dict, monkeypatch) -> None:
+        saved = []
+        manager = ScanJobManager()
+        save = manager.store.save
+
+        async def _save(job_id, stored, results=None):
+            saved.append((stored["processed"], sorted(results or {})))
+            await save(job_id, stored, results)
+
+        monkeypatch.setattr(manager.store, "save", _save)
+        await _wait(manager, (await manager.submit("t1", 0.05, ["a", "b"])).id)
+        assert (1, ["a"]) in saved or (1, ["b"]) in saved
+        assert saved[-1][0] == 2
+
+    async def test_results_survive_store_outages(self, fake_db: dict, monkeypatch) -> None:
+        manager = ScanJobManager(batch_size=1)
+        save = manager.store.save
+        failures = iter([False, False, False, True])  # submit, start, total, the first installation
+
+        async def _flaky(job_id, stored, results=None):
+            if next(failures, False):
+                raise JobStoreUnavailableError("redis down")
+            await save(job_id, stored, results)
+
+        monkeypatch.setattr(manager.store, "save", _flaky)
+        job = await _wait(manager, (await manager.submit("t1", 0.05, ["a", "b"])).id)
+        # The failed write is retried with the next one
+        assert sorted(job.results) == ["a", "b"]
+
+    async def test_finished_jobs_expire(self, fake_db: dict) -> None:
+        manager = ScanJobManager(ttl=0)
+        job = await manager.submit("t1", 0.05, ["a"])
+        await asyncio.sleep(0.05)
+        assert await manager.get(job.id, "t1") is None
+
+    async def test_shutdown_cancels_running_jobs(self, fake_db: dict, monkeypatch) -> None:
+        monkeypatch.setattr(scan_jobs, "fetch_tenant_installation_ids", lambda db, tid: __import__("time").sleep(0.2) or [])
+        manager = ScanJobManager()
+        job = await manager.submit("t1", 0.05)
+        await asyncio.sleep(0.05)
+        await manager.shutdown()
+        assert job.status == "cancelled"
+        assert (await manager.get(job.id, "t1")).status == "cancelled"